@@ -0,0 +1,76 @@
+"""
+COLD START IMPORT TIME BUDGET
+
+usage:
+    python -m benchmarks.import_time [--budget-ms 1500] [--top 15]
+
+Imports `main` in a fresh interpreter with `python -X importtime` and fails
+(exit code 1) when the cumulative import time is over the budget or when a
+module only needed for seeding (pandas, geopandas, alembic) is imported.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import sys
+import argparse
+import subprocess
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security.settings import ROOT
+
+# modules that must only be imported when seeding or migrating
+FORBIDDEN_MODULES = ["pandas", "geopandas", "alembic"]
+
+
+def profile_imports(module: str = "main") -> list:
+    """
+    Import a module in a new interpreter and parse the `-X importtime` report.
+
+    Returns:
+        list[tuple[str, int, int]]: module name, self and cumulative time in microseconds
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_time), int(cumulative_time)))
+    return imports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of main")
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=15)
+    arguments = parser.parse_args()
+
+    imports = profile_imports()
+    total_ms = (
+        next(cumulative for name, _, cumulative in imports if name == "main") / 1000
+    )
+    print("slowest imports (cumulative):")
+    for name, _, cumulative in sorted(imports, key=lambda x: -x[2])[: arguments.top]:
+        print(f"{cumulative / 1000:10.1f} ms  {name}")
+
+    failures = []
+    if total_ms > arguments.budget_ms:
+        failures.append(
+            f"import main took {total_ms:.0f} ms > {arguments.budget_ms:.0f} ms"
+        )
+    imported = {name for name, _, _ in imports}
+    failures += [
+        f"{module} is imported at startup"
+        for module in FORBIDDEN_MODULES
+        if module in imported
+    ]
+    print(f"import main: {total_ms:.0f} ms, budget {arguments.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
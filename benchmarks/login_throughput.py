@@ -0,0 +1,96 @@
+"""
+LOGIN THROUGHPUT UNDER CONCURRENCY
+
+usage:
+    python -m benchmarks.login_throughput [--concurrency 32] [--requests 256]
+    python -m benchmarks.login_throughput --url http://127.0.0.1:8000 --email-id <email> --password <password>
+
+Without `--url` password verification is timed in request threads, once inline
+(bcrypt holding the GIL of the worker) and once offloaded to the password worker
+processes. With `--url` concurrent `/users/login` requests are sent to a running
+server.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import authenticator, settings
+
+
+def run(function, concurrency: int, requests: int) -> float:
+    """
+    Call `function` `requests` times from `concurrency` threads.
+
+    Returns:
+        float: calls per second
+    """
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in executor.map(lambda _: function(), range(requests)):
+            pass
+    return requests / (time.perf_counter() - started_at)
+
+
+def benchmark_verification(concurrency: int, requests: int):
+    password = "benchmark@password"
+    hashed_password = authenticator.generate_password_hash(password)
+    # start the worker processes before timing
+    authenticator.check_password(password, hashed_password)
+
+    inline = run(
+        lambda: authenticator.verify_and_update_password(password, hashed_password),
+        concurrency,
+        requests,
+    )
+    offloaded = run(
+        lambda: authenticator.check_password(password, hashed_password),
+        concurrency,
+        requests,
+    )
+    authenticator.shutdown_password_pool()
+    print(f"bcrypt rounds {settings.BCRYPT_ROUNDS}, {concurrency} threads")
+    print(f"inline verification     {inline:8.1f} logins/s")
+    print(f"process pool            {offloaded:8.1f} logins/s")
+
+
+def benchmark_server(
+    url: str, email_id: str, password: str, concurrency: int, requests: int
+):
+    import requests as http
+
+    session = http.Session()
+    payload = json.dumps({"email_id": email_id, "password": password})
+    headers = {"Content-Type": "application/json"}
+
+    def login():
+        response = session.request(
+            "GET", f"{url}/users/login", headers=headers, data=payload
+        )
+        response.raise_for_status()
+
+    print(f"{url}/users/login, {concurrency} clients")
+    print(f"{run(login, concurrency, requests):8.1f} logins/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark login throughput")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--url", help="running server, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--email-id", default="admin@everimpact.com")
+    parser.add_argument("--password", default="admin@everimpact")
+    arguments = parser.parse_args()
+    if arguments.url:
+        benchmark_server(
+            arguments.url,
+            arguments.email_id,
+            arguments.password,
+            arguments.concurrency,
+            arguments.requests,
+        )
+    else:
+        benchmark_verification(arguments.concurrency, arguments.requests)
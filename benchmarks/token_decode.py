@@ -0,0 +1,45 @@
+"""
+ACCESS TOKEN DECODE THROUGHPUT
+
+usage:
+    python -m benchmarks.token_decode [--decodes 20000]
+
+Times `decode_token` for the same token with the python-jose and PyJWT (when
+installed) backends, without and with the verified-token cache.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import time
+import argparse
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import authenticator, settings
+
+
+def run(token: str, decodes: int) -> float:
+    """
+    Returns:
+        float: decodes per second
+    """
+    started_at = time.perf_counter()
+    for _ in range(decodes):
+        authenticator.decode_token(token)
+    return decodes / (time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark access token decoding")
+    parser.add_argument("--decodes", type=int, default=20000)
+    arguments = parser.parse_args()
+
+    token = authenticator.generate_access_token(user_id="benchmark")
+    backends = ["jose"] + (["pyjwt"] if authenticator.pyjwt else [])
+    cache_size = authenticator.token_cache.size
+    print(f"{settings.ALGORITHM}, {arguments.decodes} decodes of the same token")
+    for backend in backends:
+        settings.JWT_BACKEND = backend
+        authenticator.token_cache.size = 0
+        authenticator.token_cache.clear()
+        print(f"{backend:6} uncached {run(token, arguments.decodes):12.0f} decodes/s")
+        authenticator.token_cache.size = cache_size
+        print(f"{backend:6} cached   {run(token, arguments.decodes):12.0f} decodes/s")
@@ -20,102 +20,86 @@
         
 """
 # -------------------------------- PYTHON IMPORTS --------------------------------#
-import pandas as pd
-import geopandas as gpd
-import time
-
-# -------------------------------- ALEMBIC IMPORTS --------------------------------#
-from alembic.config import Config
-from alembic import command
+import pathlib
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
-from database import SessionLocal, engine, Base
+from database import SessionLocal, get_shard_engine, get_shard_names
 from models import common_models
-from routes.coverage.utils import create_coverage
-from database import SessionLocal
-
+from models.common_models import Job, JOB_SUCCEEDED
+from security import authenticator
+from security.settings import ROOT
 
-# DATABASE SESSION
-db = SessionLocal()
+# the import pipeline and alembic are imported when seeding runs, they are not
+# needed to serve requests
 
+# coverages and dataset files seeded on startup
+MANIFEST = pathlib.Path(__file__).resolve().parent / "manifest.json"
 # Alembic configuration file path
-alembic_cfg = "alembic.ini"
+alembic_cfg = str(ROOT / "alembic.ini")
+# advisory lock key held while seeding, see `start_data_seeding`
+SEEDING_LOCK_KEY = 5_174_221_093
+# kind of the succeeded job recorded once the database is seeded
+SEEDING_JOB_KIND = "data_seeding"
 
 
 def run_migration():
+    from alembic.config import Config
+    from alembic import command
+
     alembic_config = Config(alembic_cfg)
     command.upgrade(alembic_config, "head")
 
 
 def create_admin():
+    db = SessionLocal()
     try:
         admin_user_db_obj = common_models.User(
             email_id="admin@everimpact.com",
-            password="admin@everimpact",
+            password=authenticator.generate_password_hash("admin@everimpact"),
             is_admin=True,
         )
         db.add(admin_user_db_obj)
         db.commit()
     except Exception as error:
         pass
+    finally:
+        db.close()
 
 
 def create_default_migration():
+    from management.import_datasets import import_datasets
+
     print("-" * 100)
     print("DATA SEEDING STARTED !!\nIT WILL TAKE SOME TIME...")
     print("-" * 100)
-
-    print("DIJON COVERAGE DATA SEEDING ..............\n")
-    # dijon schema
-    dijon_start_time = time.time()
-    _, dijon_schema = create_coverage(name="Dijon", db=SessionLocal())
-    # read data files
-    sensor_data = gpd.read_file("data_seeder/data/dijon_sensor_data.geojson")
-    sensor_data.to_postgis(
-        con=engine,
-        name="sensor",
-        schema=dijon_schema,
-        index=False,
-        if_exists="append",
-        dtype={"geometry": "Geometry"},
-    )
-
-    sensor_reading_data = pd.read_csv("data_seeder/data/dijon_sensor_reading_data.csv")
-    sensor_reading_data.to_sql(
-        con=engine,
-        name="sensor_reading",
-        schema=dijon_schema,
-        index=False,
-        if_exists="append",
-    )
-    # ishinomaki schema
-    print("ISHINOMAKI COVERAGE DATA SEEDING ..............\n")
-    _, ishinomaki_schema = create_coverage(name="Ishinomaki", db=SessionLocal())
-    sink_data = gpd.read_file("data_seeder/data/ishinomaki_sink.geojson")
-    sink_data.to_postgis(
-        con=engine,
-        name="sink",
-        schema=ishinomaki_schema,
-        index=False,
-        if_exists="append",
-        dtype={"geometry": "Geometry"},
-    )
-
-
-def start_data_seeding():
-
+    # coverages which already exist are skipped
+    failed = import_datasets(MANIFEST)
+    if failed:
+        # seeding is not recorded as done, the next start imports them again
+        names = ", ".join(name for name, _ in failed)
+        raise RuntimeError(f"coverages {names} could not be imported")
+
+
+def seed() -> bool:
+    """
+    Returns:
+        bool: False when the default coverages could not be created
+    """
     try:
-        # add Postgis support
-        engine.execute("CREATE EXTENSION Postgis;")
+        # add Postgis support on every shard
+        for shard in get_shard_names():
+            get_shard_engine(shard).execute("CREATE EXTENSION IF NOT EXISTS Postgis;")
         # run migration
         # run_migration()
     except:
         pass
 
     # create default schema and upload data
+    succeeded = True
     try:
         create_default_migration()
     except Exception as error:
+        succeeded = False
         print("-" * 100)
         print("SOMETHING WENT WRONG WHILE CREATING DEFAULT COVERAGE")
         print("~" * 30)
@@ -125,3 +109,41 @@ def start_data_seeding():
 
     # CREATE ADMIN USER
     create_admin()
+    return succeeded
+
+
+def seeding_done(db) -> bool:
+    return (
+        db.query(Job.id)
+        .filter(Job.kind == SEEDING_JOB_KIND, Job.status == JOB_SUCCEEDED)
+        .first()
+        is not None
+    )
+
+
+def start_data_seeding():
+    """
+    Seed the database once, whatever the number of server processes and restarts.
+
+    Under gunicorn the master seeds in `when_ready`, before the workers are forked,
+    without it the server seeds on startup. Completion is recorded as a succeeded
+    `data_seeding` job, later starts find it and skip seeding. A session level
+    advisory lock on the primary database makes concurrent starts wait for the one
+    seeding instead of skipping it, the lock is released with the connection, also
+    when the process dies while seeding.
+    """
+    with get_shard_engine().connect() as connection:
+        connection.exec_driver_sql("SELECT pg_advisory_lock(%s)", (SEEDING_LOCK_KEY,))
+        db = SessionLocal()
+        try:
+            if seeding_done(db):
+                print("DATA ALREADY SEEDED, SKIPPING")
+                return
+            if seed():
+                db.add(Job(kind=SEEDING_JOB_KIND, payload={}, status=JOB_SUCCEEDED))
+                db.commit()
+        finally:
+            db.close()
+            connection.exec_driver_sql(
+                "SELECT pg_advisory_unlock(%s)", (SEEDING_LOCK_KEY,)
+            )
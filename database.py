@@ -1,4 +1,9 @@
 # -------------------------------- PYTHON IMPORTS --------------------------------#
+import math
+import time
+import itertools
+from collections import OrderedDict
+
 # -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -18,6 +23,215 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# tenant sessions are bound per schema, see `get_schema_db`
+TenantSession = sessionmaker(autocommit=False, autoflush=False)
+
+# public schema (User, Coverage) always lives on the primary shard
+PRIMARY_SHARD = "primary"
+# shard name -> engine, other shards are created on first use
+shard_engines = {PRIMARY_SHARD: engine}
+# shard name -> read replica engines, created on first use
+replica_engines = {}
+# replica engine -> (time of the lag check, replication lag in seconds)
+replica_lags = {}
+# round robin over the healthy replicas
+replica_counter = itertools.count()
+# user id -> time of the user's last write in this process, oldest first, see
+# `mark_user_write`
+user_writes = OrderedDict()
+# (shard name, replica index or None, schema name) -> tenant engine
+tenant_engines = {}
+
+# cookie carrying the time of the client's last write to every worker
+WRITE_COOKIE = "last_write"
+
+# replication lag of a replica, 0 when it has replayed everything it received
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+def get_shard_names() -> list:
+    """
+    Helper function to return the names of all configured shards.
+    """
+    return [PRIMARY_SHARD, *settings.SHARD_DATABASE_URLS]
+
+
+def get_shard_engine(shard: str = PRIMARY_SHARD):
+    """
+    Helper function to return the engine of a shard.
+
+    Args:
+        shard (str): shard name, `primary` or a key of `settings.SHARD_DATABASE_URLS`
+
+    Returns:
+        Engine: shard database engine
+    """
+    shard_engine = shard_engines.get(shard)
+    if shard_engine is None:
+        if shard not in settings.SHARD_DATABASE_URLS:
+            raise KeyError(f"Unknown database shard {shard}")
+        shard_engine = create_engine(settings.SHARD_DATABASE_URLS[shard], echo=False)
+        shard_engine = shard_engines.setdefault(shard, shard_engine)
+    return shard_engine
+
+
+def get_replica_engines(shard: str = PRIMARY_SHARD) -> list:
+    """
+    Helper function to return the read replica engines of a shard.
+
+    Args:
+        shard (str): shard name
+
+    Returns:
+        list: replica engines, empty when the shard has no replica
+    """
+    engines = replica_engines.get(shard)
+    if engines is None:
+        engines = [
+            create_engine(url, echo=False, pool_pre_ping=True)
+            for url in settings.REPLICA_DATABASE_URLS.get(shard, [])
+        ]
+        engines = replica_engines.setdefault(shard, engines)
+    return engines
+
+
+def get_replica_lag(replica_engine) -> float:
+    """
+    Helper function to return the replication lag of a replica in seconds.
+
+    The lag is queried at most every `settings.REPLICA_LAG_CHECK_SECONDS`, an
+    unreachable replica has an infinite lag.
+
+    Args:
+        replica_engine (Engine): replica engine
+
+    Returns:
+        float: replication lag in seconds
+    """
+    now = time.monotonic()
+    checked_at, lag = replica_lags.get(replica_engine, (None, None))
+    if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_SECONDS:
+        return lag
+    try:
+        with replica_engine.connect() as connection:
+            lag = float(connection.exec_driver_sql(REPLICA_LAG_QUERY).scalar())
+    except Exception:
+        lag = float("inf")
+    replica_lags[replica_engine] = (now, lag)
+    return lag
+
+
+def evict_user_writes(now: float):
+    """
+    Helper function to forget the writes older than `settings.READ_YOUR_WRITES_SECONDS`.
+    """
+    while user_writes:
+        user_id, written_at = next(iter(user_writes.items()))
+        if now - written_at < settings.READ_YOUR_WRITES_SECONDS:
+            break
+        user_writes.pop(user_id, None)
+
+
+def mark_user_write(user_id: str, response=None):
+    """
+    Helper function to remember that a user has just written to the primary.
+
+    Reads of this user stay on the primary for `settings.READ_YOUR_WRITES_SECONDS`
+    so they are not served from a replica which has not replayed the write yet.
+    The write is remembered in this process only, the `WRITE_COOKIE` set on the
+    response carries it to the other workers with the client's next requests.
+
+    Args:
+        user_id (str): user id
+        response (Response, optional): response of the write, to set the cookie on
+    """
+    if not user_id:
+        return
+    now = time.monotonic()
+    evict_user_writes(now)
+    user_writes.pop(user_id, None)
+    user_writes[user_id] = now
+    if response is not None:
+        response.set_cookie(
+            WRITE_COOKIE,
+            f"{time.time():.3f}",
+            max_age=max(1, math.ceil(settings.READ_YOUR_WRITES_SECONDS)),
+            httponly=True,
+        )
+
+
+def wrote_recently(user_id: str = None, last_write: str = None) -> bool:
+    """
+    Helper function to tell whether a read must see a recent write of its client.
+
+    Args:
+        user_id (str, optional): user reading, written in this process
+        last_write (str, optional): `WRITE_COOKIE` of the request, epoch seconds
+
+    Returns:
+        bool: the user or the client wrote less than `settings.READ_YOUR_WRITES_SECONDS` ago
+    """
+    evict_user_writes(time.monotonic())
+    if user_id in user_writes:
+        return True
+    try:
+        # wall clock, written by any worker, a malformed cookie is ignored
+        elapsed = time.time() - float(last_write)
+    except (TypeError, ValueError):
+        return False
+    return abs(elapsed) < settings.READ_YOUR_WRITES_SECONDS
+
+
+def choose_replica(
+    shard: str = PRIMARY_SHARD, user_id: str = None, last_write: str = None
+):
+    """
+    Helper function to pick the replica serving a read.
+
+    Args:
+        shard (str): shard name
+        user_id (str, optional): user reading, for read-your-writes stickiness
+        last_write (str, optional): `WRITE_COOKIE` of the request
+
+    Returns:
+        int: index of a replica lagging less than `settings.REPLICA_MAX_LAG_SECONDS`,
+        None when the read must go to the primary of the shard
+    """
+    engines = get_replica_engines(shard)
+    if not engines:
+        return None
+    if wrote_recently(user_id, last_write):
+        return None
+    start = next(replica_counter)
+    for offset in range(len(engines)):
+        index = (start + offset) % len(engines)
+        if get_replica_lag(engines[index]) <= settings.REPLICA_MAX_LAG_SECONDS:
+            return index
+    return None
+
+
+def dispose_engines():
+    """
+    Helper function to drop the pooled connections inherited from a parent process.
+
+    Called in a worker right after fork, the pools of the shard and replica engines
+    are replaced without closing the inherited connections, which still belong to
+    the parent, and the tenant engines and replica state are rebuilt on first use.
+    """
+    for shard_engine in [
+        *shard_engines.values(),
+        *itertools.chain.from_iterable(replica_engines.values()),
+    ]:
+        shard_engine.dispose(close=False)
+    tenant_engines.clear()
+    replica_lags.clear()
+    user_writes.clear()
+
 
 def get_public_schema_db():
     """
@@ -37,21 +251,69 @@ def get_public_schema_db():
         db.close()
 
 
-def get_schema_db(schema_name: str):
+def get_tenant_engine(schema_name: str, shard: str = PRIMARY_SHARD, replica=None):
+    """
+    Helper function to return the engine of a coverage db schema.
+
+    Tenant engines are the shard (or replica) engine with a schema translate map,
+    they share its connection pool instead of opening a new pool for every request.
+
+    Args:
+        schema_name (str): coverage db schema name
+        shard (str): shard holding the schema, `Coverage.shard`
+        replica (int, optional): replica index from `choose_replica`, None for the primary
+
+    Returns:
+        Engine: engine translating unqualified tables to the input schema
+    """
+    key = (shard, replica, schema_name)
+    tenant_engine = tenant_engines.get(key)
+    if tenant_engine is None:
+        if replica is None:
+            base_engine = get_shard_engine(shard)
+        else:
+            base_engine = get_replica_engines(shard)[replica]
+        tenant_engine = base_engine.execution_options(
+            schema_translate_map={None: schema_name}
+        )
+        tenant_engines[key] = tenant_engine
+    return tenant_engine
+
+
+def evict_tenant_engine(schema_name: str):
+    """
+    Helper function to forget the tenant engines of a schema on every shard.
+
+    Args:
+        schema_name (str): coverage db schema name
+    """
+    for key in [key for key in tenant_engines if key[-1] == schema_name]:
+        tenant_engines.pop(key, None)
+
+
+def get_schema_db(
+    schema_name: str,
+    shard: str = PRIMARY_SHARD,
+    readonly: bool = False,
+    user_id: str = None,
+    last_write: str = None,
+):
     """
     Helper function to return schema database for input schema name
 
+    Read only sessions are served by a replica of the shard when one is within
+    the allowed replication lag and neither `user_id` nor the client (`last_write`)
+    has written recently.
+
     Args:
         schema_name (str): coverage db schema name
+        shard (str): shard holding the schema, `Coverage.shard`
+        readonly (bool, optional): the session is only used for reads
+        user_id (str, optional): user reading, for read-your-writes stickiness
+        last_write (str, optional): `WRITE_COOKIE` of the request
 
     Returns:
         database session: Database session for input schema
     """
-    schema_db_engine = create_engine(
-        settings.DATABASE_URL,
-        echo=True,
-        execution_options={"schema_translate_map": {None: schema_name}},
-    )
-    schema_db = sessionmaker(autocommit=False, autoflush=False, bind=schema_db_engine)
-    schema_db = schema_db()
-    return schema_db
+    replica = choose_replica(shard, user_id, last_write) if readonly else None
+    return TenantSession(bind=get_tenant_engine(schema_name, shard, replica))
@@ -0,0 +1,59 @@
+"""
+PRODUCTION SERVER CONFIGURATION
+
+usage:
+    gunicorn main:app
+
+The application is imported once in the gunicorn master (`preload_app`) and the
+workers are forked from it, so they share the imported code pages. The master
+seeds the database in `when_ready`, before the first fork. Anything it created
+holding sockets, threads or processes is reset in `post_fork`, every worker opens
+its own database connections.
+
+`uvicorn main:app --reload` is still the development server.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import os
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import settings
+
+
+def cpu_count() -> int:
+    # cpus the container may run on, not the cpus of the host
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = settings.WEB_WORKERS or cpu_count()
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+accesslog = "-"
+
+
+def when_ready(server):
+    # workers find the seeding done, see `start_data_seeding`
+    from data_seeder import start_data_seeding
+
+    start_data_seeding()
+
+
+def post_fork(server, worker):
+    # imported here, the master has already imported them while preloading
+    from database import dispose_engines
+    from models.units import unit_catalog
+    from scheduler import share_quotas
+    from security.authenticator import reset_password_pool
+
+    # state the master created while seeding, the request caches (sensor indexes,
+    # grids, extents, rate limits, tokens) are only filled by the workers
+    dispose_engines()
+    unit_catalog.clear()
+    reset_password_pool()
+    # tenant quotas are enforced per process
+    share_quotas(server.cfg.workers)
@@ -0,0 +1,231 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+# -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.orm import Session
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import SessionLocal
+from metrics import metrics
+from models.common_models import Job, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
+from security import settings
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("jobs_total", "Background jobs finished")
+
+# job kind -> handler(payload, progress)
+job_handlers = {}
+# job kind -> interval in seconds, see `enqueue_periodic_jobs`
+periodic_jobs = {}
+# advisory lock serializing the periodic job checks of every process
+PERIODIC_JOBS_LOCK_KEY = 5_174_221_094
+PERIODIC_CHECK_SECONDS = 60
+workers = []
+stop_event = threading.Event()
+
+
+class JobRetry(Exception):
+    """
+    Raised by a job handler to put its job back in the queue, e.g. on a lock timeout.
+    """
+
+
+def register_job_handler(kind: str):
+    """
+    Decorator registering the handler of a job kind.
+
+    Handlers receive the job payload and a `progress(message)` callable, they must be
+    idempotent since a job interrupted by a restart is run again.
+    """
+
+    def decorator(handler):
+        job_handlers[kind] = handler
+        return handler
+
+    return decorator
+
+
+def enqueue_job(db: Session, kind: str, payload: dict) -> Job:
+    """
+    Add a job to the queue, the caller commits the session.
+
+    Args:
+        db (Session): public schema session
+        kind (str): registered job kind
+        payload (dict): JSON payload passed to the handler
+
+    Returns:
+        Job: job database object
+    """
+    job = Job(kind=kind, payload=payload, status=JOB_QUEUED)
+    db.add(job)
+    return job
+
+
+def register_periodic_job(kind: str, interval: float):
+    """
+    Enqueue a registered job kind with an empty payload every `interval` seconds.
+    """
+    periodic_jobs[kind] = interval
+
+
+def enqueue_periodic_jobs():
+    """
+    Enqueue the periodic jobs whose last job was created more than their interval ago.
+
+    The check holds a transaction level advisory lock, so the workers of several
+    processes do not enqueue the same run twice.
+    """
+    if not periodic_jobs:
+        return
+    db = SessionLocal()
+    try:
+        locked = db.execute(
+            select(func.pg_try_advisory_xact_lock(PERIODIC_JOBS_LOCK_KEY))
+        ).scalar()
+        if not locked:
+            return
+        last_runs = dict(
+            db.query(Job.kind, func.max(Job.created_at))
+            .filter(Job.kind.in_(periodic_jobs))
+            .group_by(Job.kind)
+            .all()
+        )
+        now = datetime.utcnow()
+        for kind, interval in periodic_jobs.items():
+            last_run = last_runs.get(kind)
+            if last_run is None or now - last_run >= timedelta(seconds=interval):
+                enqueue_job(db, kind, {})
+        db.commit()
+    finally:
+        db.close()
+
+
+def set_job_progress(job_id: str, progress: str):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update(
+            {Job.progress: progress, Job.updated_at: datetime.utcnow()}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def claim_job(db: Session):
+    """
+    Claim the queued job waiting the longest, or a running job whose worker stopped
+    reporting.
+
+    Jobs are ordered by their last update, a retried job goes back to the end of the
+    queue instead of being claimed again before the others. `SKIP LOCKED` lets the
+    workers of every process poll the same table without claiming a job twice.
+
+    Returns:
+        tuple[str, str, dict]: id, kind and payload of the claimed job, None if the queue is empty
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    job = (
+        db.query(Job)
+        .filter(
+            or_(
+                Job.status == JOB_QUEUED,
+                and_(Job.status == JOB_RUNNING, Job.updated_at < stale_before),
+            )
+        )
+        .order_by(Job.updated_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+    job.status = JOB_RUNNING
+    db.commit()
+    return job.id, job.kind, job.payload
+
+
+def finish_job(job_id: str, status: str, error: str = None):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update(
+            {Job.status: status, Job.error: error, Job.updated_at: datetime.utcnow()}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_next_job() -> bool:
+    """
+    Claim and run one job.
+
+    Returns:
+        bool: False when the queue was empty
+    """
+    db = SessionLocal()
+    try:
+        claimed = claim_job(db)
+    finally:
+        db.close()
+    if claimed is None:
+        return False
+
+    job_id, kind, payload = claimed
+    try:
+        handler = job_handlers[kind]
+        handler(payload, lambda progress: set_job_progress(job_id, progress))
+    except JobRetry as error:
+        logger.info("job %s %s retried: %s", kind, job_id, error)
+        finish_job(job_id, JOB_QUEUED, error=str(error))
+        metrics.inc("jobs_total", kind=kind, status="retried")
+        # give the conflicting transaction time before the job is claimed again
+        stop_event.wait(settings.JOB_POLL_SECONDS)
+    except Exception as error:
+        logger.exception("job %s %s failed", kind, job_id)
+        finish_job(job_id, JOB_FAILED, error=str(error).splitlines()[0])
+        metrics.inc("jobs_total", kind=kind, status=JOB_FAILED)
+    else:
+        finish_job(job_id, JOB_SUCCEEDED)
+        metrics.inc("jobs_total", kind=kind, status=JOB_SUCCEEDED)
+    return True
+
+
+def work():
+    next_periodic_check = 0
+    while not stop_event.is_set():
+        try:
+            if time.monotonic() >= next_periodic_check:
+                next_periodic_check = time.monotonic() + PERIODIC_CHECK_SECONDS
+                enqueue_periodic_jobs()
+            if run_next_job():
+                continue
+        except Exception:
+            logger.exception("job worker could not poll the queue")
+        stop_event.wait(settings.JOB_POLL_SECONDS)
+
+
+def start_job_workers():
+    """
+    Start `settings.JOB_WORKERS` daemon threads running queued jobs.
+    """
+    stop_event.clear()
+    for _ in range(settings.JOB_WORKERS - len(workers)):
+        worker = threading.Thread(target=work, name="job-worker", daemon=True)
+        worker.start()
+        workers.append(worker)
+
+
+def stop_job_workers():
+    """
+    Ask the job workers to stop after their current job.
+    """
+    stop_event.set()
+    for worker in workers:
+        worker.join(timeout=settings.JOB_POLL_SECONDS)
+    workers.clear()
@@ -6,9 +6,13 @@ from fastapi import FastAPI
 # -------------------------------- ROUTES IMPORTS --------------------------------#
 from routes.user.routes import user_route
 from routes.coverage.routes import coverage_route
+from routes.admin.routes import admin_route
+from routes.metrics.routes import metrics_route
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from data_seeder import start_data_seeding
+from jobs import start_job_workers, stop_job_workers
+from security.authenticator import shutdown_password_pool
 
 # FASTAPI application initialization
 app = FastAPI()
@@ -16,8 +20,17 @@ app = FastAPI()
 # including routers
 app.include_router(user_route)
 app.include_router(coverage_route)
+app.include_router(admin_route)
+app.include_router(metrics_route)
 
 
 @app.on_event("startup")
 async def startup_event():
     start_data_seeding()
+    start_job_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_job_workers()
+    shutdown_password_pool()
@@ -0,0 +1,540 @@
+"""
+IMPORT COVERAGE DATASETS LISTED IN A MANIFEST
+
+usage:
+    python -m management.import_datasets <manifest> [--workers 4] [--coverages 2] [--loaders 2] [--existing]
+
+The manifest is a JSON (or YAML, with PyYAML installed) list of coverages and the
+dataset files loaded into their tables, file paths are relative to the manifest:
+
+    [
+        {
+            "coverage": "Dijon",
+            "datasets": [
+                {"file": "data/dijon_sensor_data.geojson", "table": "sensor"},
+                {"file": "data/dijon_sensor_reading_data.csv", "table": "sensor_reading"}
+            ]
+        }
+    ]
+
+Missing coverages are created, existing ones are skipped unless `--existing` is
+given. Files are parsed by a pool of worker processes: CSV and newline delimited
+GeoJSON files are split into byte ranges parsed independently, a GeoJSON feature
+collection is parsed by one worker. Parsed rows go through a bounded queue to
+loader threads, so parsing overlaps loading and a slow database holds the parsers
+back instead of filling the memory. The datasets of a coverage are loaded in
+manifest order (sensor readings reference sensors), coverages are loaded
+concurrently.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import os
+import sys
+import csv
+import time
+import queue
+import orjson
+import pathlib
+import argparse
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from shapely.geometry import shape
+
+# -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from sqlalchemy import Integer, Float
+from geoalchemy2 import Geometry
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import SessionLocal, get_tenant_engine
+from models.common_models import Coverage
+from models.coverage_models import Sensor, SensorReading, Sink
+from routes.coverage.spatial import SRID
+from routes.coverage.utils import create_coverage, drop_coverage
+from routes.coverage.extent import refresh_extent
+
+# tables a dataset can be loaded into
+TABLES = {
+    "sensor": Sensor.__table__,
+    "sensor_reading": SensorReading.__table__,
+    "sink": Sink.__table__,
+}
+# CSV and GeoJSON lines files are parsed in byte ranges of this size
+CHUNK_BYTES = 4 * 1024 * 1024
+# rows per INSERT
+BATCH_ROWS = 5000
+# parsed batches waiting for a loader, per dataset
+QUEUE_BATCHES = 8
+
+
+class StageStats:
+    """
+    Rows and busy seconds of a pipeline stage, summed over all its workers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, rows: int, seconds: float):
+        with self._lock:
+            self.rows += rows
+            self.seconds += seconds
+
+    def __str__(self):
+        rate = self.rows / self.seconds if self.seconds else 0
+        return (
+            f"{self.name}: {self.rows} rows, {self.seconds:.1f}s busy "
+            f"({rate:.0f} rows/s per worker)"
+        )
+
+
+def load_manifest(path: pathlib.Path) -> list:
+    """
+    Read and check a dataset manifest.
+
+    Raises:
+        ValueError: if an entry has no coverage name or targets an unknown table
+    """
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("YAML manifests need the PyYAML package")
+        manifest = yaml.safe_load(path.read_text())
+    else:
+        manifest = orjson.loads(path.read_bytes())
+    for entry in manifest:
+        if not entry.get("coverage"):
+            raise ValueError(f"Manifest entry without a coverage name: {entry}")
+        for dataset in entry.get("datasets", []):
+            if dataset.get("table") not in TABLES:
+                raise ValueError(
+                    f"Unknown table {dataset.get('table')} for coverage "
+                    f"{entry['coverage']}, expected one of {', '.join(TABLES)}"
+                )
+    return manifest
+
+
+def column_kinds(table) -> dict:
+    """
+    Return how the file values of each table column are converted by the parsers.
+
+    Unit columns are left as symbols, their type converts them to unit codes, and
+    columns with a Python default are only set when the file has them.
+    """
+    kinds = {}
+    for column in table.columns:
+        if isinstance(column.type, Geometry):
+            kinds[column.name] = "geometry"
+        elif isinstance(column.type, Integer):
+            kinds[column.name] = "int"
+        elif isinstance(column.type, Float):
+            kinds[column.name] = "float"
+        elif column.default is not None:
+            kinds[column.name] = "optional"
+        else:
+            kinds[column.name] = "text"
+    return kinds
+
+
+def convert(value, kind: str):
+    if value is None or value == "":
+        return None
+    if kind == "int":
+        try:
+            return int(value)
+        except ValueError:
+            return int(float(value))
+    if kind == "float":
+        return float(value)
+    if kind == "geometry":
+        return f"SRID={SRID};{shape(value).wkt}"
+    return value
+
+
+def to_row(record: dict, kinds: dict) -> dict:
+    # every row has the same keys for the executemany INSERT
+    return {
+        name: convert(record.get(name), kind)
+        for name, kind in kinds.items()
+        if kind != "optional" or record.get(name) not in (None, "")
+    }
+
+
+def read_lines(path: str, start: int, end: int):
+    """
+    Yield the lines of a file starting in the byte range [start, end).
+    """
+    with open(path, "rb") as file:
+        if start:
+            # the line running over `start` belongs to the previous range
+            file.seek(start - 1)
+            file.readline()
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            yield line
+
+
+def parse_csv_range(path: str, fields: list, kinds: dict, start: int, end: int):
+    """
+    Worker process task parsing the CSV rows of a byte range.
+
+    Rows are split on newlines, quoted values must not contain line breaks.
+
+    Returns:
+        tuple[list, float]: rows and parse seconds
+    """
+    started = time.monotonic()
+    lines = (line.decode("utf-8") for line in read_lines(path, start, end))
+    rows = [to_row(dict(zip(fields, values)), kinds) for values in csv.reader(lines)]
+    return rows, time.monotonic() - started
+
+
+def feature_row(feature: dict, kinds: dict) -> dict:
+    return to_row(
+        {**(feature.get("properties") or {}), "geometry": feature.get("geometry")},
+        kinds,
+    )
+
+
+def parse_geojson_lines_range(path: str, kinds: dict, start: int, end: int):
+    """
+    Worker process task parsing the GeoJSON features, one per line, of a byte range.
+
+    Returns:
+        tuple[list, float]: rows and parse seconds
+    """
+    started = time.monotonic()
+    rows = [
+        feature_row(orjson.loads(line), kinds)
+        for line in read_lines(path, start, end)
+        if line.strip()
+    ]
+    return rows, time.monotonic() - started
+
+
+def parse_geojson(path: str, kinds: dict):
+    """
+    Worker process task parsing a GeoJSON feature collection.
+
+    Returns:
+        tuple[list, float]: rows and parse seconds
+    """
+    started = time.monotonic()
+    with open(path, "rb") as file:
+        features = orjson.loads(file.read())["features"]
+    rows = [feature_row(feature, kinds) for feature in features]
+    return rows, time.monotonic() - started
+
+
+def byte_ranges(path: pathlib.Path, offset: int = 0) -> list:
+    size = path.stat().st_size
+    return [
+        (start, min(start + CHUNK_BYTES, size))
+        for start in range(offset, size, CHUNK_BYTES)
+    ]
+
+
+def parse_tasks(path: pathlib.Path, kinds: dict) -> list:
+    """
+    Split the parsing of a dataset file into worker process tasks.
+
+    Returns:
+        list[tuple]: task function and its arguments
+
+    Raises:
+        ValueError: if the file format is not supported
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with open(path, "rb") as file:
+            header = file.readline()
+        fields = next(csv.reader([header.decode("utf-8-sig")]))
+        return [
+            (parse_csv_range, str(path), fields, kinds, start, end)
+            for start, end in byte_ranges(path, len(header))
+        ]
+    if suffix in (".geojsonl", ".geojsons", ".ndjson"):
+        return [
+            (parse_geojson_lines_range, str(path), kinds, start, end)
+            for start, end in byte_ranges(path)
+        ]
+    if suffix in (".geojson", ".json"):
+        return [(parse_geojson, str(path), kinds)]
+    raise ValueError(f"Unsupported dataset file {path.name}")
+
+
+def parsed_rows(executor, tasks: list, in_flight: int):
+    """
+    Yield the results of parse tasks as they complete, with at most `in_flight`
+    tasks submitted at a time.
+    """
+    tasks = iter(tasks)
+    pending = set()
+    while True:
+        for task in itertools.islice(tasks, in_flight - len(pending)):
+            pending.add(executor.submit(*task))
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def load_batches(batches: queue.Queue, engine, table, stats: StageStats, errors):
+    """
+    Loader thread inserting parsed batches until it gets None.
+    """
+    defaults = {
+        column.name: column.default.arg
+        for column in table.columns
+        if column.default is not None and column.default.is_callable
+    }
+    while True:
+        rows = batches.get()
+        if rows is None:
+            return
+        if errors:
+            # keep draining after a failure so the producer never blocks
+            continue
+        started = time.monotonic()
+        try:
+            for row in rows:
+                for name, default in defaults.items():
+                    if name not in row:
+                        row[name] = default(None)
+            with engine.begin() as connection:
+                connection.execute(table.insert(), rows)
+        except Exception as error:
+            errors.append(error)
+            continue
+        stats.add(len(rows), time.monotonic() - started)
+
+
+def load_dataset(
+    executor,
+    path: pathlib.Path,
+    table_name: str,
+    schema_name: str,
+    shard: str,
+    loaders: int,
+    stats: dict,
+) -> int:
+    """
+    Parse a dataset file in the worker processes and load it with loader threads.
+
+    Args:
+        executor (ProcessPoolExecutor): parse workers
+        path (Path): dataset file
+        table_name (str): key of `TABLES`
+        schema_name (str): coverage db schema name
+        shard (str): shard holding the schema
+        loaders (int): loader threads
+        stats (dict): `parse`, `queue` and `load` StageStats
+
+    Returns:
+        int: rows loaded
+
+    Raises:
+        Exception: the first parse or load error
+    """
+    table = TABLES[table_name]
+    kinds = column_kinds(table)
+    engine = get_tenant_engine(schema_name, shard)
+    batches = queue.Queue(maxsize=QUEUE_BATCHES)
+    errors = []
+    threads = [
+        threading.Thread(
+            target=load_batches,
+            args=(batches, engine, table, stats["load"], errors),
+            daemon=True,
+        )
+        for _ in range(loaders)
+    ]
+    for thread in threads:
+        thread.start()
+    rows_parsed = 0
+    try:
+        for rows, seconds in parsed_rows(
+            executor, parse_tasks(path, kinds), QUEUE_BATCHES
+        ):
+            stats["parse"].add(len(rows), seconds)
+            rows_parsed += len(rows)
+            for start in range(0, len(rows), BATCH_ROWS):
+                batch = rows[start : start + BATCH_ROWS]
+                started = time.monotonic()
+                batches.put(batch)
+                stats["queue"].add(len(batch), time.monotonic() - started)
+            if errors:
+                break
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return rows_parsed
+
+
+def import_coverage(
+    executor, entry: dict, base: pathlib.Path, loaders: int, existing: bool, stats
+) -> int:
+    """
+    Create the coverage of a manifest entry if needed and load its datasets in order.
+
+    A coverage created here is dropped again when a dataset fails to load, so the
+    next run imports it from scratch instead of skipping it as existing.
+
+    Returns:
+        int: rows loaded, None if the coverage exists and `existing` is False
+    """
+    name = entry["coverage"]
+    db = SessionLocal()
+    try:
+        coverage = db.query(Coverage).filter(Coverage.name == name).first()
+        if coverage is None:
+            coverage_id, schema_name, shard = create_coverage(name=name, db=db)
+        elif not existing:
+            return None
+        else:
+            coverage_id, schema_name, shard = (
+                coverage.id,
+                coverage.db_schema,
+                coverage.shard,
+            )
+        created = coverage is None
+    finally:
+        db.close()
+
+    total = 0
+    try:
+        for dataset in entry.get("datasets", []):
+            started = time.monotonic()
+            rows = load_dataset(
+                executor,
+                base / dataset["file"],
+                dataset["table"],
+                schema_name,
+                shard,
+                loaders,
+                stats,
+            )
+            elapsed = time.monotonic() - started
+            print(
+                f"{name}/{dataset['table']}: {rows} rows from {dataset['file']} in "
+                f"{elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+            total += rows
+    except Exception:
+        if created:
+            drop_coverage({"coverage_id": coverage_id}, lambda message: None)
+        raise
+    # filters outside of the extent are answered without a query
+    refresh_extent(coverage_id)
+    return total
+
+
+def import_datasets(
+    manifest_path,
+    workers: int = None,
+    coverages: int = 2,
+    loaders: int = 2,
+    existing: bool = False,
+) -> list:
+    """
+    Import the datasets of a manifest.
+
+    Args:
+        manifest_path: JSON or YAML manifest
+        workers (int, optional): parse worker processes, the cpu count by default
+        coverages (int, optional): coverages loaded concurrently
+        loaders (int, optional): loader threads per dataset
+        existing (bool, optional): also load into coverages which already exist
+
+    Returns:
+        list: failed coverages with their error
+    """
+    manifest_path = pathlib.Path(manifest_path)
+    manifest = load_manifest(manifest_path)
+    stats = {name: StageStats(name) for name in ("parse", "queue", "load")}
+    started = time.monotonic()
+    failed = []
+    total = 0
+    # spawned workers do not inherit the connection pools of this process
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor, ThreadPoolExecutor(max_workers=max(1, coverages)) as threads:
+        futures = {
+            threads.submit(
+                import_coverage,
+                executor,
+                entry,
+                manifest_path.parent,
+                loaders,
+                existing,
+                stats,
+            ): entry["coverage"]
+            for entry in manifest
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                rows = future.result()
+            except Exception as error:
+                failed.append((name, str(error)))
+                print(f"{name}: failed: {error}")
+                continue
+            if rows is None:
+                print(f"{name}: exists, skipped")
+            else:
+                total += rows
+
+    elapsed = time.monotonic() - started
+    print(stats["parse"])
+    print(stats["load"])
+    # time the parsers waited for a free queue slot, high when loading is the bottleneck
+    print(f"queue: {stats['queue'].seconds:.1f}s blocked on a full queue")
+    print(
+        f"{total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import coverage datasets")
+    parser.add_argument("manifest", help="JSON or YAML dataset manifest")
+    parser.add_argument("--workers", type=int, help="parse worker processes")
+    parser.add_argument(
+        "--coverages", type=int, default=2, help="coverages loaded concurrently"
+    )
+    parser.add_argument(
+        "--loaders", type=int, default=2, help="loader threads per dataset"
+    )
+    parser.add_argument(
+        "--existing",
+        action="store_true",
+        help="also load into coverages which already exist",
+    )
+    arguments = parser.parse_args()
+    failed = import_datasets(
+        arguments.manifest,
+        arguments.workers,
+        arguments.coverages,
+        arguments.loaders,
+        arguments.existing,
+    )
+    sys.exit(1 if failed else 0)
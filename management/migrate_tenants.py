@@ -0,0 +1,151 @@
+"""
+APPLY TENANT MIGRATIONS TO EVERY COVERAGE DB SCHEMA
+
+usage:
+    python -m management.migrate_tenants [--revision head] [--workers 8] [--coverage <name> ...]
+
+Tenant revisions live in `migrations/tenant` and every schema tracks its own
+revision in `<schema>.alembic_version`. Schemas are migrated concurrently by a
+pool of worker processes, Alembic's `op` and `context` proxies are process
+globals. Each schema is upgraded in a single transaction, so a failed schema
+stays at its previous revision and running the command again resumes where it
+stopped: schemas already at the target revision are skipped.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import sys
+import time
+import pathlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# -------------------------------- ALEMBIC IMPORTS --------------------------------#
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from alembic.runtime.migration import MigrationContext
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import SessionLocal, get_shard_engine
+from models.common_models import Coverage, COVERAGE_ACTIVE
+
+ALEMBIC_INI = pathlib.Path(__file__).resolve().parent.parent / "alembic.ini"
+# one migration at a time in a process, see the module docstring
+migration_lock = threading.Lock()
+
+
+def tenant_config(schema_name: str, shard: str, connection=None) -> Config:
+    config = Config(str(ALEMBIC_INI), ini_section="tenant")
+    config.attributes["schema"] = schema_name
+    config.attributes["shard"] = shard
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_schema(schema_name: str, shard: str, revision="head", connection=None):
+    """
+    Upgrade one coverage schema to a tenant revision.
+
+    Args:
+        schema_name (str): coverage db schema name
+        shard (str): shard holding the schema
+        revision (str, optional): target tenant revision
+        connection (Connection, optional): shard connection, the upgrade joins its
+            transaction when one is open
+    """
+    with migration_lock:
+        if connection is not None:
+            command.upgrade(tenant_config(schema_name, shard, connection), revision)
+            return
+        with get_shard_engine(shard).connect() as connection:
+            command.upgrade(tenant_config(schema_name, shard, connection), revision)
+
+
+def migrate_schema(name: str, schema_name: str, shard: str, revision: str):
+    """
+    Worker process task upgrading a coverage schema unless it is at `revision`.
+
+    Returns:
+        tuple: coverage name, `migrated`, `skipped` or `failed`, revision before the
+        run and the error message of a failure
+    """
+    script = ScriptDirectory.from_config(tenant_config(schema_name, shard))
+    target = script.get_revision(revision).revision
+    # unknown when the failure happens before the version table was read
+    current = None
+    try:
+        with get_shard_engine(shard).connect() as connection:
+            current = MigrationContext.configure(
+                connection, opts={"version_table_schema": schema_name}
+            ).get_current_revision()
+            if current == target:
+                return name, "skipped", current, None
+            upgrade_schema(schema_name, shard, revision, connection)
+        return name, "migrated", current, None
+    except Exception as error:
+        return name, "failed", current, str(error).splitlines()[0]
+
+
+def migrate_tenants(revision: str = "head", workers: int = 8, names: list = None):
+    """
+    Upgrade every active coverage schema to a tenant revision.
+
+    Args:
+        revision (str, optional): target tenant revision
+        workers (int, optional): number of worker processes
+        names (list, optional): only migrate these coverages
+
+    Returns:
+        list: failed coverages with their error
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(Coverage.name, Coverage.db_schema, Coverage.shard).filter(
+            Coverage.status == COVERAGE_ACTIVE
+        )
+        if names:
+            query = query.filter(Coverage.name.in_(names))
+        coverages = query.order_by(Coverage.name).all()
+    finally:
+        db.close()
+
+    started_at = time.monotonic()
+    counts = {"migrated": 0, "skipped": 0, "failed": 0}
+    failed = []
+    # spawned workers open their own connections instead of sharing the parent pool
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(coverages))),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = [
+            executor.submit(migrate_schema, name, schema_name, shard, revision)
+            for name, schema_name, shard in coverages
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            name, outcome, current, error = future.result()
+            counts[outcome] += 1
+            if outcome == "failed":
+                failed.append((name, error))
+                print(f"{name}: failed at revision {current}: {error}")
+            if done % 50 == 0 or done == len(futures):
+                elapsed = time.monotonic() - started_at
+                print(
+                    f"{done}/{len(futures)} schemas in {elapsed:.1f}s "
+                    f"({done / elapsed:.1f} schemas/s), "
+                    + ", ".join(f"{count} {key}" for key, count in counts.items())
+                )
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate every coverage schema")
+    parser.add_argument("--revision", default="head", help="target tenant revision")
+    parser.add_argument("--workers", type=int, default=8, help="worker processes")
+    parser.add_argument(
+        "--coverage", action="append", help="only migrate this coverage, repeatable"
+    )
+    arguments = parser.parse_args()
+    failed = migrate_tenants(arguments.revision, arguments.workers, arguments.coverage)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,283 @@
+"""
+MOVE A COVERAGE DB SCHEMA TO ANOTHER DATABASE SHARD
+
+usage:
+    python -m management.move_coverage <coverage name> <target shard> [--keep-source]
+
+The schema is bulk copied from one snapshot while the coverage keeps serving reads
+and writes from its current shard. Writes are then blocked for the catch-up phase
+only: rows written or deleted by transactions the snapshot may not have seen are
+found by their `change_xid` and tombstones (see `routes/coverage/changes.py`) and
+synchronised, `Coverage.shard` is switched and the lock is released.
+
+Writers which read the old shard before the switch, e.g. queued behind the lock,
+still commit to the source. The move waits for them and adds the rows they wrote
+to the target before the source schema is dropped.
+"""
+
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import time
+import argparse
+
+# -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.schema import DropSchema
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import (
+    SessionLocal,
+    get_shard_names,
+    get_tenant_engine,
+    evict_tenant_engine,
+)
+from models.common_models import Coverage, COVERAGE_ACTIVE
+from models.coverage_models import Sensor, SensorReading, Sink, ChangeTombstone
+from routes.coverage.utils import create_tenant_tables
+from routes.coverage.extent import refresh_extent
+
+# tables in foreign key order, rows are deleted in reverse order
+TENANT_TABLES = [Sensor.__table__, SensorReading.__table__, Sink.__table__]
+# rows copied per INSERT
+BATCH_SIZE = 5000
+# maximum wait for the writers still using the source after the switch
+DRAIN_TIMEOUT_SECONDS = 60
+
+
+def copy_rows(
+    source_connection, target_connection, table, where=None, on_conflict=None
+) -> int:
+    """
+    Copy the rows of a table between two tenant connections in batches.
+
+    Rows already in the target fail the copy, unless `on_conflict` is `update`,
+    overwriting them, or `ignore`, keeping them.
+    """
+    statement = select(table)
+    if where is not None:
+        statement = statement.where(where)
+    insert_statement = insert(table)
+    if on_conflict == "update":
+        insert_statement = upsert(table)
+        insert_statement = insert_statement.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={
+                column.name: insert_statement.excluded[column.name]
+                for column in table.columns
+                if column.name != "id"
+            },
+        )
+    elif on_conflict == "ignore":
+        insert_statement = upsert(table).on_conflict_do_nothing(
+            index_elements=[table.c.id]
+        )
+    result = source_connection.execution_options(stream_results=True).execute(statement)
+    copied = 0
+    for rows in result.partitions(BATCH_SIZE):
+        target_connection.execute(
+            insert_statement, [dict(row._mapping) for row in rows]
+        )
+        copied += len(rows)
+    return copied
+
+
+def snapshot_xmin(connection) -> int:
+    # transactions from this id on may not be visible to the snapshot
+    return connection.execute(
+        select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+    ).scalar()
+
+
+def delete_removed_rows(source_connection, target_connection, table, since_xid) -> int:
+    """
+    Delete the rows of a table with a source tombstone from `since_xid` on.
+    """
+    statement = select(ChangeTombstone.row_id).where(
+        ChangeTombstone.table_name == table.name,
+        ChangeTombstone.change_xid >= since_xid,
+    )
+    result = source_connection.execution_options(stream_results=True).execute(statement)
+    # tombstones keep the id as text
+    id_type = table.c.id.type.python_type
+    removed = 0
+    for row_ids in result.scalars().partitions(BATCH_SIZE):
+        target_connection.execute(
+            delete(table).where(table.c.id.in_([id_type(x) for x in row_ids]))
+        )
+        removed += len(row_ids)
+    return removed
+
+
+def catch_up(
+    source_connection, target_connection, since_xid: int, on_conflict: str = "update"
+) -> int:
+    """
+    Apply to the target the deletes and writes of source transactions from `since_xid`.
+
+    Deletes run first, in reverse foreign key order so readings go before their
+    sensor, then the written rows in foreign key order.
+
+    Args:
+        source_connection: source tenant connection
+        target_connection: target tenant connection
+        since_xid (int): xmin of the snapshot the target is up to date with
+        on_conflict (str, optional): `update` overwrites the target rows with the
+            source version, `ignore` only adds the rows missing from the target
+
+    Returns:
+        int: rows deleted and written
+    """
+    applied = 0
+    for table in reversed(TENANT_TABLES):
+        removed = delete_removed_rows(
+            source_connection, target_connection, table, since_xid
+        )
+        print(f"{table.name}: {removed} deleted rows removed")
+        applied += removed
+    for table in TENANT_TABLES:
+        written = copy_rows(
+            source_connection,
+            target_connection,
+            table,
+            table.c.change_xid >= since_xid,
+            on_conflict=on_conflict,
+        )
+        print(f"{table.name}: {written} written rows caught up")
+        applied += written
+    return applied
+
+
+def switch_shard(db, coverage_id: str, source_shard: str, target_shard: str):
+    """
+    Point a coverage to the target shard, in the transaction of `db`.
+
+    The coverage row is locked and checked first, a coverage moved or deleted
+    meanwhile aborts the move. Change cursors and `extent_xid` hold transaction ids
+    of the source shard, the change epoch is bumped and the extent snapshot cleared
+    in the same statement.
+    """
+    current = db.execute(
+        select(Coverage.shard, Coverage.status)
+        .where(Coverage.id == coverage_id)
+        .with_for_update()
+    ).first()
+    if (
+        current is None
+        or current.shard != source_shard
+        or current.status != COVERAGE_ACTIVE
+    ):
+        raise SystemExit("The coverage was moved or deleted meanwhile, move aborted")
+    db.execute(
+        update(Coverage)
+        .where(Coverage.id == coverage_id)
+        .values(
+            shard=target_shard,
+            change_epoch=Coverage.change_epoch + 1,
+            extent_xid=None,
+        )
+    )
+
+
+def wait_for_writers(connection, schema_name: str, timeout: float) -> bool:
+    """
+    Wait until no other session holds or waits for a write lock on the tenant tables.
+
+    Returns:
+        bool: False when writers were still there after `timeout` seconds
+    """
+    relations = [f'"{schema_name}"."{table.name}"' for table in TENANT_TABLES]
+    deadline = time.monotonic() + timeout
+    while True:
+        writers = connection.exec_driver_sql(
+            "SELECT count(*) FROM pg_locks WHERE relation = ANY(%s::regclass[]) "
+            "AND mode = 'RowExclusiveLock' AND pid <> pg_backend_pid()",
+            (relations,),
+        ).scalar()
+        if not writers:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.5)
+
+
+def move_coverage(name: str, target_shard: str, keep_source: bool = False):
+    db = SessionLocal()
+    try:
+        coverage = db.query(Coverage).filter(Coverage.name == name).first()
+        if not coverage:
+            raise SystemExit(f"Not coverage exists with name {name}")
+        if target_shard not in get_shard_names():
+            raise SystemExit(f"Unknown database shard {target_shard}")
+        if coverage.shard == target_shard:
+            raise SystemExit(f"{name} is already on shard {target_shard}")
+        coverage_id = coverage.id
+        source_shard, schema_name = coverage.shard, coverage.db_schema
+    finally:
+        # no public schema transaction is kept open during the copy
+        db.close()
+
+    source_engine = get_tenant_engine(schema_name, source_shard)
+    target_engine = get_tenant_engine(schema_name, target_shard)
+    start_time = time.time()
+
+    # 1. bulk copy from one snapshot while the coverage is online
+    create_tenant_tables(schema_name, target_shard)
+    snapshot_engine = source_engine.execution_options(isolation_level="REPEATABLE READ")
+    with snapshot_engine.connect() as source, target_engine.begin() as target:
+        with source.begin():
+            copy_xid = snapshot_xmin(source)
+            for table in TENANT_TABLES:
+                copied = copy_rows(source, target, table)
+                print(f"{table.name}: {copied} rows copied")
+    print(f"bulk copy done in {time.time() - start_time:.1f}s")
+
+    # 2. catch up with writes blocked, reads keep working
+    lock_time = time.time()
+    with source_engine.begin() as source:
+        for table in TENANT_TABLES:
+            source.exec_driver_sql(
+                f'LOCK TABLE "{schema_name}"."{table.name}" IN EXCLUSIVE MODE'
+            )
+        # writers waiting for the lock commit with a transaction id from here on
+        drain_xid = snapshot_xmin(source)
+        with target_engine.begin() as target:
+            catch_up(source, target, copy_xid)
+        # switch the coverage before the source lock is released
+        db = SessionLocal()
+        try:
+            switch_shard(db, coverage_id, source_shard, target_shard)
+            db.commit()
+        finally:
+            db.close()
+    print(f"writes blocked for {time.time() - lock_time:.1f}s")
+    refresh_extent(coverage_id)
+
+    # 3. add the rows of the writers which still used the source, the target is
+    # serving writes already so its rows are kept
+    with source_engine.connect() as source:
+        drained = wait_for_writers(source, schema_name, DRAIN_TIMEOUT_SECONDS)
+    with source_engine.begin() as source, target_engine.begin() as target:
+        late = catch_up(source, target, drain_xid, on_conflict="ignore")
+    if late:
+        print(f"{late} late rows written to the source applied")
+    if not drained:
+        print("writers still use the source, it is kept")
+        keep_source = True
+
+    # 4. drop the source schema
+    if not keep_source:
+        with source_engine.begin() as source:
+            source.execute(DropSchema(schema_name, cascade=True))
+    evict_tenant_engine(schema_name)
+    print(f"{name} moved from {source_shard} to {target_shard}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move a coverage to another shard")
+    parser.add_argument("name", help="coverage name")
+    parser.add_argument("shard", help="target shard name")
+    parser.add_argument(
+        "--keep-source", action="store_true", help="do not drop the source schema"
+    )
+    arguments = parser.parse_args()
+    move_coverage(arguments.name, arguments.shard, keep_source=arguments.keep_source)
@@ -0,0 +1,63 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import threading
+from collections import defaultdict
+
+
+def escape(label_value) -> str:
+    return (
+        str(label_value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+class Metrics:
+    """
+    Thread safe in-process counters and gauges, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._descriptions = {}
+
+    def describe(self, name: str, description: str):
+        self._descriptions[name] = description
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def value(self, name: str, **labels) -> float:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def render(self) -> str:
+        with self._lock:
+            samples = [
+                *(("counter", key, value) for key, value in self._counters.items()),
+                *(("gauge", key, value) for key, value in self._gauges.items()),
+            ]
+        lines, described = [], set()
+        for kind, (name, labels), value in sorted(samples, key=lambda x: x[1]):
+            if name not in described:
+                if name in self._descriptions:
+                    lines.append(f"# HELP {name} {self._descriptions[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+            label_text = ",".join(
+                f'{label}="{escape(label_value)}"' for label, label_value in labels
+            )
+            lines.append(
+                f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,76 @@
+from logging.config import fileConfig
+
+from sqlalchemy import text
+
+from alembic import context
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import PRIMARY_SHARD, get_shard_engine
+
+# this is the Alembic Config object, which provides
+# access to the values within the .ini file in use.
+config = context.config
+
+# Interpret the config file for Python logging, unless the caller already did
+# (management.migrate_tenants runs many schemas in the same process).
+if config.config_file_name is not None and not config.attributes.get("connection"):
+    fileConfig(config.config_file_name)
+
+# tenant revisions are written against the frozen tables, not the models
+target_metadata = None
+
+# schema and shard come from `management.migrate_tenants` or `-x schema=... -x shard=...`
+x_arguments = context.get_x_argument(as_dictionary=True)
+schema_name = config.attributes.get("schema") or x_arguments.get("schema")
+shard = config.attributes.get("shard") or x_arguments.get("shard", PRIMARY_SHARD)
+if not schema_name:
+    raise RuntimeError("Tenant migrations need a schema, e.g. `-x schema=<db schema>`")
+
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode, emitting the SQL of one schema."""
+    context.configure(
+        url=get_shard_engine(shard).url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        version_table_schema=schema_name,
+    )
+
+    with context.begin_transaction():
+        context.execute(f'SET LOCAL search_path TO "{schema_name}", public')
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode.
+
+    All revisions of a schema run in one transaction, a failing schema is left at
+    its previous revision and is resumed by the next run.
+
+    """
+    connection = config.attributes.get("connection")
+    if connection is None:
+        with get_shard_engine(shard).connect() as connection:
+            run_schema_migrations(connection)
+    else:
+        run_schema_migrations(connection)
+
+
+def run_schema_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        version_table_schema=schema_name,
+    )
+
+    with context.begin_transaction():
+        # unqualified names resolve to the tenant schema, PostGIS lives in public
+        connection.execute(text(f'SET LOCAL search_path TO "{schema_name}", public'))
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,122 @@
+"""Tenant baseline, sensor, sensor_reading and sink tables
+
+Revision ID: 5c1e0a9d7b24
+Revises: 
+Create Date: 2026-10-19 13:10:52.372604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e0a9d7b24'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# unit columns of the sensor_reading table at this revision
+UNIT_COLUMNS = [
+    "air_temperature",
+    "air_humidity",
+    "barometer_temperature",
+    "barometric_pressure",
+    "co2_concentration",
+    "co2_concentration_lpf",
+    "co2_sensor_temperature",
+    "capacitor_voltage_1",
+    "capacitor_voltage_2",
+    "co2_sensor_status",
+    "raw_ir_reading",
+    "raw_ir_reading_lpf",
+    "battery_voltage",
+]
+VALUE_TYPES = {
+    "barometric_pressure": sa.Integer,
+    "co2_concentration": sa.Integer,
+    "co2_concentration_lpf": sa.Integer,
+    "co2_sensor_status": sa.Integer,
+    "raw_ir_reading": sa.Integer,
+    "raw_ir_reading_lpf": sa.Integer,
+}
+
+
+def has_table(table_name):
+    # schemas created before tenant migrations already hold the tables, offline SQL
+    # is generated for a new schema
+    migration_context = op.get_context()
+    if migration_context.as_sql:
+        return False
+    return sa.inspect(op.get_bind()).has_table(
+        table_name, schema=migration_context.version_table_schema
+    )
+
+
+def upgrade() -> None:
+    if not has_table("sensor"):
+        op.create_table(
+            "sensor",
+            sa.Column("id", sa.Integer, primary_key=True, nullable=False),
+            sa.Column("fid", sa.Integer),
+            sa.Column("xcoord", sa.Float),
+            sa.Column("ycoord", sa.Float),
+            sa.Column("zcoord", sa.Float),
+            sa.Column(
+                "geometry",
+                Geometry("POINTZ", dimension=3, srid=4326, spatial_index=False),
+            ),
+        )
+        op.create_index(op.f("ix_sensor_id"), "sensor", ["id"], unique=True)
+        op.create_index(
+            "idx_sensor_geometry", "sensor", ["geometry"], postgresql_using="gist"
+        )
+
+    if not has_table("sensor_reading"):
+        measurement_columns = []
+        for name in UNIT_COLUMNS:
+            measurement_columns.append(
+                sa.Column(f"{name}_value", VALUE_TYPES.get(name, sa.Float))
+            )
+            measurement_columns.append(sa.Column(f"{name}_unit", sa.SmallInteger))
+        op.create_table(
+            "sensor_reading",
+            sa.Column("id", sa.String(length=50), primary_key=True, nullable=False),
+            sa.Column("fid_measurement", sa.Integer),
+            sa.Column("oid", sa.String(length=50)),
+            sa.Column("date_time", sa.DateTime),
+            sa.Column("value_payload", sa.String(length=100)),
+            sa.Column("device_id", sa.Integer, sa.ForeignKey("sensor.id")),
+            sa.Column("protocol_version", sa.Integer),
+            *measurement_columns,
+        )
+        op.create_index(
+            op.f("ix_sensor_reading_id"), "sensor_reading", ["id"], unique=True
+        )
+
+    if not has_table("sink"):
+        op.create_table(
+            "sink",
+            sa.Column("id", sa.String(length=50), primary_key=True, nullable=False),
+            sa.Column("parcel_id", sa.String(length=50)),
+            sa.Column("date_time", sa.DateTime),
+            sa.Column("specie", sa.String(length=50)),
+            sa.Column("age", sa.Integer),
+            sa.Column("area", sa.Integer),
+            sa.Column("ndvi_nocloud", sa.Integer),
+            sa.Column("geometry", Geometry("POLYGON", srid=4326, spatial_index=False)),
+            sa.Column("co2removed", sa.Integer),
+            sa.Column("co2balance", sa.BIGINT),
+            sa.Column("co2emitted", sa.BIGINT),
+            sa.Column("colonna", sa.BIGINT),
+        )
+        op.create_index(op.f("ix_sink_id"), "sink", ["id"], unique=True)
+        op.create_index(
+            "idx_sink_geometry", "sink", ["geometry"], postgresql_using="gist"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("sink")
+    op.drop_table("sensor_reading")
+    op.drop_table("sensor")
@@ -0,0 +1,26 @@
+"""Index sensor readings by device
+
+Revision ID: 8e3f61b2c9d0
+Revises: 5c1e0a9d7b24
+Create Date: 2026-10-19 14:02:33.918402
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f61b2c9d0'
+down_revision = '5c1e0a9d7b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # readings of the sensors resolved by the in-memory sensor index
+    op.create_index(
+        op.f("ix_sensor_reading_device_id"), "sensor_reading", ["device_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_sensor_reading_device_id"), table_name="sensor_reading")
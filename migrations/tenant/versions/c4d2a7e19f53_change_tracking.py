@@ -0,0 +1,102 @@
+"""Track changes of sensor, sensor_reading and sink for delta sync
+
+Revision ID: c4d2a7e19f53
+Revises: 8e3f61b2c9d0
+Create Date: 2026-10-19 16:41:07.552019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2a7e19f53'
+down_revision = '8e3f61b2c9d0'
+branch_labels = None
+depends_on = None
+
+TRACKED_TABLES = ["sensor", "sensor_reading", "sink"]
+
+# requests use a schema translate map instead of the search_path, so the functions
+# qualify the sequence and tombstone table with the schema of the trigger table
+TRACK_CHANGE_FUNCTION = """
+CREATE FUNCTION track_change() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.change_seq := nextval(format('%I.change_seq', TG_TABLE_SCHEMA)::regclass);
+    NEW.change_xid := txid_current();
+    RETURN NEW;
+END
+$$
+"""
+TRACK_DELETE_FUNCTION = """
+CREATE FUNCTION track_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format(
+        'INSERT INTO %I.change_tombstone (change_seq, change_xid, table_name, row_id) '
+        'VALUES (nextval(%L), txid_current(), $1, $2)',
+        TG_TABLE_SCHEMA,
+        format('%I.change_seq', TG_TABLE_SCHEMA)
+    ) USING TG_TABLE_NAME, OLD.id::text;
+    RETURN OLD;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE change_seq")
+    op.create_table(
+        "change_tombstone",
+        sa.Column("change_seq", sa.BigInteger, primary_key=True),
+        sa.Column("change_xid", sa.BigInteger, nullable=False),
+        sa.Column("table_name", sa.String(50), nullable=False),
+        sa.Column("row_id", sa.String(50), nullable=False),
+        sa.Column(
+            "deleted_at", sa.DateTime, nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.create_index(
+        op.f("ix_change_tombstone_change_xid"), "change_tombstone", ["change_xid"]
+    )
+    # tombstones below `compacted_xid` were compacted away
+    op.create_table(
+        "change_horizon",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("compacted_xid", sa.BigInteger, nullable=False),
+    )
+    op.execute("INSERT INTO change_horizon (id, compacted_xid) VALUES (1, 0)")
+    op.execute(TRACK_CHANGE_FUNCTION)
+    op.execute(TRACK_DELETE_FUNCTION)
+
+    for table_name in TRACKED_TABLES:
+        # existing rows keep NULL, they are only returned by a full sync
+        op.add_column(table_name, sa.Column("change_seq", sa.BigInteger))
+        op.add_column(table_name, sa.Column("change_xid", sa.BigInteger))
+        op.create_index(
+            op.f(f"ix_{table_name}_change_xid"), table_name, ["change_xid"]
+        )
+        op.execute(
+            f"CREATE TRIGGER track_change BEFORE INSERT OR UPDATE ON {table_name} "
+            "FOR EACH ROW EXECUTE PROCEDURE track_change()"
+        )
+        op.execute(
+            f"CREATE TRIGGER track_delete AFTER DELETE ON {table_name} "
+            "FOR EACH ROW EXECUTE PROCEDURE track_delete()"
+        )
+
+
+def downgrade() -> None:
+    for table_name in TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER track_delete ON {table_name}")
+        op.execute(f"DROP TRIGGER track_change ON {table_name}")
+        op.drop_index(op.f(f"ix_{table_name}_change_xid"), table_name=table_name)
+        op.drop_column(table_name, "change_xid")
+        op.drop_column(table_name, "change_seq")
+    op.execute("DROP FUNCTION track_delete()")
+    op.execute("DROP FUNCTION track_change()")
+    op.drop_table("change_horizon")
+    op.drop_index(
+        op.f("ix_change_tombstone_change_xid"), table_name="change_tombstone"
+    )
+    op.drop_table("change_tombstone")
+    op.execute("DROP SEQUENCE change_seq")
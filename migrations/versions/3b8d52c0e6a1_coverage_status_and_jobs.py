@@ -0,0 +1,45 @@
+"""Coverage status and background jobs
+
+Revision ID: 3b8d52c0e6a1
+Revises: f1eda90e4729
+Create Date: 2026-10-19 12:03:17.540219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8d52c0e6a1'
+down_revision = 'f1eda90e4729'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "coverage",
+        sa.Column(
+            "status", sa.String(length=20), nullable=False, server_default="active"
+        ),
+    )
+    op.create_table(
+        "job",
+        sa.Column("id", sa.String(length=50), primary_key=True, nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("payload", sa.JSON, nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("progress", sa.String, nullable=True),
+        sa.Column("error", sa.String, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.create_index(op.f("ix_job_id"), "job", ["id"], unique=True)
+    op.create_index(op.f("ix_job_status"), "job", ["status"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_job_status"), table_name="job")
+    op.drop_index(op.f("ix_job_id"), table_name="job")
+    op.drop_table("job")
+    op.drop_column("coverage", "status")
@@ -0,0 +1,28 @@
+"""Coverage change epoch
+
+Revision ID: 6c2e94a1d7b3
+Revises: d81f3c5a2b07
+Create Date: 2026-10-19 21:27:52.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e94a1d7b3'
+down_revision = 'd81f3c5a2b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # bumped when the coverage moves to another shard, see `routes.coverage.changes`
+    op.add_column(
+        "coverage",
+        sa.Column("change_epoch", sa.Integer, nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("coverage", "change_epoch")
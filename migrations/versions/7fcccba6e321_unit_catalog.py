@@ -0,0 +1,86 @@
+"""Unit catalog and small integer unit columns in tenant schemas
+
+Revision ID: 7fcccba6e321
+Revises: 9fba5b95b94e
+Create Date: 2026-10-19 09:12:41.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7fcccba6e321'
+down_revision = '9fba5b95b94e'
+branch_labels = None
+depends_on = None
+
+# unit columns of the sensor_reading table at this revision
+UNIT_COLUMNS = [
+    "air_temperature_unit",
+    "air_humidity_unit",
+    "barometer_temperature_unit",
+    "barometric_pressure_unit",
+    "co2_concentration_unit",
+    "co2_concentration_lpf_unit",
+    "co2_sensor_temperature_unit",
+    "capacitor_voltage_1_unit",
+    "capacitor_voltage_2_unit",
+    "co2_sensor_status_unit",
+    "raw_ir_reading_unit",
+    "raw_ir_reading_lpf_unit",
+    "battery_voltage_unit",
+]
+
+
+def tenant_schemas_with_readings():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    schemas = connection.execute(sa.text("SELECT db_schema FROM coverage")).scalars()
+    return [
+        schema
+        for schema in schemas
+        if schema and inspector.has_table("sensor_reading", schema=schema)
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "unit",
+        sa.Column("id", sa.SmallInteger, primary_key=True, autoincrement=True),
+        sa.Column("symbol", sa.String(length=50), unique=True, nullable=False),
+    )
+    # ALTER COLUMN ... USING does not allow sub queries, the lookup goes through a function
+    op.execute(
+        "CREATE FUNCTION public.unit_code(text) RETURNS smallint LANGUAGE sql STABLE "
+        "AS $$ SELECT id FROM public.unit WHERE symbol = $1 $$"
+    )
+    for schema in tenant_schemas_with_readings():
+        for column in UNIT_COLUMNS:
+            op.execute(
+                f'INSERT INTO public.unit (symbol) SELECT DISTINCT "{column}" '
+                f'FROM "{schema}".sensor_reading WHERE "{column}" IS NOT NULL '
+                "ON CONFLICT (symbol) DO NOTHING"
+            )
+        # a single ALTER TABLE rewrites the table once for all columns
+        alter_columns = ", ".join(
+            f'ALTER COLUMN "{column}" TYPE smallint USING public.unit_code("{column}")'
+            for column in UNIT_COLUMNS
+        )
+        op.execute(f'ALTER TABLE "{schema}".sensor_reading {alter_columns}')
+    op.execute("DROP FUNCTION public.unit_code(text)")
+
+
+def downgrade() -> None:
+    op.execute(
+        "CREATE FUNCTION public.unit_symbol(smallint) RETURNS varchar LANGUAGE sql STABLE "
+        "AS $$ SELECT symbol FROM public.unit WHERE id = $1 $$"
+    )
+    for schema in tenant_schemas_with_readings():
+        alter_columns = ", ".join(
+            f'ALTER COLUMN "{column}" TYPE varchar(50) USING public.unit_symbol("{column}")'
+            for column in UNIT_COLUMNS
+        )
+        op.execute(f'ALTER TABLE "{schema}".sensor_reading {alter_columns}')
+    op.execute("DROP FUNCTION public.unit_symbol(smallint)")
+    op.drop_table("unit")
@@ -0,0 +1,28 @@
+"""Coverage shard placement
+
+Revision ID: a7625cf73837
+Revises: 7fcccba6e321
+Create Date: 2026-10-19 10:02:18.551903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7625cf73837'
+down_revision = '7fcccba6e321'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing coverages live in the primary database
+    op.add_column(
+        "coverage",
+        sa.Column("shard", sa.String(length=50), nullable=False, server_default="primary"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("coverage", "shard")
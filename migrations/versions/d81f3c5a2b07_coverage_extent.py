@@ -0,0 +1,36 @@
+"""Coverage extent
+
+Revision ID: d81f3c5a2b07
+Revises: 3b8d52c0e6a1
+Create Date: 2026-10-19 18:12:44.903615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3c5a2b07'
+down_revision = '3b8d52c0e6a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL until computed by the `refresh_coverage_extents` job
+    op.add_column(
+        "coverage",
+        sa.Column(
+            "extent",
+            Geometry("GEOMETRY", srid=4326, spatial_index=False),
+            nullable=True,
+        ),
+    )
+    # tenant transactions from this id on may have written outside of the extent
+    op.add_column("coverage", sa.Column("extent_xid", sa.BigInteger, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("coverage", "extent_xid")
+    op.drop_column("coverage", "extent")
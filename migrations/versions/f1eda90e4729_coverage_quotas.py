@@ -0,0 +1,30 @@
+"""Coverage quotas
+
+Revision ID: f1eda90e4729
+Revises: a7625cf73837
+Create Date: 2026-10-19 11:20:44.830127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1eda90e4729'
+down_revision = 'a7625cf73837'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("coverage", sa.Column("max_concurrency", sa.Integer, nullable=True))
+    op.add_column("coverage", sa.Column("rate_limit", sa.Float, nullable=True))
+    op.add_column("coverage", sa.Column("rate_burst", sa.Integer, nullable=True))
+    op.add_column("coverage", sa.Column("weight", sa.Float, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("coverage", "weight")
+    op.drop_column("coverage", "rate_burst")
+    op.drop_column("coverage", "rate_limit")
+    op.drop_column("coverage", "max_concurrency")
@@ -1,6 +1,21 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+from datetime import datetime
+
 # -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from geoalchemy2 import Geometry
 from sqlalchemy.orm import relationship
-from sqlalchemy import Boolean, Column, String, ForeignKey
+from sqlalchemy import (
+    Boolean,
+    Column,
+    String,
+    ForeignKey,
+    SmallInteger,
+    Integer,
+    Float,
+    DateTime,
+    JSON,
+    BIGINT,
+)
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from database import Base
@@ -12,6 +27,10 @@ from models.utils import get_random_uuid_string
     OTHER USER CAN ACCESS ONLY IT'S ASSIGNED COVERAGE
 """
 
+# coverage status, a deleting coverage is no longer served and waits for its schema drop
+COVERAGE_ACTIVE = "active"
+COVERAGE_DELETING = "deleting"
+
 
 class Coverage(Base):
     __tablename__ = "coverage"
@@ -29,6 +48,28 @@ class Coverage(Base):
         unique=True,
         default=lambda x: "schema_" + get_random_uuid_string(),
     )
+    # database shard holding `db_schema`, see `database.get_shard_engine`
+    shard = Column(
+        String(50), nullable=False, default="primary", server_default="primary"
+    )
+    # quotas, see `scheduler.tenant_db_slot`, NULL uses the defaults from settings,
+    # totals for the server split between its processes, see `scheduler.share_quotas`
+    max_concurrency = Column(Integer, nullable=True)
+    rate_limit = Column(Float, nullable=True)  # requests per second
+    rate_burst = Column(Integer, nullable=True)
+    weight = Column(Float, nullable=True)  # share of the database slots
+    status = Column(
+        String(20),
+        nullable=False,
+        default=COVERAGE_ACTIVE,
+        server_default=COVERAGE_ACTIVE,
+    )
+    # bounding box of the sensors and sinks, see `routes.coverage.extent`
+    extent = Column(Geometry("GEOMETRY", srid=4326, spatial_index=False), nullable=True)
+    # xmin of the tenant snapshot the extent was computed in
+    extent_xid = Column(BIGINT, nullable=True)
+    # bumped by a shard move, change cursors of other epochs are invalid
+    change_epoch = Column(Integer, nullable=False, default=0, server_default="0")
     user = relationship("User", backref="coverage")
 
 
@@ -46,3 +87,46 @@ class User(Base):
     password = Column(String)
     is_admin = Column(Boolean, default=False)
     coverage_id = Column(String(50), ForeignKey("coverage.id"), nullable=True)
+
+
+class Unit(Base):
+    """
+    Catalog of measurement units, sensor readings store the small integer id
+    instead of repeating the unit symbol on every row.
+    """
+
+    __tablename__ = "unit"
+    id = Column(SmallInteger, primary_key=True, autoincrement=True)
+    symbol = Column(String(50), unique=True, nullable=False)
+
+
+# background job status
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job(Base):
+    """
+    Background job, run by the job workers of `jobs.py`.
+    """
+
+    __tablename__ = "job"
+    id = Column(
+        String(50),
+        primary_key=True,
+        index=True,
+        nullable=False,
+        unique=True,
+        default=get_random_uuid_string,
+    )
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default=JOB_QUEUED, index=True)
+    progress = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
@@ -1,11 +1,12 @@
 # -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy import Column, ForeignKey, String, Float, Integer, DateTime, BIGINT
 from geoalchemy2 import Geometry
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from database import Base
 from models.utils import get_random_uuid_string
+from models.units import UnitCode
 
 
 class Sensor(Base):
@@ -24,6 +25,10 @@ class Sensor(Base):
     ycoord = Column(Float)
     zcoord = Column(Float)
     geometry = Column(Geometry("POINTZ", dimension=3, srid=4326))
+    # set by the `track_change` trigger, see `routes/coverage/changes.py`, deferred
+    # so they are not rendered with the ORM objects
+    change_seq = deferred(Column(BIGINT))
+    change_xid = deferred(Column(BIGINT, index=True))
     sensor_reading = relationship("SensorReading", backref="sensor")
 
 
@@ -41,34 +46,46 @@ class SensorReading(Base):
     oid = Column(String(50))
     date_time = Column(DateTime)
     value_payload = Column(String(100))
-    device_id = Column(Integer, ForeignKey("sensor.id"))
+    device_id = Column(Integer, ForeignKey("sensor.id"), index=True)
     protocol_version = Column(Integer)
     air_temperature_value = Column(Float)
-    air_temperature_unit = Column(String(50))
+    air_temperature_unit = Column(UnitCode)
     air_humidity_value = Column(Float)
-    air_humidity_unit = Column(String(50))
+    air_humidity_unit = Column(UnitCode)
     barometer_temperature_value = Column(Float)
-    barometer_temperature_unit = Column(String(50))
+    barometer_temperature_unit = Column(UnitCode)
     barometric_pressure_value = Column(Integer)
-    barometric_pressure_unit = Column(String(50))
+    barometric_pressure_unit = Column(UnitCode)
     co2_concentration_value = Column(Integer)
-    co2_concentration_unit = Column(String(50))
+    co2_concentration_unit = Column(UnitCode)
     co2_concentration_lpf_value = Column(Integer)
-    co2_concentration_lpf_unit = Column(String(50))
+    co2_concentration_lpf_unit = Column(UnitCode)
     co2_sensor_temperature_value = Column(Float)
-    co2_sensor_temperature_unit = Column(String(50))
+    co2_sensor_temperature_unit = Column(UnitCode)
     capacitor_voltage_1_value = Column(Float)
-    capacitor_voltage_1_unit = Column(String(50))
+    capacitor_voltage_1_unit = Column(UnitCode)
     capacitor_voltage_2_value = Column(Float)
-    capacitor_voltage_2_unit = Column(String(50))
+    capacitor_voltage_2_unit = Column(UnitCode)
     co2_sensor_status_value = Column(Integer, nullable=True)
-    co2_sensor_status_unit = Column(String(50))
+    co2_sensor_status_unit = Column(UnitCode)
     raw_ir_reading_value = Column(Integer, nullable=True)
-    raw_ir_reading_unit = Column(String(50), nullable=True)
+    raw_ir_reading_unit = Column(UnitCode, nullable=True)
     raw_ir_reading_lpf_value = Column(Integer)
-    raw_ir_reading_lpf_unit = Column(String(50), nullable=True)
+    raw_ir_reading_lpf_unit = Column(UnitCode, nullable=True)
     battery_voltage_value = Column(Float)
-    battery_voltage_unit = Column(String(50))
+    battery_voltage_unit = Column(UnitCode)
+    change_seq = deferred(Column(BIGINT))
+    change_xid = deferred(Column(BIGINT, index=True))
+
+
+# change tracking columns, only returned by the changes endpoint
+CHANGE_COLUMNS = ["change_seq", "change_xid"]
+# unit columns are stored as codes of the public unit catalog
+SENSOR_READING_UNIT_COLUMNS = [
+    column.name
+    for column in SensorReading.__table__.columns
+    if isinstance(column.type, UnitCode)
+]
 
 
 class Sink(Base):
@@ -92,3 +109,28 @@ class Sink(Base):
     co2balance = Column(BIGINT, nullable=True)
     co2emitted = Column(BIGINT, nullable=True)
     colonna = Column(BIGINT, nullable=True)
+    change_seq = deferred(Column(BIGINT))
+    change_xid = deferred(Column(BIGINT, index=True))
+
+
+class ChangeTombstone(Base):
+    """
+    Row deleted from a tracked table, written by the `track_delete` trigger.
+    """
+
+    __tablename__ = "change_tombstone"
+    change_seq = Column(BIGINT, primary_key=True)
+    change_xid = Column(BIGINT, nullable=False, index=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(String(50), nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
+
+
+class ChangeHorizon(Base):
+    """
+    Single row, tombstones of transactions below `compacted_xid` were compacted.
+    """
+
+    __tablename__ = "change_horizon"
+    id = Column(Integer, primary_key=True)
+    compacted_xid = Column(BIGINT, nullable=False)
@@ -0,0 +1,100 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import threading
+
+# -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from sqlalchemy import select, SmallInteger
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import insert
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import engine
+from models.common_models import Unit
+
+
+class UnitCatalog:
+    """
+    In-memory cache of the public `unit` table.
+
+    Symbols are translated to their small integer code before they are written and
+    back to the symbol when rows are read, the table is only queried on a cache miss.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with engine.connect() as connection:
+            rows = connection.execute(select(Unit.id, Unit.symbol)).all()
+        self._codes = {symbol: code for code, symbol in rows}
+        self._symbols = {code: symbol for code, symbol in rows}
+
+    def code(self, symbol):
+        """
+        Return the code of a unit symbol, unknown symbols are added to the catalog.
+
+        Args:
+            symbol (str): unit symbol, e.g. `ppm`
+
+        Returns:
+            int: unit code, None for a missing symbol
+        """
+        if symbol is None:
+            return None
+        code = self._codes.get(symbol)
+        if code is not None:
+            return code
+        with self._lock:
+            if symbol not in self._codes:
+                with engine.begin() as connection:
+                    connection.execute(
+                        insert(Unit)
+                        .values(symbol=symbol)
+                        .on_conflict_do_nothing(index_elements=["symbol"])
+                    )
+                self._load()
+            return self._codes[symbol]
+
+    def symbol(self, code):
+        """
+        Return the symbol of a unit code.
+
+        Args:
+            code (int): unit code
+
+        Returns:
+            str: unit symbol, None for a missing code
+        """
+        if code is None:
+            return None
+        symbol = self._symbols.get(code)
+        if symbol is not None:
+            return symbol
+        with self._lock:
+            if code not in self._symbols:
+                self._load()
+            return self._symbols.get(code)
+
+    def clear(self):
+        with self._lock:
+            self._codes = {}
+            self._symbols = {}
+
+
+unit_catalog = UnitCatalog()
+
+
+class UnitCode(TypeDecorator):
+    """
+    Unit column stored as a SMALLINT code and exposed as the unit symbol.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return unit_catalog.code(value)
+
+    def process_result_value(self, value, dialect):
+        return unit_catalog.symbol(value)
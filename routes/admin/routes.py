@@ -0,0 +1,227 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select, func, nullslast
+from sqlalchemy.orm import Session
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.admin import schemas as payload_schemas
+from routes.admin import utils
+from routes.coverage import schemas as coverage_schemas
+from routes.coverage import queries
+from routes.coverage.serializers import FastJSONResponse, rows_to_dicts
+from database import get_public_schema_db
+from security import authenticator
+from models.common_models import Job
+from models.coverage_models import Sensor, SensorReading, Sink
+
+# admin route to handle end-points spanning all coverages
+admin_route = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@admin_route.get("/sensor/count")
+def count_sensors(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Count sensors and sensor readings of every coverage.
+
+    Coverage schemas are queried concurrently.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Returns:
+        dict: counts by coverage, totals and the coverages that failed or timed out.
+
+    Raises:
+        HTTPException: If the user is not authorized to perform this action.
+    """
+    utils.verify_admin(token=token.credentials, db=db)
+
+    def count(schema_db):
+        return {
+            "sensors": schema_db.execute(
+                select(func.count()).select_from(Sensor)
+            ).scalar(),
+            "readings": schema_db.execute(
+                select(func.count()).select_from(SensorReading)
+            ).scalar(),
+        }
+
+    results, failed = utils.fan_out(db=db, query_function=count)
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "data": [{"coverage": name, **counts} for name, counts in results.items()],
+            "total": {
+                "sensors": sum(counts["sensors"] for counts in results.values()),
+                "readings": sum(counts["readings"] for counts in results.values()),
+            },
+            "failed": failed,
+        },
+        request=request,
+    )
+
+
+@admin_route.get("/sensor/latest")
+def get_latest_readings(
+    payload: payload_schemas.LatestReadingsPayload,
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Get the latest sensor readings across all coverages, newest first.
+
+    Every coverage schema returns its own latest `limit` readings concurrently,
+    the ordered lists are then k-way merged.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Args:
+        payload (LatestReadingsPayload): number of readings and optional fields to return.
+
+    Returns:
+        dict: readings tagged with their coverage name and the coverages that failed or timed out.
+
+    Raises:
+        HTTPException: If the user is not authorized or a requested field is unknown.
+    """
+    utils.verify_admin(token=token.credentials, db=db)
+    fields = payload.fields
+    if fields and "date_time" not in fields:
+        # readings are merged on date_time
+        fields = fields + ["date_time"]
+    statement = (
+        queries.select_sensor_readings([], 0, fields=fields)
+        .order_by(nullslast(SensorReading.date_time.desc()))
+        .limit(payload.limit)
+    )
+
+    def latest(schema_db):
+        return rows_to_dicts(schema_db.execute(statement))
+
+    results, failed = utils.fan_out(db=db, query_function=latest)
+    rows = utils.merge_ordered(results, key=utils.latest_date_time_key, reverse=True)
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "data": utils.take(rows, 0, payload.limit),
+            "failed": failed,
+        },
+        request=request,
+    )
+
+
+@admin_route.get("/sinks/filter")
+def filter_all_sinks(
+    payload: coverage_schemas.FilterPayload,
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Filter sinks of all coverages by date(YYYYMMDDHHMMSS) and Polygon Geometry.
+
+    Sinks are ordered by date, every coverage schema is filtered concurrently and the
+    ordered results are k-way merged before the page is cut.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Args:
+        payload (FilterPayload): filters, page offset and optional fields.
+
+    Returns:
+        dict: a page of sinks tagged with their coverage name and the coverages that failed or timed out.
+
+    Raises:
+        HTTPException: If the user is not authorized or the payload is not a valid filter.
+    """
+    utils.verify_admin(token=token.credentials, db=db)
+    if not payload.polygon and not payload.start_time and not payload.end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not a valid payload to filter data !!",
+        )
+    page_no = 0 if payload.page_no is None else payload.page_no
+    fields = payload.fields
+    if fields and "date_time" not in fields:
+        # sinks are merged on date_time
+        fields = fields + ["date_time"]
+    statement = (
+        queries.select_sinks(queries.sink_filters(payload), 0, fields=fields)
+        .order_by(nullslast(Sink.date_time.asc()), Sink.id)
+        .limit(page_no + queries.PAGE_SIZE)
+    )
+
+    def sinks(schema_db):
+        return rows_to_dicts(schema_db.execute(statement))
+
+    results, failed = utils.fan_out(db=db, query_function=sinks)
+    rows = utils.merge_ordered(results, key=utils.date_time_key)
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "data": utils.take(rows, page_no, queries.PAGE_SIZE),
+            "failed": failed,
+        },
+        request=request,
+    )
+
+
+@admin_route.get("/jobs/{job_id}")
+def get_job(
+    job_id: str,
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Get the status of a background job, e.g. a coverage deletion.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Args:
+        job_id (str): id of the job, returned when the job was queued.
+
+    Returns:
+        dict: kind, status, current step and error of the job.
+
+    Raises:
+        HTTPException: If the user is not authorized or the job does not exist.
+    """
+    utils.verify_admin(token=token.credentials, db=db)
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Not a valid job id !!"
+        )
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
@@ -0,0 +1,12 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+from typing import List
+from pydantic import BaseModel, conint
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.pagination import LISTING_MAX_PAGE_SIZE
+
+
+class LatestReadingsPayload(BaseModel):
+    # every coverage returns up to `limit` readings before they are merged
+    limit: conint(gt=0, le=LISTING_MAX_PAGE_SIZE) = 5
+    fields: List[str] = None
@@ -0,0 +1,176 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import heapq
+import itertools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import get_schema_db
+from models.common_models import User, Coverage, COVERAGE_ACTIVE
+from scheduler import tenant_db_slot_blocking
+from security import authenticator, settings
+
+
+def verify_admin(token: str, db: Session):
+    """
+    Check that the token belongs to an admin user.
+
+    Args:
+        token (str): bearer access token
+        db (Session): public schema session
+
+    Raises:
+        HTTPException: if the user is not an admin
+    """
+    admin_user_id = authenticator.decode_token(token=token)
+    if (
+        not db.query(User.id)
+        .filter(User.id == admin_user_id, User.is_admin == True)
+        .first()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized !!"
+        )
+
+
+def run_tenant_query(coverage, query_function, timeout: float):
+    """
+    Run `query_function(schema_db)` in its own tenant session with a statement timeout.
+
+    The query is admitted like a coverage request, counting against the rate limit,
+    concurrency limit and fair share of the coverage (see `tenant_db_slot`).
+    """
+    with tenant_db_slot_blocking(coverage):
+        schema_db = get_schema_db(
+            schema_name=coverage.db_schema, shard=coverage.shard, readonly=True
+        )
+        try:
+            schema_db.execute(
+                select(
+                    func.set_config("statement_timeout", str(int(timeout * 1000)), True)
+                )
+            )
+            return query_function(schema_db)
+        finally:
+            schema_db.close()
+
+
+def failure_reason(error: Exception) -> str:
+    # HTTPException carries its message in `detail`, not in its arguments
+    message = getattr(error, "detail", None) or str(error) or type(error).__name__
+    return message.splitlines()[0]
+
+
+def fan_out(db: Session, query_function):
+    """
+    Run a query against every coverage schema concurrently.
+
+    At most `settings.FANOUT_CONCURRENCY` schemas are queried at the same time and
+    each schema gets `settings.FANOUT_TENANT_TIMEOUT_SECONDS`, enforced with a
+    Postgres statement timeout and a wait deadline for the whole fan-out. Every query
+    is admitted like a request of its coverage, so a fan-out neither bypasses the
+    coverage quotas nor takes more than the fair share of the database slots.
+
+    Args:
+        db (Session): public schema session, used to list the coverages
+        query_function (callable): receives a tenant session and returns the result
+
+    Returns:
+        tuple[dict, list]: results by coverage name and the failed coverages
+    """
+    # with the quota columns read by the admission of the queries
+    coverages = (
+        db.query(
+            Coverage.id,
+            Coverage.name,
+            Coverage.db_schema,
+            Coverage.shard,
+            Coverage.rate_limit,
+            Coverage.rate_burst,
+            Coverage.max_concurrency,
+            Coverage.weight,
+        )
+        .filter(Coverage.status == COVERAGE_ACTIVE)
+        .all()
+    )
+    if not coverages:
+        return {}, []
+
+    timeout = settings.FANOUT_TENANT_TIMEOUT_SECONDS
+    workers = max(1, min(settings.FANOUT_CONCURRENCY, len(coverages)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {
+        executor.submit(run_tenant_query, row, query_function, timeout): row.name
+        for row in coverages
+    }
+    # every schema waits for at most one timeout in the queue and one while running
+    rounds = -(-len(coverages) // workers)
+    done, not_done = wait(futures, timeout=timeout * (rounds + 1))
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    results, failed = {}, []
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception as error:
+            failed.append({"coverage": name, "error": failure_reason(error)})
+    for future in not_done:
+        failed.append({"coverage": futures[future], "error": "timeout"})
+    return results, failed
+
+
+def merge_ordered(results: dict, key, reverse: bool = False):
+    """
+    Lazily k-way merge per coverage row lists that are already ordered by `key`.
+
+    Every row is tagged with the name of its coverage.
+
+    Args:
+        results (dict): coverage name -> ordered list of row dictionaries
+        key (callable): sort key of a row
+        reverse (bool, optional): rows are in descending order
+
+    Returns:
+        iterator: merged rows
+    """
+
+    def tagged(name, rows):
+        for row in rows:
+            row["coverage"] = name
+            yield row
+
+    return heapq.merge(
+        *(tagged(name, rows) for name, rows in results.items()),
+        key=key,
+        reverse=reverse,
+    )
+
+
+def date_time_key(row):
+    """
+    Sort key on `date_time` placing missing dates after all others in ascending order.
+    """
+    date_time = row.get("date_time")
+    return (date_time is None, date_time or datetime.min)
+
+
+def latest_date_time_key(row):
+    """
+    Sort key on `date_time` placing missing dates after all others in descending order.
+    """
+    date_time = row.get("date_time")
+    return (date_time is not None, date_time or datetime.min)
+
+
+def take(rows, offset: int, limit: int) -> list:
+    return list(itertools.islice(rows, offset, offset + limit))
@@ -0,0 +1,209 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+from datetime import timedelta
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import delete, func, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import SessionLocal, get_tenant_engine
+from jobs import register_job_handler, register_periodic_job
+from models.common_models import Coverage, COVERAGE_ACTIVE
+from models.coverage_models import (
+    Sensor,
+    SensorReading,
+    Sink,
+    ChangeTombstone,
+    ChangeHorizon,
+)
+from routes.coverage.queries import column_expression
+from routes.coverage.serializers import ndjson_lines
+from security import settings
+
+# tables whose writes are tracked by the `track_change` and `track_delete` triggers
+TRACKED_TABLES = [Sensor.__table__, SensorReading.__table__, Sink.__table__]
+
+
+def change_watermark(schema_db: Session) -> int:
+    """
+    Return the cursor up to which the changes of a coverage are complete.
+
+    Sequence numbers are drawn when a row is written, not when its transaction
+    commits, so a change with a lower sequence can still become visible after a
+    higher one was sent. Changes are paged by the id of their transaction instead:
+    every transaction below the xmin of the current snapshot has finished, so no
+    change below it can appear later.
+    """
+    return schema_db.execute(
+        select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+    ).scalar()
+
+
+def format_cursor(coverage: Coverage, watermark: int) -> str:
+    return f"{coverage.change_epoch}.{watermark}"
+
+
+def parse_cursor(coverage: Coverage, cursor: str) -> int:
+    """
+    Return the transaction id of a change cursor, `<change epoch>.<transaction id>`.
+
+    Transaction ids are only comparable on one shard and the tombstones stay on the
+    source shard when a coverage moves, so the move bumps `Coverage.change_epoch`
+    and the cursors of earlier epochs are rejected.
+
+    Args:
+        coverage (Coverage): coverage database object
+        cursor (str): `X-Next-Cursor` of a previous sync, None for a full sync
+
+    Returns:
+        int: transaction id of the cursor, None for a full sync
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed, 410 if it is from another epoch
+    """
+    if cursor is None:
+        return None
+    epoch, _, xid = cursor.partition(".")
+    try:
+        epoch, xid = int(epoch), int(xid)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor {cursor} !!",
+        )
+    if epoch != coverage.change_epoch:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="The coverage moved since this cursor, sync again without since !!",
+        )
+    return xid
+
+
+def check_since(schema_db: Session, since: int):
+    """
+    Raises:
+        HTTPException: if the tombstones after `since` were already compacted
+    """
+    if since is None:
+        return
+    compacted_xid = schema_db.execute(select(ChangeHorizon.compacted_xid)).scalar()
+    if since < (compacted_xid or 0):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Changes since this cursor were compacted, sync again without since !!",
+        )
+
+
+def xid_range(column, since: int, watermark: int):
+    if since is None:
+        # full sync, rows written before change tracking have no transaction id
+        return or_(column < watermark, column.is_(None))
+    return column.between(since, watermark - 1)
+
+
+def select_changes(since: int, watermark: int) -> list:
+    """
+    Build the SELECTs of the changes committed between `since` and `watermark`.
+
+    Deletes come first: the tracked tables only hold the last version of a row, so a
+    row deleted and inserted again within the range is deleted and then upserted.
+
+    Args:
+        since (int): cursor of the previous sync, None for a full sync
+        watermark (int): cursor of this sync, from `change_watermark`
+
+    Returns:
+        list[Select]: statements in the order their rows must be applied
+    """
+    statements = []
+    if since is not None:
+        statements.append(
+            select(
+                ChangeTombstone.table_name.label("table"),
+                literal("delete").label("op"),
+                ChangeTombstone.change_seq,
+                ChangeTombstone.row_id.label("id"),
+            )
+            .where(xid_range(ChangeTombstone.change_xid, since, watermark))
+            .order_by(ChangeTombstone.change_seq)
+        )
+    for table in TRACKED_TABLES:
+        statements.append(
+            select(
+                literal(table.name).label("table"),
+                literal("upsert").label("op"),
+                *(
+                    column_expression(column).label(column.name)
+                    for column in table.columns
+                ),
+            )
+            .where(xid_range(table.c.change_xid, since, watermark))
+            .order_by(table.c.change_seq)
+        )
+    return statements
+
+
+def change_lines(schema_db: Session, statements: list):
+    """
+    Stream the rows of `select_changes` statements one after the other as JSON lines.
+    """
+    for statement in statements:
+        result = schema_db.execute(
+            statement, execution_options={"stream_results": True}
+        )
+        yield from ndjson_lines(result)
+
+
+@register_job_handler("compact_tombstones")
+def compact_tombstones(payload: dict, progress):
+    """
+    Periodic job deleting the tombstones older than `settings.TOMBSTONE_RETENTION_SECONDS`.
+
+    Every tombstone of a transaction up to the newest expired one is deleted and the
+    change horizon of the coverage is moved past it, clients syncing from an older
+    cursor then get a 410 and sync again from scratch.
+
+    Args:
+        payload (dict): unused
+        progress (callable): reports the current coverage
+    """
+    db = SessionLocal()
+    try:
+        coverages = (
+            db.query(Coverage.db_schema, Coverage.shard)
+            .filter(Coverage.status == COVERAGE_ACTIVE)
+            .all()
+        )
+    finally:
+        db.close()
+
+    # `deleted_at` is set by the database clock
+    expired_before = func.now() - timedelta(
+        seconds=settings.TOMBSTONE_RETENTION_SECONDS
+    )
+    for schema_name, shard in coverages:
+        progress(f"compacting {schema_name}")
+        with get_tenant_engine(schema_name, shard).begin() as connection:
+            horizon = connection.execute(
+                select(func.max(ChangeTombstone.change_xid)).where(
+                    ChangeTombstone.deleted_at < expired_before
+                )
+            ).scalar()
+            if horizon is None:
+                continue
+            connection.execute(
+                delete(ChangeTombstone).where(ChangeTombstone.change_xid <= horizon)
+            )
+            connection.execute(
+                update(ChangeHorizon).values(
+                    compacted_xid=func.greatest(
+                        ChangeHorizon.compacted_xid, horizon + 1
+                    )
+                )
+            )
+
+
+register_periodic_job("compact_tombstones", settings.TOMBSTONE_COMPACT_SECONDS)
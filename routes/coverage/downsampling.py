@@ -0,0 +1,207 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import numpy as np
+
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import settings
+from routes.coverage.serializers import FastJSONResponse, STREAM_BATCH_SIZE
+
+
+def bucket_edges(size: int, buckets: int) -> np.ndarray:
+    """
+    Split the points between the first and the last into `buckets` buckets of
+    (almost) the same number of points.
+
+    Returns:
+        np.ndarray: `buckets + 1` indexes, bucket `k` is `edges[k]:edges[k + 1]`
+    """
+    return np.linspace(1, size - 1, buckets + 1).astype(np.int64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are kept and one point is picked per bucket in
+    between: the one forming the largest triangle with the point picked in the
+    previous bucket and the average of the next bucket. The areas of a bucket are
+    computed at once with NumPy, only the walk over the buckets is a Python loop.
+
+    Args:
+        x (np.ndarray): increasing x values
+        y (np.ndarray): y values
+        points (int): number of points to keep, at least 3
+
+    Returns:
+        np.ndarray: indexes of the kept points
+    """
+    size = len(x)
+    if size <= points:
+        return np.arange(size)
+    edges = bucket_edges(size, points - 2)
+    starts, ends = edges[:-1], edges[1:]
+    # average of every bucket, the last point stands for the bucket after the last
+    counts = ends - starts
+    average_x = np.append(np.add.reduceat(x[:-1], starts) / counts, x[-1])
+    average_y = np.append(np.add.reduceat(y[:-1], starts) / counts, y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = starts[bucket], ends[bucket]
+        next_x, next_y = average_x[bucket + 1], average_y[bucket + 1]
+        # twice the triangle areas, the factor does not change the argmax
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum of `points // 2` buckets, in x order.
+
+    Every peak of the series is kept, which LTTB does not guarantee.
+
+    Args:
+        x (np.ndarray): increasing x values
+        y (np.ndarray): y values
+        points (int): maximum number of points to keep, at least 2
+
+    Returns:
+        np.ndarray: indexes of the kept points
+    """
+    size = len(x)
+    if size <= points:
+        return np.arange(size)
+    buckets = points // 2
+    bucket_ids = np.arange(size) * buckets // size
+    # sorted by bucket then value, the first and last index of a bucket are its
+    # minimum and maximum
+    order = np.lexsort((y, bucket_ids))
+    boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+    firsts = order[np.concatenate(([0], boundaries))]
+    lasts = order[np.concatenate((boundaries - 1, [size - 1]))]
+    return np.unique(np.concatenate((firsts, lasts)))
+
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": min_max}
+
+
+def render_series(device_id, data: np.ndarray, method: str, points: int, value: str):
+    indexes = DOWNSAMPLERS[method](data[:, 0], data[:, 1], points)
+    kept = data[indexes]
+    return {
+        "device_id": int(device_id),
+        "points_in": len(data),
+        "date_time": np.datetime_as_string(
+            kept[:, 0].astype("datetime64[ms]"), unit="s"
+        ).tolist(),
+        value: kept[:, 1].tolist(),
+    }
+
+
+def max_series(points: int) -> int:
+    """
+    Number of series a response may hold so that it keeps at most
+    `DOWNSAMPLE_MAX_TOTAL_POINTS` points.
+    """
+    return max(1, settings.DOWNSAMPLE_MAX_TOTAL_POINTS // points)
+
+
+def downsample_series(
+    result, method: str, points: int, value: str, series_limit: int = None
+) -> list:
+    """
+    Downsample the series of every device of a streamed result.
+
+    The result is fetched from a server side cursor in batches converted to NumPy
+    arrays, a series is downsampled as soon as the rows of the next device start.
+
+    Args:
+        result: SQLAlchemy result of `select_series`, executed with `stream_results`
+        method (str): `lttb` or `minmax`
+        points (int): points kept per device
+        value (str): name of the value column
+        series_limit (int, optional): maximum number of devices, None for no limit
+
+    Returns:
+        list[dict]: per device, the `device_id`, number of points before
+        downsampling `points_in` and the kept `date_time` and `value` lists
+
+    Raises:
+        HTTPException: if the result holds more than `series_limit` devices, the
+        scan stops at the first device over the limit
+    """
+    series = []
+    device_id, chunks = None, []
+    for rows in result.partitions(STREAM_BATCH_SIZE):
+        # device id, epoch milliseconds, value
+        batch = np.array(rows, dtype=np.float64)
+        for part in np.split(batch, np.flatnonzero(np.diff(batch[:, 0])) + 1):
+            if device_id is not None and part[0, 0] != device_id:
+                if series_limit is not None and len(series) + 1 >= series_limit:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"More than {series_limit} devices to downsample with "
+                        f"{points} points, filter on a device_id or lower points !!",
+                    )
+                series.append(
+                    render_series(
+                        device_id, np.concatenate(chunks), method, points, value
+                    )
+                )
+                chunks = []
+            device_id = part[0, 0]
+            chunks.append(part[:, 1:])
+    if chunks:
+        series.append(
+            render_series(device_id, np.concatenate(chunks), method, points, value)
+        )
+    return series
+
+
+def downsampled_response(schema_db, statement, payload, request):
+    """
+    Run a `select_series` statement and return its downsampled series.
+
+    The response holds at most `DOWNSAMPLE_MAX_TOTAL_POINTS` points, requests
+    matching more devices than that allows with `points` are rejected.
+
+    Args:
+        schema_db (Session): tenant session
+        statement (Select): series SELECT from `select_series`
+        payload (SensorFilterPayload): request payload with `downsample`, `points` and `value`
+        request (Request): incoming request, to negotiate response compression
+
+    Returns:
+        FastJSONResponse: `method`, `value` and the downsampled `series`
+
+    Raises:
+        HTTPException: if the series would hold more than `DOWNSAMPLE_MAX_TOTAL_POINTS` points
+    """
+    result = schema_db.execute(statement, execution_options={"stream_results": True})
+    try:
+        series = downsample_series(
+            result,
+            payload.downsample,
+            payload.points,
+            payload.value,
+            series_limit=max_series(payload.points),
+        )
+    finally:
+        result.close()
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "method": payload.downsample,
+            "value": payload.value,
+            "series": series,
+        },
+        request=request,
+    )
@@ -0,0 +1,165 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+from shapely.prepared import prep
+from geoalchemy2.elements import WKTElement
+from geoalchemy2.shape import to_shape
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import exists, func, or_, select, union_all
+from sqlalchemy.orm import Session
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import SessionLocal, get_tenant_engine
+from jobs import register_job_handler, register_periodic_job
+from models.common_models import Coverage, COVERAGE_ACTIVE
+from models.coverage_models import Sensor, Sink
+from routes.coverage.spatial import SRID
+from security import settings
+
+
+class ExtentCache:
+    """
+    Prepared extents of the coverages, parsed again only when the extent changed.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, coverage: Coverage):
+        """
+        Return the prepared extent of a coverage.
+
+        Args:
+            coverage (Coverage): coverage database object, loaded with its extent
+
+        Returns:
+            PreparedGeometry: prepared extent, None until it was computed or when
+            the coverage has no geometry
+        """
+        if coverage.extent is None:
+            self._entries.pop(coverage.id, None)
+            return None
+        version = coverage.extent.desc
+        entry = self._entries.get(coverage.id)
+        if entry is None or entry[0] != version:
+            entry = self._entries[coverage.id] = (
+                version,
+                prep(to_shape(coverage.extent)),
+            )
+        return entry[1]
+
+    def evict(self, coverage_id: str):
+        self._entries.pop(coverage_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+extent_cache = ExtentCache()
+
+
+def changed_since(schema_db: Session, extent_xid: int) -> bool:
+    """
+    Check whether a sensor or sink was written by a transaction the extent did not see.
+
+    Every write stamps `change_xid` (see the `track_change` trigger) and every
+    transaction invisible to the snapshot of the extent has an id from its xmin on,
+    so this is one probe of the `change_xid` indexes. Deletes only shrink the real
+    extent and are ignored.
+    """
+    return schema_db.execute(
+        select(
+            or_(
+                exists().where(Sensor.change_xid >= extent_xid),
+                exists().where(Sink.change_xid >= extent_xid),
+            )
+        )
+    ).scalar()
+
+
+def fresh_extent(coverage: Coverage, schema_db: Session, polygon_wkt: str):
+    """
+    Return the prepared extent of a coverage for a polygon filter, if it is current.
+
+    Args:
+        coverage (Coverage): coverage database object, loaded with its extent
+        schema_db (Session): tenant session of the request
+        polygon_wkt (str): client polygon WKT, the extent is not needed without one
+
+    Returns:
+        PreparedGeometry: prepared extent, None without a polygon, before the extent
+        was computed or when the tenant tables changed since
+    """
+    if not polygon_wkt or coverage.extent_xid is None:
+        return None
+    prepared = extent_cache.get(coverage)
+    if prepared is None or changed_since(schema_db, coverage.extent_xid):
+        return None
+    return prepared
+
+
+def select_extent():
+    """
+    Build the SELECT of the WKT bounding box of the sensors and sinks of a coverage,
+    with the xmin of the snapshot it is computed in.
+    """
+    geometries = union_all(
+        select(Sensor.geometry.label("geometry")),
+        select(Sink.geometry.label("geometry")),
+    ).subquery()
+    # ST_Extent returns a box2d, cast to a polygon by ST_Envelope
+    return select(
+        func.ST_AsText(func.ST_Envelope(func.ST_Extent(geometries.c.geometry))),
+        func.txid_snapshot_xmin(func.txid_current_snapshot()),
+    )
+
+
+def refresh_extent(coverage_id: str):
+    """
+    Compute the extent of a coverage from its tenant tables and store it.
+
+    Run after rows were loaded. Rows written later make the extent stale until the
+    next refresh, see `fresh_extent`.
+
+    Args:
+        coverage_id (str): coverage id
+    """
+    db = SessionLocal()
+    try:
+        coverage = db.query(Coverage).filter(Coverage.id == coverage_id).first()
+        if coverage is None:
+            return
+        engine = get_tenant_engine(coverage.db_schema, coverage.shard)
+        with engine.connect() as connection:
+            extent_wkt, extent_xid = connection.execute(select_extent()).one()
+        coverage.extent = WKTElement(extent_wkt, srid=SRID) if extent_wkt else None
+        coverage.extent_xid = extent_xid
+        db.commit()
+    finally:
+        db.close()
+
+
+@register_job_handler("refresh_coverage_extents")
+def refresh_coverage_extents(payload: dict, progress):
+    """
+    Periodic job recomputing the extent of every active coverage, catching rows
+    written outside of the import pipeline.
+
+    Args:
+        payload (dict): unused
+        progress (callable): reports the current coverage
+    """
+    db = SessionLocal()
+    try:
+        coverages = (
+            db.query(Coverage.id, Coverage.name)
+            .filter(Coverage.status == COVERAGE_ACTIVE)
+            .all()
+        )
+    finally:
+        db.close()
+    for coverage_id, name in coverages:
+        progress(f"refreshing {name}")
+        refresh_extent(coverage_id)
+
+
+register_periodic_job("refresh_coverage_extents", settings.EXTENT_REFRESH_SECONDS)
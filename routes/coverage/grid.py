@@ -0,0 +1,251 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import time
+import hashlib
+import threading
+import orjson
+from collections import OrderedDict
+from shapely.geometry import box
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.coverage import schemas as payload_schemas
+from routes.coverage import queries, sensor_index
+from routes.coverage.spatial import SRID
+from security import settings
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+# cells are sent to PostGIS as JSON and encoded in a tile in web mercator
+MVT_QUERY = text(f"""
+SELECT ST_AsMVT(tile, 'cells', 4096, 'geom') FROM (
+    SELECT ST_AsMVTGeom(
+            ST_Transform(ST_GeomFromText(cell ->> 'geometry', {SRID}), 3857),
+            ST_TileEnvelope(:z, :x, :y)
+        ) AS geom,
+        cell - 'geometry' AS properties
+    FROM jsonb_array_elements(CAST(:cells AS jsonb)) AS cell
+) AS tile
+WHERE geom IS NOT NULL
+""")
+
+
+class GridCache:
+    """
+    Bounded LRU of aggregated grids, entries expire after `ttl` seconds so new
+    readings show up without invalidation.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """
+        Returns:
+            dict: cells of the grid, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, cells = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cells
+
+    def put(self, key: tuple, cells: dict):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, cells)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def evict(self, coverage_id: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == coverage_id]:
+                del self._entries[key]
+
+
+grid_cache = GridCache(settings.GRID_CACHE_SIZE, settings.GRID_CACHE_SECONDS)
+
+
+def cell_size(level: int) -> float:
+    """
+    Return the cell size in degrees of a grid level.
+
+    Raises:
+        HTTPException: if the level is out of range
+    """
+    if not 0 <= level <= settings.GRID_MAX_LEVEL:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"level must be between 0 and {settings.GRID_MAX_LEVEL} !!",
+        )
+    return settings.GRID_CELL_DEGREES * 2**level
+
+
+def number(value):
+    # SUM of integers is NUMERIC, returned as Decimal
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return int(value) if value == int(value) else float(value)
+
+
+def fetch_cells(
+    schema_db: Session, payload: payload_schemas.GridPayload, size: float, sensor_ids
+) -> dict:
+    """
+    Aggregate the readings into cells in PostGIS.
+
+    Returns:
+        dict: (i, j) -> cell with `readings`, the count, sum, min and max of each value
+        and the `geometry` WKT of hexagonal cells
+    """
+    statement = queries.select_grid_cells(payload, size, sensor_ids)
+    cells = {}
+    for row in schema_db.execute(statement).mappings():
+        cell = {key: number(value) for key, value in row.items()}
+        cells[int(cell.pop("i")), int(cell.pop("j"))] = cell
+    return cells
+
+
+def roll_up(cells: dict, levels: int, values: list) -> dict:
+    """
+    Merge square cells into the cells `levels` levels coarser.
+
+    Cell `(i, j)` of a level is inside cell `(i >> 1, j >> 1)` of the next level,
+    counts and sums add up and minimums and maximums are taken over the merged cells.
+    """
+    if not levels:
+        return cells
+    merged = {}
+    for (i, j), cell in cells.items():
+        key = (i >> levels, j >> levels)
+        target = merged.get(key)
+        if target is None:
+            merged[key] = dict(cell)
+            continue
+        target["readings"] += cell["readings"]
+        for field in values:
+            for name in (f"count_{field}", f"sum_{field}"):
+                if cell[name] is not None:
+                    target[name] = (target[name] or 0) + cell[name]
+            for name, pick in ((f"min_{field}", min), (f"max_{field}", max)):
+                if cell[name] is not None:
+                    target[name] = (
+                        cell[name]
+                        if target[name] is None
+                        else pick(target[name], cell[name])
+                    )
+    return merged
+
+
+def render_cells(cells: dict, values: list, size: float, square: bool) -> list:
+    """
+    Render cells with their geometry and the average, min and max of each value.
+    """
+    rendered = []
+    for (i, j), cell in sorted(cells.items()):
+        if square:
+            geometry = box(i * size, j * size, (i + 1) * size, (j + 1) * size).wkt
+        else:
+            geometry = cell["geometry"]
+        item = {"i": i, "j": j, "geometry": geometry, "readings": cell["readings"]}
+        for field in values:
+            count = cell[f"count_{field}"]
+            item[f"avg_{field}"] = cell[f"sum_{field}"] / count if count else None
+            item[f"min_{field}"] = cell[f"min_{field}"]
+            item[f"max_{field}"] = cell[f"max_{field}"]
+        rendered.append(item)
+    return rendered
+
+
+def get_grid(
+    coverage_id: str, schema_db: Session, payload: payload_schemas.GridPayload
+):
+    """
+    Return the aggregated grid of a coverage, from the cache when possible.
+
+    Square grids are always aggregated at level 0 and cached there, coarser levels
+    are rolled up from the cached cells without a query. Hexagonal cells do not
+    nest and are cached per level.
+
+    Args:
+        coverage_id (str): coverage id
+        schema_db (Session): tenant session of the coverage
+        payload (GridPayload): grid request payload
+
+    Returns:
+        list[dict]: rendered cells
+
+    Raises:
+        HTTPException: if the level, the polygon or a value is not valid
+    """
+    size = cell_size(payload.level)
+    square = payload.shape == "square"
+    cached_level = 0 if square else payload.level
+    polygon_digest = (
+        hashlib.sha256(payload.polygon.encode()).digest() if payload.polygon else None
+    )
+    key = (
+        coverage_id,
+        payload.shape,
+        cached_level,
+        payload.start_time,
+        payload.end_time,
+        polygon_digest,
+        tuple(payload.values),
+    )
+    cells = grid_cache.get(key)
+    if cells is None:
+        sensor_ids = sensor_index.sensor_ids_in_polygon(
+            coverage_id, schema_db, payload.polygon
+        )
+        cells = fetch_cells(schema_db, payload, cell_size(cached_level), sensor_ids)
+        grid_cache.put(key, cells)
+    if square:
+        cells = roll_up(cells, payload.level, payload.values)
+    return render_cells(cells, payload.values, size, square)
+
+
+def parse_tile(tile: str) -> tuple:
+    """
+    Parse a `z/x/y` tile address.
+
+    Raises:
+        HTTPException: if the tile address is not valid
+    """
+    try:
+        z, x, y = (int(part) for part in tile.split("/"))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="tile must be z/x/y !!",
+        )
+    if not 0 <= z <= 30 or not 0 <= x < 2**z or not 0 <= y < 2**z:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tile {tile} does not exist !!",
+        )
+    return z, x, y
+
+
+def encode_tile(schema_db: Session, cells: list, tile: str) -> bytes:
+    """
+    Encode rendered cells as a Mapbox vector tile with PostGIS.
+    """
+    z, x, y = parse_tile(tile)
+    return schema_db.execute(
+        MVT_QUERY, {"z": z, "x": x, "y": y, "cells": orjson.dumps(cells).decode()}
+    ).scalar()
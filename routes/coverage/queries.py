@@ -0,0 +1,517 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+from typing import List
+from datetime import datetime
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select, and_, func, cast, BigInteger, Float
+from sqlalchemy.orm import aliased
+from geoalchemy2 import Geometry
+from geoalchemy2.functions import ST_MakeEnvelope
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.coverage import schemas as payload_schemas
+from routes.coverage.spatial import SRID, intersects_polygon, polygon_cache
+from models.coverage_models import Sensor, SensorReading, Sink, CHANGE_COLUMNS
+from security import settings
+
+# number of rows returned by one page of coverage data
+PAGE_SIZE = 5
+
+
+def field_names(table) -> list:
+    return [
+        column.name for column in table.columns if column.name not in CHANGE_COLUMNS
+    ]
+
+
+# fields a client can request with `FilterPayload.fields`
+SENSOR_READING_FIELDS = field_names(SensorReading.__table__) + [
+    f"sensor.{name}" for name in field_names(Sensor.__table__)
+]
+SINK_FIELDS = field_names(Sink.__table__)
+# reading values a sink-sensor join can average
+SENSOR_READING_VALUE_FIELDS = [
+    column.name
+    for column in SensorReading.__table__.columns
+    if column.name.endswith("_value")
+]
+# meters per degree of latitude at the poles, the shortest
+METERS_PER_DEGREE_LATITUDE = 110574
+# meters per degree of longitude at the equator
+METERS_PER_DEGREE_LONGITUDE = 111320
+
+
+def validate_fields(fields: List[str], allowed_fields: List[str]):
+    """
+    Check requested fields against the allow-list of the endpoint.
+
+    Args:
+        fields (List[str]): requested fields
+        allowed_fields (List[str]): fields the endpoint can return
+
+    Raises:
+        HTTPException: if a requested field is not allowed
+    """
+    unknown_fields = [field for field in fields if field not in allowed_fields]
+    if unknown_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields {', '.join(unknown_fields)} !!",
+        )
+
+
+def column_expression(column):
+    """
+    Return the SELECT expression of a column, geometry is converted to WKT by PostGIS.
+    """
+    if isinstance(column.type, Geometry):
+        return func.ST_AsText(column)
+    return column
+
+
+def sensor_reading_filters(
+    payload: payload_schemas.SensorFilterPayload,
+    sensor_ids: List[int] = None,
+    extent=None,
+) -> list:
+    """
+    Build the SQL filters for a sensor reading filter request.
+
+    Args:
+        payload (SensorFilterPayload): filter request payload
+        sensor_ids (List[int], optional): sensors inside `payload.polygon` resolved
+            by the sensor index, the polygon is tested in SQL when None
+        extent (optional): prepared extent of the coverage, see `intersects_polygon`
+
+    Returns:
+        list: SQL filter expressions, to be combined with `and_`
+    """
+    filters = []
+    # query based on start and end datetime
+    if payload.start_time and payload.end_time:
+        start_time = datetime.strptime(payload.start_time, "%Y%m%d%H%M%S").isoformat()
+        end_time = datetime.strptime(payload.end_time, "%Y%m%d%H%M%S").isoformat()
+        filters.append(SensorReading.date_time >= start_time)
+        filters.append(SensorReading.date_time <= end_time)
+    if payload.device_id is not None:
+        filters.append(SensorReading.device_id == payload.device_id)
+    # query based on polygon
+    if sensor_ids is not None:
+        filters.append(SensorReading.device_id.in_(sensor_ids))
+    elif payload.polygon:
+        filters.append(intersects_polygon(Sensor.geometry, payload.polygon, extent))
+    return filters
+
+
+def sink_filters(payload: payload_schemas.FilterPayload, extent=None) -> list:
+    """
+    Build the SQL filters for a sink filter request.
+
+    Args:
+        payload (FilterPayload): filter request payload
+        extent (optional): prepared extent of the coverage, see `intersects_polygon`
+
+    Returns:
+        list: SQL filter expressions, to be combined with `and_`
+    """
+    filters = []
+    # query based on start and end datetime
+    if payload.start_time and payload.end_time:
+        start_time = (
+            datetime.strptime(payload.start_time, "%Y%m%d%H%M%S")
+            .isoformat()
+            .replace("T", " ")
+        )
+        end_time = (
+            datetime.strptime(payload.end_time, "%Y%m%d%H%M%S")
+            .isoformat()
+            .replace("T", " ")
+        )
+        filters.append(Sink.date_time >= start_time)
+        filters.append(Sink.date_time <= end_time)
+    # query based on polygon
+    if payload.polygon is not None:
+        filters.append(intersects_polygon(Sink.geometry, payload.polygon, extent))
+    return filters
+
+
+def select_sensor_readings(
+    filters: list, page_no: int, fields: List[str] = None, join_sensor: bool = False
+):
+    """
+    Build a column level SELECT for sensor readings and their sensor.
+
+    Sensor columns are labelled `sensor.<column>` so the serializer can nest them
+    the same way the ORM `sensor` relationship is rendered. Geometry is converted
+    to WKT by PostGIS instead of shapely. When `fields` is given only those columns
+    are selected and `sensor` is joined only if one of its fields is requested or
+    `join_sensor` is set because a filter uses it.
+
+    Args:
+        filters (list): SQL filters from `sensor_reading_filters`
+        page_no (int): page offset
+        fields (List[str], optional): requested fields, all fields when None
+        join_sensor (bool, optional): filters reference the sensor table
+
+    Returns:
+        Select: sensor reading SELECT statement
+
+    Raises:
+        HTTPException: if a requested field is not allowed
+    """
+    if fields:
+        validate_fields(fields, SENSOR_READING_FIELDS)
+    else:
+        fields = SENSOR_READING_FIELDS
+
+    reading_columns = [
+        column_expression(column).label(column.name)
+        for column in SensorReading.__table__.columns
+        if column.name in fields
+    ]
+    sensor_columns = [
+        column_expression(column).label(f"sensor.{column.name}")
+        for column in Sensor.__table__.columns
+        if f"sensor.{column.name}" in fields
+    ]
+    statement = select(*reading_columns, *sensor_columns)
+    if filters and (sensor_columns or join_sensor):
+        # filtering needs every reading to have a sensor, same as the ORM join
+        statement = statement.select_from(Sensor).join(
+            SensorReading, Sensor.id == SensorReading.device_id
+        )
+    elif filters:
+        # the foreign key makes this equivalent to the inner join above
+        statement = statement.select_from(SensorReading).where(
+            SensorReading.device_id.isnot(None)
+        )
+    elif sensor_columns:
+        statement = statement.select_from(SensorReading).outerjoin(
+            Sensor, Sensor.id == SensorReading.device_id
+        )
+    else:
+        statement = statement.select_from(SensorReading)
+    if filters:
+        statement = statement.where(and_(*filters))
+    return statement.limit(PAGE_SIZE).offset(page_no)
+
+
+def select_sinks(filters: list, page_no: int, fields: List[str] = None):
+    """
+    Build a column level SELECT for sinks.
+
+    Args:
+        filters (list): SQL filters from `sink_filters`
+        page_no (int): page offset
+        fields (List[str], optional): requested fields, all fields when None
+
+    Returns:
+        Select: sink SELECT statement
+
+    Raises:
+        HTTPException: if a requested field is not allowed
+    """
+    if fields:
+        validate_fields(fields, SINK_FIELDS)
+    else:
+        fields = SINK_FIELDS
+
+    sink_columns = [
+        column_expression(column).label(column.name)
+        for column in Sink.__table__.columns
+        if column.name in fields
+    ]
+    statement = select(*sink_columns).select_from(Sink)
+    if filters:
+        statement = statement.where(and_(*filters))
+    return statement.limit(PAGE_SIZE).offset(page_no)
+
+
+def select_series(filters: list, value: str, points: int, join_sensor: bool = False):
+    """
+    Build the SELECT of the time series of a reading value for downsampling.
+
+    Only the device id, the time in epoch milliseconds and the value are fetched,
+    ordered by device and time so each series can be downsampled as soon as the
+    rows of the next device start.
+
+    Args:
+        filters (list): SQL filters from `sensor_reading_filters`
+        value (str): reading value column
+        points (int): points kept per series
+        join_sensor (bool, optional): filters reference the sensor table
+
+    Returns:
+        Select: series SELECT statement
+
+    Raises:
+        HTTPException: if the value is not allowed or the number of points is out of range
+    """
+    validate_fields([value], SENSOR_READING_VALUE_FIELDS)
+    if not 3 <= points <= settings.DOWNSAMPLE_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"points must be between 3 and {settings.DOWNSAMPLE_MAX_POINTS} !!",
+        )
+    column = getattr(SensorReading, value)
+    epoch_ms = cast(func.extract("epoch", SensorReading.date_time) * 1000, BigInteger)
+    statement = select(SensorReading.device_id, epoch_ms, column)
+    if join_sensor:
+        statement = statement.select_from(Sensor).join(
+            SensorReading, Sensor.id == SensorReading.device_id
+        )
+    return statement.where(
+        SensorReading.device_id.isnot(None),
+        SensorReading.date_time.isnot(None),
+        column.isnot(None),
+        *filters,
+    ).order_by(SensorReading.device_id, SensorReading.date_time)
+
+
+def select_batch_query(
+    query: str,
+    payload: payload_schemas.SensorFilterPayload,
+    sensor_ids: List[int] = None,
+    extent=None,
+):
+    """
+    Build the SELECT of one sub-query of a batch request.
+
+    Sub-queries have the semantics of the endpoint they are named after, e.g.
+    `sensor/filter` behaves like `/coverage/{name}/sensor/filter`.
+
+    Args:
+        query (str): `sensor`, `sensor/filter`, `sinks` or `sinks/filter`
+        payload (SensorFilterPayload): sub-query payload, sink sub-queries ignore
+            the sensor fields
+        sensor_ids (List[int], optional): sensors inside the polygon of a
+            `sensor/filter` sub-query, from the sensor index
+        extent (optional): prepared extent of the coverage, see `intersects_polygon`
+
+    Returns:
+        Select: SELECT statement of the sub-query
+
+    Raises:
+        HTTPException: if the payload is not valid for the sub-query
+    """
+    page_no = 0 if payload.page_no is None else payload.page_no
+    if query.endswith("/filter") and not (
+        payload.polygon
+        or payload.start_time
+        or payload.end_time
+        or (query == "sensor/filter" and payload.device_id is not None)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not a valid payload to filter data !!",
+        )
+    if query == "sensor":
+        return select_sensor_readings([], page_no, fields=payload.fields)
+    if query == "sensor/filter":
+        return select_sensor_readings(
+            sensor_reading_filters(payload, sensor_ids, extent),
+            page_no,
+            fields=payload.fields,
+            join_sensor=bool(payload.polygon) and sensor_ids is None,
+        )
+    if query == "sinks":
+        return select_sinks([], page_no, fields=payload.fields)
+    return select_sinks(sink_filters(payload, extent), page_no, fields=payload.fields)
+
+
+def sensor_within_sink(buffer_meters: float):
+    """
+    Build the join condition of a sensor inside a sink polygon or its buffer.
+
+    The buffer is tested exactly with `ST_DWithin` on geography. It is preceded by
+    an `&&` test against the sink bounding box expanded by the buffer in degrees,
+    a superset at the latitude of the sink, so the GiST index of `sensor` is used.
+
+    Args:
+        buffer_meters (float): buffer around the sink polygon in meters, 0 for none
+
+    Returns:
+        SQL expression
+    """
+    if not buffer_meters:
+        return func.ST_Intersects(Sink.geometry, Sensor.geometry)
+    max_latitude = func.greatest(
+        func.abs(func.ST_YMin(Sink.geometry)), func.abs(func.ST_YMax(Sink.geometry))
+    )
+    longitude_scale = func.greatest(func.cos(func.radians(max_latitude)), 0.01)
+    expanded_sink = func.ST_Expand(
+        Sink.geometry,
+        buffer_meters / (METERS_PER_DEGREE_LONGITUDE * longitude_scale),
+        buffer_meters / METERS_PER_DEGREE_LATITUDE,
+    )
+    return and_(
+        Sensor.geometry.op("&&")(expanded_sink),
+        func.ST_DWithin(
+            func.geography(Sink.geometry),
+            func.geography(Sensor.geometry),
+            buffer_meters,
+        ),
+    )
+
+
+def select_sink_sensors(payload: payload_schemas.SpatialJoinPayload):
+    """
+    Build the spatial join of sinks with the sensors inside them.
+
+    Without `aggregate` there is one row per sink and sensor pair. With `aggregate`
+    there is one row per sink with the number of sensors and readings and the
+    average of each requested value over the readings in the time window.
+
+    Args:
+        payload (SpatialJoinPayload): spatial join request payload
+
+    Returns:
+        Select: spatial join SELECT statement
+
+    Raises:
+        HTTPException: if a requested value is not allowed
+    """
+    condition = sensor_within_sink(payload.buffer_meters)
+    if not payload.aggregate:
+        return (
+            select(
+                Sink.id.label("sink_id"),
+                Sink.parcel_id,
+                Sensor.id.label("sensor_id"),
+            )
+            .select_from(Sink)
+            .join(Sensor, condition)
+        )
+
+    validate_fields(payload.values, SENSOR_READING_VALUE_FIELDS)
+    window_filters = sensor_reading_filters(
+        payload_schemas.SensorFilterPayload(
+            start_time=payload.start_time, end_time=payload.end_time
+        )
+    )
+    # AVG of integers is NUMERIC, which would come back as Decimal
+    averages = [
+        cast(func.avg(getattr(SensorReading, field)), Float).label(f"avg_{field}")
+        for field in payload.values
+    ]
+    return (
+        select(
+            Sink.id.label("sink_id"),
+            Sink.parcel_id,
+            func.count(Sensor.id.distinct()).label("sensors"),
+            func.count(SensorReading.id).label("readings"),
+            *averages,
+        )
+        .select_from(Sink)
+        .join(Sensor, condition)
+        .outerjoin(
+            SensorReading,
+            and_(SensorReading.device_id == Sensor.id, *window_filters),
+        )
+        .group_by(Sink.id, Sink.parcel_id)
+    )
+
+
+def select_grid_cells(
+    payload: payload_schemas.GridPayload, size: float, sensor_ids: List[int] = None
+):
+    """
+    Build the aggregation of the readings of a time window into grid cells.
+
+    Readings are aggregated per sensor first, so the cell of a sensor is computed
+    once instead of once per reading. Square cells are numbered
+    `floor(x / size), floor(y / size)`, a cell of size `2 * size` is exactly four
+    cells of size `size`. Hexagonal cells come from `ST_HexagonGrid` over the
+    polygon, or the sensor extent. Every value has its count, sum, min and max so
+    cells can be merged into coarser cells.
+
+    Args:
+        payload (GridPayload): grid request payload
+        size (float): cell size in degrees, the hexagon edge for hexagonal cells
+        sensor_ids (List[int], optional): sensors inside `payload.polygon` resolved
+            by the sensor index, the polygon is tested in SQL when None
+
+    Returns:
+        Select: one row per non empty cell with `i`, `j`, `readings` and
+        `count_<value>`, `sum_<value>`, `min_<value>`, `max_<value>`, plus the cell
+        `geometry` WKT for hexagonal cells
+
+    Raises:
+        HTTPException: if a requested value is not allowed
+    """
+    validate_fields(payload.values, SENSOR_READING_VALUE_FIELDS)
+    window_filters = sensor_reading_filters(
+        payload_schemas.SensorFilterPayload(
+            start_time=payload.start_time, end_time=payload.end_time
+        )
+    )
+    sensor_columns = [
+        SensorReading.device_id,
+        func.count(SensorReading.id).label("readings"),
+    ]
+    for field in payload.values:
+        column = getattr(SensorReading, field)
+        sensor_columns += [
+            func.count(column).label(f"count_{field}"),
+            func.sum(column).label(f"sum_{field}"),
+            func.min(column).label(f"min_{field}"),
+            func.max(column).label(f"max_{field}"),
+        ]
+    per_sensor = (
+        select(*sensor_columns)
+        .where(SensorReading.device_id.isnot(None), *window_filters)
+        .group_by(SensorReading.device_id)
+        .subquery("per_sensor")
+    )
+    cell_columns = [func.sum(per_sensor.c.readings).label("readings")]
+    for field in payload.values:
+        cell_columns += [
+            func.sum(per_sensor.c[f"count_{field}"]).label(f"count_{field}"),
+            func.sum(per_sensor.c[f"sum_{field}"]).label(f"sum_{field}"),
+            func.min(per_sensor.c[f"min_{field}"]).label(f"min_{field}"),
+            func.max(per_sensor.c[f"max_{field}"]).label(f"max_{field}"),
+        ]
+
+    filters = [Sensor.geometry.isnot(None)]
+    if sensor_ids is not None:
+        filters.append(Sensor.id.in_(sensor_ids))
+    elif payload.polygon:
+        filters.append(intersects_polygon(Sensor.geometry, payload.polygon))
+
+    if payload.shape == "square":
+        cell_i = func.floor(func.ST_X(Sensor.geometry) / size).label("i")
+        cell_j = func.floor(func.ST_Y(Sensor.geometry) / size).label("j")
+        return (
+            select(cell_i, cell_j, *cell_columns)
+            .select_from(per_sensor)
+            .join(Sensor, Sensor.id == per_sensor.c.device_id)
+            .where(*filters)
+            .group_by(cell_i, cell_j)
+        )
+
+    if payload.polygon:
+        bounds = ST_MakeEnvelope(*polygon_cache.get(payload.polygon).bounds, SRID)
+    else:
+        extent_sensor = aliased(Sensor)
+        bounds = select(
+            func.ST_Envelope(func.ST_Collect(extent_sensor.geometry))
+        ).scalar_subquery()
+    hexagons = func.ST_HexagonGrid(size, func.ST_Expand(bounds, size)).table_valued(
+        "geom", "i", "j", name="hexagon"
+    )
+    return (
+        select(
+            hexagons.c.i,
+            hexagons.c.j,
+            func.ST_AsText(hexagons.c.geom).label("geometry"),
+            *cell_columns,
+        )
+        .select_from(per_sensor)
+        .join(Sensor, Sensor.id == per_sensor.c.device_id)
+        .join(hexagons, func.ST_Intersects(hexagons.c.geom, Sensor.geometry))
+        .where(*filters)
+        .group_by(hexagons.c.i, hexagons.c.j, hexagons.c.geom)
+    )
@@ -1,24 +1,46 @@
 # -------------------------------- PYTHON IMPORTS --------------------------------#
-from datetime import datetime
 from geoalchemy2.shape import to_shape
-from geoalchemy2.functions import ST_Intersects, ST_GeomFromText, ST_SetSRID
 from geoalchemy2.elements import WKBElement
 
 # -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, select
+from sqlalchemy.exc import SQLAlchemyError
 
 # -------------------------------- FASTAPI IMPORTS --------------------------------#
-from fastapi import APIRouter, Depends, status, HTTPException, Request, Body
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Body, Query
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from routes.coverage import schemas as payload_schemas
-from database import get_public_schema_db, get_schema_db
-from security import authenticator
-from models.common_models import User, Coverage
+from database import get_public_schema_db, mark_user_write
+from security import authenticator, settings
+from models.common_models import User, Coverage, COVERAGE_DELETING
+from jobs import enqueue_job
 from models.coverage_models import Sensor, SensorReading, Sink
-from routes.coverage import utils
+from routes.coverage import (
+    utils,
+    queries,
+    sensor_index,
+    grid,
+    downsampling,
+    changes,
+    extent,
+)
+from routes.pagination import (
+    LISTING_PAGE_SIZE,
+    LISTING_MAX_PAGE_SIZE,
+    after_cursor,
+    fetch_page,
+    stream_rows,
+)
+from routes.coverage.serializers import (
+    FastJSONResponse,
+    rows_to_dicts,
+    ndjson_lines,
+    NDJSON_MEDIA_TYPE,
+)
 
 coverage_route = APIRouter(tags=["coverage"])
 
@@ -26,6 +48,7 @@ coverage_route = APIRouter(tags=["coverage"])
 @coverage_route.post("/coverage")
 def create_coverage(
     payload: payload_schemas.CoverageCreationPayload,
+    response: Response,
     db: Session = Depends(get_public_schema_db),
     token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
 ):
@@ -40,6 +63,7 @@ def create_coverage(
 
     Args:
         payload (payload_schemas.CoverageCreationPayload): The payload containing the data to create a coverage.
+        response (Response): The response, carrying the read-your-writes cookie.
         db (Session): The database session to use for the operation.
         token (HTTPAuthorizationCredentials): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function.
 
@@ -61,6 +85,7 @@ def create_coverage(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token !!"
         )
     utils.create_coverage(name=payload.name, db=db)
+    mark_user_write(admin_user_id, response)
     return {
         "status": "success",
         "message": f"Coverage created with name {payload.name}",
@@ -69,12 +94,19 @@ def create_coverage(
 
 @coverage_route.get("/coverage")
 def get_coverages(
+    limit: int = Query(LISTING_PAGE_SIZE, ge=1, le=LISTING_MAX_PAGE_SIZE),
+    cursor: str = None,
+    name_prefix: str = None,
+    stream: bool = False,
     db: Session = Depends(get_public_schema_db),
     token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
 ):
     """
     Get all available coverages.
 
+    Coverages are ordered by name and returned one page at a time, pass `next_cursor`
+    as `cursor` to get the next page. With `stream` every remaining coverage is
+    streamed as newline delimited JSON instead.
 
     Authentication:
     - JWT Bearer token
@@ -83,38 +115,56 @@ def get_coverages(
     - Only admin user
 
     Args:
+        limit (int, optional): Number of coverages per page.
+        cursor (str, optional): `next_cursor` of the previous page.
+        name_prefix (str, optional): Only list the coverages whose name starts with this prefix.
+        stream (bool, optional): Stream all coverages as newline delimited JSON.
         db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
         token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
 
     Returns:
-        list[dict]: A list of dictionaries, each representing a coverage with its details.
+        dict: The coverages of the page in `data`, each with its id, name and schema, and the cursor of the next page in `next_cursor`, None on the last page.
 
     Raises:
-        HTTPException: If the user is not authorized to view the coverages or if there is an error retrieving the data from the database.
+        HTTPException: If the user is not authorized to view the coverages, the cursor is not valid or if there is an error retrieving the data from the database.
     """
     token = token.credentials
     admin_user_id = authenticator.decode_token(token=token)
     if (
-        not db.query(User)
+        not db.query(User.id)
         .filter(User.id == admin_user_id, User.is_admin == True)
         .first()
     ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized !!"
         )
-    all_coverage = db.query(Coverage).all()
-    return all_coverage
+    # the columns the listing always returned, not the shard, quotas or extent
+    statement = select(Coverage.id, Coverage.name, Coverage.db_schema)
+    if name_prefix:
+        statement = statement.where(
+            Coverage.name.startswith(name_prefix, autoescape=True)
+        )
+    statement = after_cursor(statement, Coverage.name, cursor)
+    if stream:
+        return stream_rows(db, statement)
+
+    all_coverage, next_cursor = fetch_page(db, statement, "name", limit)
+    return {"status": "success", "data": all_coverage, "next_cursor": next_cursor}
 
 
-@coverage_route.delete("/coverage/{name}")
+@coverage_route.delete("/coverage/{name}", status_code=status.HTTP_202_ACCEPTED)
 def delete_coverage(
     name: str,
+    response: Response,
     token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
     db: Session = Depends(get_public_schema_db),
 ):
     """
     Delete an existing coverage by name.
 
+    The coverage is marked as deleting and stops being served right away, its schema
+    is dropped by a background job whose status is available at `/admin/jobs/{job_id}`.
+
     Authentication:
     - JWT Bearer token
 
@@ -123,11 +173,12 @@ def delete_coverage(
 
     Args:
         name (str): The name of the coverage to be deleted.
+        response (Response): The response, carrying the read-your-writes cookie.
         db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
         token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
 
     Returns:
-        dict: A dictionary containing a success message indicating that the coverage has been deleted.
+        dict: A dictionary containing a message and the id of the job deleting the coverage.
 
     Raises:
         HTTPException: If the user is not authorized to delete a coverage, if the specified coverage does not exist in the database, or if there is an error deleting the coverage from the database.
@@ -151,17 +202,30 @@ def delete_coverage(
             detail=f"Not coverage exists with name {name}",
         )
 
-    db.delete(coverage_db)
+    if coverage_db.status == COVERAGE_DELETING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Coverage {name} is already being deleted",
+        )
+
+    coverage_db.status = COVERAGE_DELETING
+    job = enqueue_job(db, "drop_coverage", {"coverage_id": coverage_db.id})
     db.commit()
-    return {"status": "failed", "message": f"{name} coverage deleted successfully !!"}
+    mark_user_write(admin_user_id, response)
+    return {
+        "status": "success",
+        "message": f"{name} coverage is being deleted !!",
+        "job_id": job.id,
+    }
 
 
 @coverage_route.get("/coverage/{name}/sensor")
+@utils.coalesced
 def get_sensor_data(
     name: str,
-    payload: payload_schemas.FilterPayload,
-    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
-    db: Session = Depends(get_public_schema_db),
+    payload: payload_schemas.SensorFilterPayload,
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
 ):
     """
     Retrieve sensor data for a coverage.
@@ -174,9 +238,9 @@ def get_sensor_data(
 
     Args:
         name (str): The name of the coverage for which to retrieve sensor data.
-        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data.
-        db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
-        token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
+        payload (SensorFilterPayload): A payload object that contains filters to be applied on the sensor data. Set `fast_json` to skip the ORM and encode rows with orjson, `fields` limits the returned columns (implies `fast_json`). Set `downsample` (`lttb` or `minmax`) to get the `value` series of every device (or of `device_id`) reduced to at most `points` points instead of a page, at most `DOWNSAMPLE_MAX_TOTAL_POINTS` points in all.
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
 
     Returns:
         list[dict]: A list of dictionary objects containing sensor data for the given coverage. The list contains a maximum of 5 items.
@@ -184,33 +248,28 @@ def get_sensor_data(
     Raises:
         HTTPException: If the user is not authorized to access sensor data for the coverage, or if there is an error retrieving the sensor data from the database.
     """
-    # user authentication
-    user_id = authenticator.decode_token(token=token.credentials)
-    user_db_object = db.query(User).filter(User.id == user_id).first()
-    if not user_db_object:
-        return HTTPException(status_code=400, detail="Not a valid token !!")
-
-    coverage_db_object = db.query(Coverage).filter(Coverage.name == name).first()
-    if not coverage_db_object:
-        return HTTPException(status_code=400, detail="Not a valid coverage name !!")
-    if user_db_object.is_admin:
-        pass
-    else:
-        coverage_id = user_db_object.coverage_id
-        if coverage_id != coverage_db_object.id:
-            return HTTPException(
-                status_code=400, detail="Not authorized to perform this action!!"
-            )
-
     # get sensor data
     page_no = 0 if payload.page_no is None else payload.page_no
-    schema_db = get_schema_db(schema_name=coverage_db_object.db_schema)
+    schema_db = context.schema_db
+
+    if payload.downsample:
+        filters = []
+        if payload.device_id is not None:
+            filters.append(SensorReading.device_id == payload.device_id)
+        statement = queries.select_series(filters, payload.value, payload.points)
+        return downsampling.downsampled_response(schema_db, statement, payload, request)
+
+    if payload.fast_json or payload.fields:
+        result = schema_db.execute(
+            queries.select_sensor_readings([], page_no, fields=payload.fields)
+        )
+        return FastJSONResponse(rows_to_dicts(result), request=request)
 
     # db_object = schema_db.query(SensorReading).limit(5).offset(page_no).all()
     db_object = (
         schema_db.query(SensorReading)
         .options(joinedload(SensorReading.sensor))
-        .limit(5)
+        .limit(queries.PAGE_SIZE)
         .offset(page_no)
         .all()
     )
@@ -226,11 +285,12 @@ def get_sensor_data(
 
 
 @coverage_route.get("/coverage/{name}/sensor/filter")
+@utils.coalesced
 def filter_sensor_data(
     name: str,
-    payload: payload_schemas.FilterPayload,
-    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
-    db: Session = Depends(get_public_schema_db),
+    payload: payload_schemas.SensorFilterPayload,
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
 ):
     """
     API endpoint to filter sensor data based on date(YYYYMMDDHHMM) and Ploygon Geometry.
@@ -244,9 +304,9 @@ def filter_sensor_data(
 
     Args:
         name (str): The name of the coverage for which to retrieve sensor data.
-        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data.
-        db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
-        token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
+        payload (SensorFilterPayload): A payload object that contains filters to be applied on the sensor data. Set `fast_json` to skip the ORM and encode rows with orjson, `fields` limits the returned columns (implies `fast_json`). Set `downsample` (`lttb` or `minmax`) to get the `value` series of every device (or of `device_id`) reduced to at most `points` points instead of a page, at most `DOWNSAMPLE_MAX_TOTAL_POINTS` points in all.
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
 
     Returns:
         list[dict]: A list of dictionary objects containing sensor data for the given coverage. The list contains a maximum of 5 items.
@@ -255,55 +315,56 @@ def filter_sensor_data(
         HTTPException: If the user is not authorized to access sensor data for the coverage, or if there is an error retrieving the sensor data from the database.
     """
 
-    # user authentication
-    user_id = authenticator.decode_token(token=token.credentials)
-    user_db_object = db.query(User).filter(User.id == user_id).first()
-    if not user_db_object:
-        return HTTPException(status_code=400, detail="Not a valid token !!")
-
-    coverage_db_object = db.query(Coverage).filter(Coverage.name == name).first()
-    if not coverage_db_object:
-        return HTTPException(status_code=400, detail="Not a valid coverage name !!")
-
-    if user_db_object.is_admin:
-        pass
-    else:
-        coverage_id = user_db_object.coverage_id
-        if coverage_id != coverage_db_object.id:
-            return HTTPException(
-                status_code=400, detail="Not authorized to perform this action!!"
-            )
-
     # filter
-    if not payload.polygon and not payload.start_time and not payload.end_time:
+    if (
+        not payload.polygon
+        and not payload.start_time
+        and not payload.end_time
+        and payload.device_id is None
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not a valid payload to filter data !!",
         )
     # get schema db
-    schema_db = get_schema_db(schema_name=coverage_db_object.db_schema)
-    # Define the query filters
-    filters = []
-    # query based on start and end datetime
-    if payload.start_time and payload.end_time:
-        start_time = datetime.strptime(payload.start_time, "%Y%m%d%H%M%S").isoformat()
-        end_time = datetime.strptime(payload.end_time, "%Y%m%d%H%M%S").isoformat()
-        filters.append(SensorReading.date_time >= start_time)
-        filters.append(SensorReading.date_time <= end_time)
-    if payload.polygon:
-        polygon_wkt = payload.polygon
-        polygon_geom = ST_SetSRID(ST_GeomFromText(polygon_wkt), 4326)
-        filters.append(ST_Intersects(Sensor.geometry, polygon_geom))
-    # return start_time, end_time
+    schema_db = context.schema_db
+    # Define the query filters, small sensor tables resolve the polygon in memory
+    sensor_ids = sensor_index.sensor_ids_in_polygon(
+        context.coverage.id, schema_db, payload.polygon
+    )
+    filters = queries.sensor_reading_filters(
+        payload,
+        sensor_ids,
+        extent.fresh_extent(context.coverage, schema_db, payload.polygon),
+    )
     page_no = 0 if payload.page_no is None else payload.page_no
 
+    if payload.downsample:
+        statement = queries.select_series(
+            filters,
+            payload.value,
+            payload.points,
+            join_sensor=bool(payload.polygon) and sensor_ids is None,
+        )
+        return downsampling.downsampled_response(schema_db, statement, payload, request)
+
+    if payload.fast_json or payload.fields:
+        statement = queries.select_sensor_readings(
+            filters,
+            page_no,
+            fields=payload.fields,
+            join_sensor=bool(payload.polygon) and sensor_ids is None,
+        )
+        result = schema_db.execute(statement)
+        return FastJSONResponse(rows_to_dicts(result), request=request)
+
     # Construct the query
     query = (
         schema_db.query(SensorReading)
         .select_from(Sensor)
         .join(SensorReading, Sensor.id == SensorReading.device_id)
         .filter(and_(*filters))
-        .limit(5)
+        .limit(queries.PAGE_SIZE)
         .offset(page_no)
     )
     # Execute the query and fetch the results
@@ -320,12 +381,63 @@ def filter_sensor_data(
     return db_object
 
 
+@coverage_route.get("/coverage/{name}/sensor/grid")
+def get_sensor_grid(
+    name: str,
+    payload: payload_schemas.GridPayload,
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
+):
+    """
+    Bin the sensor readings of a time window into a square or hexagonal grid for heatmaps.
+
+    Grids are cached per coverage, window, polygon and values for `GRID_CACHE_SECONDS`.
+    Square grids are aggregated once at level 0 and coarser levels are rolled up from
+    the cached cells.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Admin user and user associated with `name` coverage
+
+    Args:
+        name (str): The name of the coverage.
+        payload (GridPayload): Time window between `start_time` and `end_time` (YYYYMMDDHHMMSS), optional `polygon`, cell `shape` (`square` or `hex`), `level` (cell size `GRID_CELL_DEGREES * 2 ** level`), the reading `values` to aggregate and, to get a Mapbox vector tile, the `tile` as `z/x/y`.
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
+
+    Returns:
+        dict: The cells with readings, each with `i`, `j`, its `geometry` WKT, the number of `readings` and `avg_<value>`, `min_<value>` and `max_<value>`. A vector tile with a `cells` layer when `tile` is given.
+
+    Raises:
+        HTTPException: If the user is not authorized to access the coverage, the coverage is over its quota, or the level, polygon, values or tile are not valid.
+    """
+    cells = grid.get_grid(context.coverage.id, context.schema_db, payload)
+    if payload.tile:
+        return Response(
+            content=grid.encode_tile(context.schema_db, cells, payload.tile),
+            media_type=grid.MVT_MEDIA_TYPE,
+        )
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "shape": payload.shape,
+            "level": payload.level,
+            "cell_size": grid.cell_size(payload.level),
+            "cells": cells,
+        },
+        request=request,
+    )
+
+
 @coverage_route.get("/coverage/{name}/sinks")
+@utils.coalesced
 def get_sink_data(
     name: str,
     payload: payload_schemas.FilterPayload,
-    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
-    db: Session = Depends(get_public_schema_db),
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
 ):
 
     """
@@ -339,9 +451,9 @@ def get_sink_data(
 
     Args:
         name (str): The name of the coverage for which to retrieve sensor data.
-        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data.
-        db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
-        token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
+        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data. Set `fast_json` to skip the ORM and encode rows with orjson, `fields` limits the returned columns (implies `fast_json`).
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
 
     Returns:
         list[dict]: A list of dictionary objects containing sensor data for the given coverage. The list contains a maximum of 5 items.
@@ -349,39 +461,29 @@ def get_sink_data(
     Raises:
         HTTPException: If the user is not authorized to access sensor data for the coverage, or if there is an error retrieving the sensor data from the database.
     """
-    # user authentication
-    user_id = authenticator.decode_token(token=token.credentials)
-    user_db_object = db.query(User).filter(User.id == user_id).first()
-    if not user_db_object:
-        return HTTPException(status_code=400, detail="Not a valid token !!")
-    coverage_db_object = db.query(Coverage).filter(Coverage.name == name).first()
-    if not coverage_db_object:
-        return HTTPException(status_code=400, detail="Not a valid coverage name !!")
-
-    if user_db_object.is_admin:
-        pass
-    else:
-        coverage_id = user_db_object.coverage_id
-        if coverage_id != coverage_db_object.id:
-            return HTTPException(
-                status_code=400, detail="Not authorized to perform this action!!"
-            )
-
     # get sensor data
     page_no = 0 if payload.page_no is None else payload.page_no
-    schema_db = get_schema_db(schema_name=coverage_db_object.db_schema)
-    db_object = schema_db.query(Sink).limit(5).offset(page_no).all()
+    schema_db = context.schema_db
+
+    if payload.fast_json or payload.fields:
+        result = schema_db.execute(
+            queries.select_sinks([], page_no, fields=payload.fields)
+        )
+        return FastJSONResponse(rows_to_dicts(result), request=request)
+
+    db_object = schema_db.query(Sink).limit(queries.PAGE_SIZE).offset(page_no).all()
     for x in db_object:
         x.geometry = to_shape(x.geometry).wkt
     return db_object
 
 
 @coverage_route.get("/coverage/{name}/sinks/filter")
+@utils.coalesced
 def filter_sink_data(
     name: str,
     payload: payload_schemas.FilterPayload,
-    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
-    db: Session = Depends(get_public_schema_db),
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
 ):
 
     """
@@ -395,9 +497,9 @@ def filter_sink_data(
 
     Args:
         name (str): The name of the coverage for which to retrieve sensor data.
-        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data.
-        db (Session, optional): The database session to use for the operation. Defaults to Depends(get_db).
-        token (HTTPAuthorizationCredentials, optional): The JWT Bearer token obtained from the `authenticator.auth_scheme` dependency function. Defaults to Depends(auth_scheme).
+        payload (FilterPayload): A payload object that contains filters to be applied on the sensor data. Set `fast_json` to skip the ORM and encode rows with orjson, `fields` limits the returned columns (implies `fast_json`).
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
 
     Returns:
         list[dict]: A list of dictionary objects containing sensor data for the given coverage. The list contains a maximum of 5 items.
@@ -405,24 +507,6 @@ def filter_sink_data(
     Raises:
         HTTPException: If the user is not authorized to access sensor data for the coverage, or if there is an error retrieving the sensor data from the database.
     """
-    # user authentication
-    user_id = authenticator.decode_token(token=token.credentials)
-    user_db_object = db.query(User).filter(User.id == user_id).first()
-    if not user_db_object:
-        return HTTPException(status_code=400, detail="Not a valid token !!")
-    coverage_db_object = db.query(Coverage).filter(Coverage.name == name).first()
-    if not coverage_db_object:
-        return HTTPException(status_code=400, detail="Not a valid coverage name !!")
-
-    if user_db_object.is_admin:
-        pass
-    else:
-        coverage_id = user_db_object.coverage_id
-        if coverage_id != coverage_db_object.id:
-            return HTTPException(
-                status_code=400, detail="Not authorized to perform this action!!"
-            )
-
     # get sensor data
     if not payload.polygon and not payload.start_time and not payload.end_time:
         raise HTTPException(
@@ -431,34 +515,27 @@ def filter_sink_data(
         )
 
     # get schema db
-    schema_db = get_schema_db(schema_name=coverage_db_object.db_schema)
+    schema_db = context.schema_db
     page_no = 0 if payload.page_no is None else payload.page_no
 
     # Define the query filters
-    filters = []
-    # query based on start and end datetime
-    if payload.start_time and payload.end_time:
-
-        start_time = (
-            datetime.strptime(payload.start_time, "%Y%m%d%H%M%S")
-            .isoformat()
-            .replace("T", " ")
-        )
-        end_time = (
-            datetime.strptime(payload.end_time, "%Y%m%d%H%M%S")
-            .isoformat()
-            .replace("T", " ")
+    filters = queries.sink_filters(
+        payload, extent.fresh_extent(context.coverage, schema_db, payload.polygon)
+    )
+
+    if payload.fast_json or payload.fields:
+        result = schema_db.execute(
+            queries.select_sinks(filters, page_no, fields=payload.fields)
         )
+        return FastJSONResponse(rows_to_dicts(result), request=request)
 
-        filters.append(Sink.date_time >= start_time)
-        filters.append(Sink.date_time <= end_time)
-    # query based on polygon
-    if payload.polygon is not None:
-        polygon_wkt = payload.polygon
-        polygon_geom = ST_SetSRID(ST_GeomFromText(polygon_wkt), 4326)
-        filters.append(ST_Intersects(Sink.geometry, polygon_geom))
     # Construct the query
-    query = schema_db.query(Sink).filter(and_(*filters)).limit(5).offset(page_no)
+    query = (
+        schema_db.query(Sink)
+        .filter(and_(*filters))
+        .limit(queries.PAGE_SIZE)
+        .offset(page_no)
+    )
 
     # Execute the query and fetch the results
     db_object = query.all()
@@ -466,3 +543,155 @@ def filter_sink_data(
     for x in db_object:
         x.geometry = to_shape(x.geometry).wkt
     return db_object
+
+
+@coverage_route.get("/coverage/{name}/sinks/sensors")
+def get_sink_sensors(
+    name: str,
+    payload: payload_schemas.SpatialJoinPayload,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
+):
+    """
+    Relate sink parcels to the sensors inside them, or within `buffer_meters` of them.
+
+    The spatial join runs in PostGIS on the GiST indexes of both tables and rows are
+    streamed as newline delimited JSON while they are fetched.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Admin user and user associated with `name` coverage
+
+    Args:
+        name (str): The name of the coverage.
+        payload (SpatialJoinPayload): Buffer around the sinks in meters and, with `aggregate`, the reading `values` to average over the time window between `start_time` and `end_time` (YYYYMMDDHHMMSS).
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
+
+    Returns:
+        StreamingResponse: One JSON line per sink and sensor pair (`sink_id`, `parcel_id`, `sensor_id`), or per sink with `sensors`, `readings` and `avg_<value>` when aggregated.
+
+    Raises:
+        HTTPException: If the user is not authorized to access the coverage, the coverage is over its quota or a value is unknown.
+    """
+    if payload.buffer_meters < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="buffer_meters can not be negative !!",
+        )
+    statement = queries.select_sink_sensors(payload)
+    result = context.schema_db.execute(
+        statement, execution_options={"stream_results": True}
+    )
+    return StreamingResponse(ndjson_lines(result), media_type=NDJSON_MEDIA_TYPE)
+
+
+@coverage_route.get("/coverage/{name}/changes")
+def get_changes(
+    name: str,
+    since: str = None,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
+):
+    """
+    Stream the sensors, sensor readings and sinks inserted, updated or deleted since a previous sync.
+
+    Rows are streamed as newline delimited JSON with their `table`, `op` (`upsert` or `delete`) and `change_seq`; upserts carry every column and deletes the `id` of the row. Deletes come first, then the upserts of each table in `change_seq` order. The `X-Next-Cursor` header is the `since` of the next sync.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Admin user and user associated with `name` coverage
+
+    Args:
+        name (str): The name of the coverage.
+        since (str, optional): `X-Next-Cursor` of the previous sync, omitted for a full sync.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
+
+    Returns:
+        StreamingResponse: One JSON line per changed row.
+
+    Raises:
+        HTTPException: If the user is not authorized to access the coverage, the coverage is over its quota or the changes since `since` were compacted or the coverage moved to another shard since (410).
+    """
+    schema_db = context.schema_db
+    since_xid = changes.parse_cursor(context.coverage, since)
+    watermark = changes.change_watermark(schema_db)
+    changes.check_since(schema_db, since_xid)
+    if since_xid is not None and since_xid >= watermark:
+        # nothing committed since, or a replica behind the previous sync
+        statements, watermark = [], since_xid
+    else:
+        statements = changes.select_changes(since_xid, watermark)
+    return StreamingResponse(
+        changes.change_lines(schema_db, statements),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"X-Next-Cursor": changes.format_cursor(context.coverage, watermark)},
+    )
+
+
+@coverage_route.post("/coverage/{name}/batch")
+def batch_query(
+    name: str,
+    payload: payload_schemas.BatchPayload,
+    request: Request,
+    context: utils.TenantContext = Depends(utils.get_tenant_context),
+):
+    """
+    Run several sensor and sink queries of a coverage in one request.
+
+    The user is authorized once and all sub-queries run on the same tenant connection.
+    Each sub-query has the semantics of the endpoint it is named after (`sensor`,
+    `sensor/filter`, `sinks`, `sinks/filter`) and returns rows like `fast_json`.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Admin user and user associated with `name` coverage
+
+    Args:
+        name (str): The name of the coverage to query.
+        payload (BatchPayload): The list of sub-queries, each with its own `FilterPayload`.
+        request (Request): The incoming request, used to negotiate response compression.
+        context (TenantContext): The authorized user, coverage and tenant database session. Defaults to Depends(get_tenant_context).
+
+    Returns:
+        dict: One result per sub-query, in request order. A failed sub-query has status `failed` and does not fail the others.
+
+    Raises:
+        HTTPException: If the user is not authorized to access the coverage, the coverage is over its quota or the batch is too large.
+    """
+    if len(payload.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can have at most {settings.BATCH_MAX_QUERIES} queries !!",
+        )
+
+    results = []
+    schema_db = context.schema_db
+    for sub_query in payload.queries:
+        try:
+            sensor_ids = None
+            if sub_query.query == "sensor/filter":
+                sensor_ids = sensor_index.sensor_ids_in_polygon(
+                    context.coverage.id, schema_db, sub_query.payload.polygon
+                )
+            statement = queries.select_batch_query(
+                sub_query.query,
+                sub_query.payload,
+                sensor_ids,
+                extent.fresh_extent(
+                    context.coverage, schema_db, sub_query.payload.polygon
+                ),
+            )
+            data = rows_to_dicts(schema_db.execute(statement))
+            results.append({"status": "success", "data": data})
+        except HTTPException as error:
+            results.append({"status": "failed", "detail": error.detail})
+        except SQLAlchemyError as error:
+            schema_db.rollback()
+            detail = str(getattr(error, "orig", None) or error).strip()
+            results.append({"status": "failed", "detail": detail})
+
+    return FastJSONResponse({"status": "success", "results": results}, request=request)
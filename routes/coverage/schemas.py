@@ -1,3 +1,4 @@
+from typing import List, Literal
 from pydantic import BaseModel
 
 
@@ -10,3 +11,40 @@ class FilterPayload(BaseModel):
     end_time: str = None
     page_no: int = None
     polygon: str = None
+    fast_json: bool = False
+    fields: List[str] = None
+
+
+class SensorFilterPayload(FilterPayload):
+    device_id: int = None
+    downsample: Literal["lttb", "minmax"] = None
+    points: int = 1000
+    value: str = "co2_concentration_value"
+
+
+class BatchQuery(BaseModel):
+    query: Literal["sensor", "sensor/filter", "sinks", "sinks/filter"]
+    # sink sub-queries ignore the sensor fields
+    payload: SensorFilterPayload = SensorFilterPayload()
+
+
+class BatchPayload(BaseModel):
+    queries: List[BatchQuery]
+
+
+class SpatialJoinPayload(BaseModel):
+    start_time: str = None
+    end_time: str = None
+    buffer_meters: float = 0
+    aggregate: bool = False
+    values: List[str] = ["co2_concentration_value"]
+
+
+class GridPayload(BaseModel):
+    start_time: str = None
+    end_time: str = None
+    polygon: str = None
+    shape: Literal["square", "hex"] = "square"
+    level: int = 0
+    values: List[str] = ["co2_concentration_value"]
+    tile: str = None
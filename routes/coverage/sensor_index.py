@@ -0,0 +1,121 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import time
+import threading
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from models.coverage_models import Sensor
+from routes.coverage.spatial import polygon_cache
+from security import settings
+
+
+class SensorIndex:
+    """
+    STRtree of the sensor locations of a coverage.
+
+    Attributes:
+        version (tuple): sensor count and last change the index was built from
+        checked_at (float): monotonic time the version was last checked
+    """
+
+    def __init__(self, version: tuple, rows: list):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.sensor_ids = [sensor_id for sensor_id, _, _ in rows]
+        self.tree = STRtree([Point(x, y) for _, x, y in rows])
+
+    def query(self, geometry) -> list:
+        """
+        Return the ids of the sensors intersecting a geometry.
+        """
+        return [
+            self.sensor_ids[index]
+            for index in self.tree.query(geometry, predicate="intersects")
+        ]
+
+
+# coverage id -> SensorIndex
+sensor_indexes = {}
+sensor_indexes_lock = threading.Lock()
+
+
+def sensor_version(schema_db: Session) -> tuple:
+    # inserts and updates draw a new `change_seq` (see the `track_change` trigger),
+    # deletes lower the count
+    return tuple(
+        schema_db.execute(
+            select(func.count(Sensor.id), func.max(Sensor.change_seq))
+        ).one()
+    )
+
+
+def get_sensor_index(coverage_id: str, schema_db: Session):
+    """
+    Return the sensor index of a coverage, building or refreshing it when needed.
+
+    The data version is checked at most every `settings.SENSOR_INDEX_CHECK_SECONDS`.
+
+    Args:
+        coverage_id (str): coverage id
+        schema_db (Session): tenant session of the coverage
+
+    Returns:
+        SensorIndex: sensor index, None if the coverage has more than
+        `settings.SENSOR_INDEX_MAX_SENSORS` sensors
+    """
+    index = sensor_indexes.get(coverage_id)
+    now = time.monotonic()
+    if (
+        index is not None
+        and now - index.checked_at < settings.SENSOR_INDEX_CHECK_SECONDS
+    ):
+        return index
+
+    version = sensor_version(schema_db)
+    if version[0] > settings.SENSOR_INDEX_MAX_SENSORS:
+        sensor_indexes.pop(coverage_id, None)
+        return None
+    if index is not None and index.version == version:
+        index.checked_at = now
+        return index
+
+    with sensor_indexes_lock:
+        index = sensor_indexes.get(coverage_id)
+        if index is None or index.version != version:
+            rows = schema_db.execute(
+                select(
+                    Sensor.id, func.ST_X(Sensor.geometry), func.ST_Y(Sensor.geometry)
+                ).where(Sensor.geometry.isnot(None))
+            ).all()
+            index = sensor_indexes[coverage_id] = SensorIndex(version, rows)
+        return index
+
+
+def sensor_ids_in_polygon(coverage_id: str, schema_db: Session, polygon_wkt: str):
+    """
+    Resolve a filter polygon to the ids of the sensors inside it in memory.
+
+    Args:
+        coverage_id (str): coverage id
+        schema_db (Session): tenant session of the coverage
+        polygon_wkt (str): client polygon WKT
+
+    Returns:
+        list: sensor ids, None when the index is disabled or the coverage has too
+        many sensors and the polygon must be tested in SQL
+
+    Raises:
+        HTTPException: if the WKT is not a valid polygon
+    """
+    if not polygon_wkt or not settings.SENSOR_INDEX_MAX_SENSORS:
+        return None
+    polygon = polygon_cache.get(polygon_wkt)
+    index = get_sensor_index(coverage_id, schema_db)
+    if index is None:
+        return None
+    return index.query(polygon.geometry)
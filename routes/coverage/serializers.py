@@ -0,0 +1,109 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import gzip
+import orjson
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import Request
+from fastapi.responses import ORJSONResponse
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import settings
+
+# brotli is optional, gzip is used when it is not installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def rows_to_dicts(result) -> list:
+    """
+    Convert a SQL result into a list of dictionaries without going through the ORM.
+
+    Columns labelled `<relation>.<column>` are nested under `<relation>`, a relation
+    with only NULL values (outer join without a match) is rendered as None.
+
+    Args:
+        result: SQLAlchemy result of a column level SELECT
+
+    Returns:
+        list[dict]: one dictionary per row
+    """
+    keys = list(result.keys())
+    rows = result.all()
+    if not any("." in key for key in keys):
+        return [dict(zip(keys, row)) for row in rows]
+
+    # split keys once, rows are then built by position
+    flat_keys = [(index, key) for index, key in enumerate(keys) if "." not in key]
+    nested_keys = {}
+    for index, key in enumerate(keys):
+        if "." in key:
+            relation, column = key.split(".", 1)
+            nested_keys.setdefault(relation, []).append((index, column))
+
+    data = []
+    for row in rows:
+        item = {key: row[index] for index, key in flat_keys}
+        for relation, columns in nested_keys.items():
+            values = {column: row[index] for index, column in columns}
+            item[relation] = (
+                values if any(value is not None for value in values.values()) else None
+            )
+        data.append(item)
+    return data
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# rows fetched from the server side cursor per chunk of a streamed response
+STREAM_BATCH_SIZE = 1000
+
+
+def ndjson_lines(result):
+    """
+    Encode a streamed SQL result as newline delimited JSON, one chunk per batch.
+
+    Args:
+        result: SQLAlchemy result executed with `stream_results`
+
+    Yields:
+        bytes: JSON lines of a batch of rows
+    """
+    keys = list(result.keys())
+    for rows in result.partitions(STREAM_BATCH_SIZE):
+        yield b"".join(
+            orjson.dumps(dict(zip(keys, row)), option=orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson response which compresses the body when it is larger than
+    `settings.RESPONSE_COMPRESSION_MIN_SIZE` and the client accepts br or gzip.
+
+    `json_body` keeps the uncompressed JSON so it can be shared between requests.
+    """
+
+    def __init__(self, content, request: Request, status_code: int = 200):
+        self.accept_encoding = request.headers.get("accept-encoding", "")
+        self.content_encoding = None
+        super().__init__(content, status_code=status_code)
+        if self.content_encoding:
+            self.headers["Content-Encoding"] = self.content_encoding
+            self.headers["Vary"] = "Accept-Encoding"
+
+    def render(self, content) -> bytes:
+        # content already encoded by orjson is sent as is
+        body = content if isinstance(content, bytes) else super().render(content)
+        self.json_body = body
+        min_size = settings.RESPONSE_COMPRESSION_MIN_SIZE
+        if not min_size or len(body) < min_size:
+            return body
+        if brotli is not None and "br" in self.accept_encoding:
+            self.content_encoding = "br"
+            return brotli.compress(body, quality=4)
+        if "gzip" in self.accept_encoding:
+            self.content_encoding = "gzip"
+            return gzip.compress(body, compresslevel=5)
+        return body
@@ -0,0 +1,186 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from shapely import wkt as shapely_wkt
+from shapely.errors import ShapelyError
+from shapely.geometry import box
+from shapely.prepared import prep
+from shapely.validation import explain_validity
+from geoalchemy2.functions import ST_Intersects, ST_GeomFromText, ST_MakeEnvelope
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import and_, or_, false
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from security import settings
+
+# SRID of the coverage geometries
+SRID = 4326
+
+
+class FilterPolygon:
+    """
+    Client polygon parsed and validated once.
+
+    Attributes:
+        geometry: shapely polygon
+        prepared: prepared geometry for repeated in-process predicates
+        bounds (tuple): min x, min y, max x, max y
+        parts (list): WKT and bounds of the pieces used in SQL, the polygon itself
+            unless it was subdivided
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.prepared = prep(geometry)
+        self.bounds = geometry.bounds
+        self.parts = [(piece.wkt, piece.bounds) for piece in subdivide(geometry)]
+
+
+def subdivide(geometry) -> list:
+    """
+    Split a polygon with more than `settings.POLYGON_SUBDIVIDE_VERTICES` vertices
+    along a regular grid over its bounding box.
+
+    Every piece has a tighter bounding box and fewer vertices than the polygon, so
+    the index prefilter discards more rows and each exact test is cheaper.
+    """
+    max_vertices = settings.POLYGON_SUBDIVIDE_VERTICES
+    vertices = count_vertices(geometry)
+    if not max_vertices or vertices <= max_vertices:
+        return [geometry]
+    cells = math.ceil(math.sqrt(vertices / max_vertices))
+    min_x, min_y, max_x, max_y = geometry.bounds
+    width, height = (max_x - min_x) / cells, (max_y - min_y) / cells
+    pieces = []
+    for column in range(cells):
+        for row in range(cells):
+            cell = box(
+                min_x + column * width,
+                min_y + row * height,
+                min_x + (column + 1) * width,
+                min_y + (row + 1) * height,
+            )
+            piece = geometry.intersection(cell)
+            if not piece.is_empty and piece.area > 0:
+                pieces.append(piece)
+    return pieces or [geometry]
+
+
+def count_vertices(geometry) -> int:
+    polygons = getattr(geometry, "geoms", [geometry])
+    return sum(
+        len(polygon.exterior.coords)
+        + sum(len(interior.coords) for interior in polygon.interiors)
+        for polygon in polygons
+    )
+
+
+class PolygonCache:
+    """
+    Bounded LRU of parsed polygons keyed by the SHA-256 digest of their WKT.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, polygon_wkt: str) -> FilterPolygon:
+        """
+        Return the parsed polygon of a WKT string, parsing it on a cache miss.
+
+        Raises:
+            HTTPException: if the WKT is not a valid polygon
+        """
+        digest = hashlib.sha256(polygon_wkt.encode()).digest()
+        with self._lock:
+            polygon = self._entries.get(digest)
+            if polygon is not None:
+                self._entries.move_to_end(digest)
+                return polygon
+        polygon = parse_polygon(polygon_wkt)
+        with self._lock:
+            self._entries[digest] = polygon
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return polygon
+
+
+def parse_polygon(polygon_wkt: str) -> FilterPolygon:
+    """
+    Parse and validate a client WKT polygon.
+
+    Args:
+        polygon_wkt (str): polygon or multi polygon WKT
+
+    Returns:
+        FilterPolygon: parsed polygon
+
+    Raises:
+        HTTPException: if the WKT can not be parsed or is not a valid polygon
+    """
+    try:
+        geometry = shapely_wkt.loads(polygon_wkt)
+    except (ShapelyError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Not a valid polygon !!"
+        )
+    if geometry.geom_type not in ("Polygon", "MultiPolygon") or geometry.is_empty:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected a polygon, got {geometry.geom_type} !!",
+        )
+    if not geometry.is_valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not a valid polygon, {explain_validity(geometry)} !!",
+        )
+    return FilterPolygon(geometry)
+
+
+polygon_cache = PolygonCache(settings.POLYGON_CACHE_SIZE)
+
+
+def intersects_polygon(column, polygon_wkt: str, extent=None):
+    """
+    Build the SQL predicate of a geometry column intersecting a client polygon.
+
+    The `&&` bounding box operator against a constant envelope lets the GiST index
+    do the coarse filtering before the exact `ST_Intersects` test, which then runs
+    on the cached, validated WKT of each polygon piece.
+
+    With the extent of the coverage, a polygon outside of it is a constant false
+    predicate which Postgres answers without reading a row, and a polygon covering
+    it only needs the geometry to be set.
+
+    Args:
+        column: geometry column
+        polygon_wkt (str): client polygon WKT
+        extent (optional): prepared extent of the coverage, from `extent_cache`
+
+    Returns:
+        SQL expression
+
+    Raises:
+        HTTPException: if the WKT is not a valid polygon
+    """
+    polygon = polygon_cache.get(polygon_wkt)
+    if extent is not None:
+        if extent.disjoint(polygon.geometry):
+            return false()
+        if polygon.prepared.covers(extent.context):
+            return column.isnot(None)
+    predicates = [
+        and_(
+            column.op("&&")(ST_MakeEnvelope(*bounds, SRID)),
+            ST_Intersects(column, ST_GeomFromText(piece_wkt, SRID)),
+        )
+        for piece_wkt, bounds in polygon.parts
+    ]
+    return predicates[0] if len(predicates) == 1 else or_(*predicates)
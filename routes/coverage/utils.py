@@ -1,13 +1,78 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import functools
+import orjson
+from psycopg2 import errors
+
 # -------------------------------- FASTAPI IMPORTS --------------------------------#
-from fastapi import HTTPException
+from fastapi import HTTPException, status, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.security import HTTPAuthorizationCredentials
 
 # -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateSchema
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
-from models.common_models import Coverage
-from models.coverage_models import Sensor, SensorReading, Sink
-from database import engine
+from models.common_models import User, Coverage, COVERAGE_ACTIVE
+from models.coverage_models import SensorReading, Sink
+from database import (
+    SessionLocal,
+    WRITE_COOKIE,
+    get_shard_names,
+    get_shard_engine,
+    evict_tenant_engine,
+    get_schema_db,
+    get_public_schema_db,
+)
+from security import authenticator, settings
+from scheduler import TenantSlot, tenant_db_slot, rate_limits
+from routes.coverage.sensor_index import sensor_indexes
+from routes.coverage.grid import grid_cache
+from routes.coverage.extent import extent_cache
+from routes.coverage.serializers import FastJSONResponse
+from jobs import register_job_handler, JobRetry
+from singleflight import SingleFlight
+
+# large tenant tables emptied one by one before the schema is dropped
+TRUNCATED_TABLES = [SensorReading.__table__, Sink.__table__]
+tenant_reads = SingleFlight("tenant_reads")
+
+
+def choose_shard(db: Session) -> str:
+    """
+    Pick the shard for a new coverage, the shard holding the fewest coverages.
+
+    Args:
+        db (Session): public schema session
+
+    Returns:
+        str: shard name
+    """
+    load = dict(
+        db.query(Coverage.shard, func.count(Coverage.id)).group_by(Coverage.shard).all()
+    )
+    return min(get_shard_names(), key=lambda shard: load.get(shard, 0))
+
+
+def create_tenant_tables(schema_name: str, shard: str):
+    """
+    Create a coverage db schema with its tables on a shard.
+
+    The tables are created by the tenant migrations, in the same transaction as the
+    schema, so new schemas start at the latest tenant revision.
+
+    Args:
+        schema_name (str): coverage db schema name
+        shard (str): shard name
+    """
+    # alembic is only needed when a coverage is created, not to serve requests
+    from management.migrate_tenants import upgrade_schema
+
+    with get_shard_engine(shard).begin() as connection:
+        connection.execute(CreateSchema(schema_name))
+        upgrade_schema(schema_name, shard, connection=connection)
 
 
 def create_coverage(name: str, db: Session):
@@ -15,26 +80,258 @@ def create_coverage(name: str, db: Session):
         raise HTTPException(
             status_code=404, detail=f"Coverage with name {name} exists in database !"
         )
-    db_coverage_object = Coverage(name=name)
+    db_coverage_object = Coverage(name=name, shard=choose_shard(db))
     db.add(db_coverage_object)
     db.commit()
     db.refresh(db_coverage_object)
     # create db schema with tables
-    engine.execute(f"CREATE SCHEMA IF NOT EXISTS {db_coverage_object.db_schema}")
+    create_tenant_tables(db_coverage_object.db_schema, db_coverage_object.shard)
+
+    return (
+        db_coverage_object.id,
+        db_coverage_object.db_schema,
+        db_coverage_object.shard,
+    )
+
+
+@register_job_handler("drop_coverage")
+def drop_coverage(payload: dict, progress):
+    """
+    Job dropping the schema of a deleted coverage and then its `Coverage` row.
 
-    # Set the schema for each table class
-    Sensor.__table__.schema = db_coverage_object.db_schema
-    SensorReading.__table__.schema = db_coverage_object.db_schema
-    Sink.__table__.schema = db_coverage_object.db_schema
+    The cached tenant engines, rate limit, sensor index, grids and extent of the
+    coverage are evicted first. The large tables are truncated one at a time, each in
+    its own short transaction with a lock timeout, so the exclusive locks are never
+    held on all tables at once and a reader still holding a table makes the job retry
+    instead of queueing every request behind the DDL. The schema of the empty
+    tables is then dropped.
 
-    # Create the tables for the tenant schema
-    Sensor.__table__.create(bind=engine)
-    SensorReading.__table__.create(bind=engine)
-    Sink.__table__.create(bind=engine)
+    Args:
+        payload (dict): `coverage_id` of the coverage to drop
+        progress (callable): reports the current step of the job
 
-    # set table schema to none
-    Sensor.__table__.schema = None
-    SensorReading.__table__.schema = None
-    Sink.__table__.schema = None
+    Raises:
+        JobRetry: if a table lock was not granted within `settings.DROP_LOCK_TIMEOUT_SECONDS`
+    """
+    db = SessionLocal()
+    try:
+        coverage = (
+            db.query(Coverage).filter(Coverage.id == payload["coverage_id"]).first()
+        )
+        if coverage is None:
+            # dropped by a previous run of the job
+            return
+        schema_name = coverage.db_schema
+        evict_tenant_engine(schema_name)
+        rate_limits.pop(coverage.id, None)
+        sensor_indexes.pop(coverage.id, None)
+        grid_cache.evict(coverage.id)
+        extent_cache.evict(coverage.id)
+
+        lock_timeout = str(int(settings.DROP_LOCK_TIMEOUT_SECONDS * 1000))
+        shard_engine = get_shard_engine(coverage.shard)
+        try:
+            for table in TRUNCATED_TABLES:
+                progress(f"truncating {table.name}")
+                with shard_engine.begin() as connection:
+                    connection.execute(
+                        select(func.set_config("lock_timeout", lock_timeout, True))
+                    )
+                    if connection.execute(
+                        select(func.to_regclass(f'"{schema_name}".{table.name}'))
+                    ).scalar():
+                        connection.execute(
+                            text(f'TRUNCATE TABLE "{schema_name}".{table.name}')
+                        )
+            progress("dropping schema")
+            with shard_engine.begin() as connection:
+                connection.execute(
+                    select(func.set_config("lock_timeout", lock_timeout, True))
+                )
+                connection.execute(
+                    text(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE')
+                )
+        except OperationalError as error:
+            if isinstance(getattr(error, "orig", None), errors.LockNotAvailable):
+                raise JobRetry(f"{schema_name} is locked") from error
+            raise
+
+        progress("deleting coverage")
+        # users of the coverage are detached by the relationship
+        db.delete(coverage)
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_authorized_coverage(token: str, name: str, db: Session):
+    """
+    Return the user of the token and the coverage `name` if the user may access it.
+
+    Admin users can access every coverage, other users only their assigned coverage.
+
+    Args:
+        token (str): bearer access token
+        name (str): coverage name
+        db (Session): public schema session
+
+    Returns:
+        tuple[User, Coverage]: user and coverage database objects
+
+    Raises:
+        HTTPException: if the token, the coverage name or the user's permission is not valid
+    """
+    user_id = authenticator.decode_token(token=token)
+    user_db_object = db.query(User).filter(User.id == user_id).first()
+    if not user_db_object:
+        raise HTTPException(status_code=400, detail="Not a valid token !!")
+
+    coverage_db_object = (
+        db.query(Coverage)
+        .filter(Coverage.name == name, Coverage.status == COVERAGE_ACTIVE)
+        .first()
+    )
+    if not coverage_db_object:
+        raise HTTPException(status_code=400, detail="Not a valid coverage name !!")
+
+    if (
+        not user_db_object.is_admin
+        and user_db_object.coverage_id != coverage_db_object.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not authorized to perform this action!!",
+        )
+    return user_db_object, coverage_db_object
+
+
+class TenantContext:
+    """
+    Authorized user, coverage and read only tenant session of a coverage request,
+    with the database slot it was admitted with.
+    """
+
+    def __init__(
+        self, user: User, coverage: Coverage, schema_db: Session, slot: TenantSlot
+    ):
+        self.user = user
+        self.coverage = coverage
+        self.schema_db = schema_db
+        self.slot = slot
+
+
+def get_coverage_access(
+    name: str,
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+) -> tuple:
+    """
+    Dependency authorizing a coverage request.
+
+    Args:
+        name (str): coverage name, from the path
+        token (HTTPAuthorizationCredentials): JWT Bearer token
+        db (Session): public schema session
+
+    Returns:
+        tuple[User, Coverage]: user and coverage database objects
+
+    Raises:
+        HTTPException: if the user may not access the coverage
+    """
+    return get_authorized_coverage(token=token.credentials, name=name, db=db)
+
+
+async def admit_tenant_request(access: tuple = Depends(get_coverage_access)):
+    """
+    Dependency admitting a coverage request to the database, see `tenant_db_slot`.
+
+    Async so that requests queued for a slot wait on the event loop and not on a
+    threadpool thread, which the requests holding the slots need to finish. The slot
+    is held until the response has been sent.
+
+    Yields:
+        TenantSlot: database slot of the request
+
+    Raises:
+        HTTPException: if the coverage is over its quota
+    """
+    _, coverage_db_object = access
+    async with tenant_db_slot(coverage_db_object) as slot:
+        yield slot
+
+
+def get_tenant_context(
+    request: Request,
+    access: tuple = Depends(get_coverage_access),
+    slot: TenantSlot = Depends(admit_tenant_request),
+):
+    """
+    Dependency opening the tenant session of an authorized and admitted request.
+
+    The coverage quotas (rate limit, concurrency limit and fair share of the database
+    slots) are enforced by `admit_tenant_request` before the session is opened.
+
+    Args:
+        request (Request): incoming request, its `WRITE_COOKIE` keeps the reads of a
+        client which has just written on the primary
+        access (tuple): user and coverage, from `get_coverage_access`
+        slot (TenantSlot): database slot, from `admit_tenant_request`
+
+    Yields:
+        TenantContext: user, coverage and tenant session
+    """
+    user_db_object, coverage_db_object = access
+    schema_db = get_schema_db(
+        schema_name=coverage_db_object.db_schema,
+        shard=coverage_db_object.shard,
+        readonly=True,
+        user_id=user_db_object.id,
+        last_write=request.cookies.get(WRITE_COOKIE),
+    )
+    try:
+        yield TenantContext(user_db_object, coverage_db_object, schema_db, slot)
+    finally:
+        schema_db.close()
+
+
+def json_body(response) -> bytes:
+    # ORM objects are encoded the way FastAPI encodes a returned value
+    if isinstance(response, FastJSONResponse):
+        return response.json_body
+    return orjson.dumps(jsonable_encoder(response))
+
+
+def coalesced(endpoint):
+    """
+    Decorator coalescing identical concurrent requests to a tenant read endpoint.
+
+    Requests with the same coverage, database and payload arriving while one of them
+    is being served wait for it and share its JSON body, each response is then
+    compressed for its own client. Waiting requests give their database slot back
+    to the scheduler, they do no database work. The endpoint needs the `payload`,
+    `request` and `context` arguments.
+    """
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if not settings.COALESCE_TENANT_READS:
+            return endpoint(*args, **kwargs)
+        context = kwargs["context"]
+        key = (
+            endpoint.__name__,
+            context.coverage.id,
+            # a user reading their own writes may be served by another database
+            context.schema_db.bind,
+            kwargs["payload"].json(sort_keys=True),
+        )
+        body = tenant_reads.do(
+            key,
+            lambda: json_body(endpoint(*args, **kwargs)),
+            on_wait=context.slot.release,
+            coverage=context.coverage.name,
+            endpoint=endpoint.__name__,
+        )
+        return FastJSONResponse(body, request=kwargs["request"])
 
-    return db_coverage_object.id, db_coverage_object.db_schema
+    return wrapper
@@ -0,0 +1,43 @@
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+# -------------------------------- SQL ALCHEMY IMPORTS --------------------------------#
+from sqlalchemy.orm import Session
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from database import get_public_schema_db
+from metrics import metrics
+from routes.admin.utils import verify_admin
+from security import authenticator
+
+# metrics route exposing in-process counters for Prometheus
+metrics_route = APIRouter(tags=["metrics"])
+
+
+@metrics_route.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Expose the service metrics in the Prometheus text format.
+
+    Tenant series are labelled with the coverage names, the scraper authenticates
+    with the token of an admin user.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Returns:
+        str: Prometheus text exposition of counters and gauges.
+
+    Raises:
+        HTTPException: If the user is not authorized.
+    """
+    verify_admin(token=token.credentials, db=db)
+    return metrics.render()
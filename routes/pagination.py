@@ -0,0 +1,86 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import base64
+import binascii
+import orjson
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy.orm import Session
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.coverage.serializers import ndjson_lines, NDJSON_MEDIA_TYPE
+
+# rows returned by one page of an admin listing
+LISTING_PAGE_SIZE = 100
+LISTING_MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(value)).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode an opaque cursor returned by a previous page.
+
+    Raises:
+        HTTPException: if the cursor is not valid
+    """
+    try:
+        return orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Not a valid cursor !!"
+        )
+
+
+def after_cursor(statement, key_column, cursor: str = None):
+    """
+    Order a SELECT by a unique column and start it after the cursor.
+
+    Keyset pagination reads each page from the index of `key_column` instead of
+    skipping the rows of the previous pages like OFFSET.
+
+    Args:
+        statement (Select): SELECT of the listing
+        key_column: unique column the listing is ordered by
+        cursor (str, optional): cursor of the previous page
+
+    Returns:
+        Select: ordered SELECT
+    """
+    if cursor:
+        statement = statement.where(key_column > decode_cursor(cursor))
+    return statement.order_by(key_column)
+
+
+def fetch_page(db: Session, statement, key: str, limit: int):
+    """
+    Fetch one page of a SELECT ordered by `after_cursor`.
+
+    Args:
+        db (Session): database session
+        statement (Select): ordered SELECT
+        key (str): name of the key column in the rows
+        limit (int): page size
+
+    Returns:
+        tuple[list, str]: rows as dictionaries and the cursor of the next page, None
+        on the last page
+    """
+    rows = [dict(row._mapping) for row in db.execute(statement.limit(limit + 1))]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][key])
+
+
+def stream_rows(db: Session, statement) -> StreamingResponse:
+    """
+    Stream every row of a SELECT as newline delimited JSON from a server side cursor.
+    """
+    result = db.execute(statement, execution_options={"stream_results": True})
+    return StreamingResponse(ndjson_lines(result), media_type=NDJSON_MEDIA_TYPE)
@@ -1,17 +1,26 @@
 # -------------------------------- PYTHON IMPORTS --------------------------------#
 # -------------------------------- FASTAPI IMPORTS --------------------------------#
-from fastapi import APIRouter, Depends, status, HTTPException, Request, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Body, Query
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 # -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from routes.user import schemas as payload_schemas
-from database import get_public_schema_db
+from routes.user import utils
+from database import get_public_schema_db, mark_user_write
 from models.common_models import User, Coverage
 from security import authenticator
+from routes.pagination import (
+    LISTING_PAGE_SIZE,
+    LISTING_MAX_PAGE_SIZE,
+    after_cursor,
+    fetch_page,
+    stream_rows,
+)
 
 
 # user route to handle user related end-points
@@ -21,6 +30,7 @@ user_route = APIRouter(tags=["USER"])
 @user_route.post("/users")
 def create_user(
     payload: payload_schemas.UserCreationPayload,
+    response: Response,
     db: Session = Depends(get_public_schema_db),
 ):
     """
@@ -28,6 +38,7 @@ def create_user(
 
     Args:
         payload: The user creation payload, containing the user's ``email id``, ``password`` and ``coverage_id``.
+        response: The response, carrying the read-your-writes cookie.
         db: The database session to use for the operation.
 
     Returns:
@@ -52,12 +63,13 @@ def create_user(
 
     user_db = User(
         email_id=payload.email_id,
-        password=payload.password,  # not using hashed password for simplicity
+        password=authenticator.hash_password(payload.password),
         coverage_id=payload.coverage_id,
     )
     db.add(user_db)
     db.commit()
     db.refresh(user_db)
+    mark_user_write(user_db.id, response)
     # generate access token
     access_token = authenticator.generate_access_token(user_id=user_db.id)
 
@@ -68,6 +80,56 @@ def create_user(
     }
 
 
+@user_route.post("/users/bulk")
+def create_users_in_bulk(
+    request: Request,
+    response: Response,
+    users_file: bytes = Body(..., media_type="text/csv"),
+    token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
+    db: Session = Depends(get_public_schema_db),
+):
+    """
+    Create many users from a CSV or NDJSON upload.
+
+    The body is a CSV file with an `email_id,password,coverage_id` header (`Content-Type: text/csv`)
+    or one JSON user per line (`Content-Type: application/x-ndjson`). Valid users are created in
+    one transaction, invalid rows do not prevent the others from being created.
+
+    Authentication:
+    - JWT Bearer token
+
+    Permissions:
+    - Only admin user
+
+    Returns:
+    A dictionary with the number of created and failed users and one result per row, with the
+    user `id` or the failure `detail`. Users log in to get their access token.
+
+    Raises:
+    HTTPException: If the user is not authorized, the upload format is not supported or it has too many rows.
+    """
+    admin_user_id = authenticator.decode_token(token=token.credentials)
+    if (
+        not db.query(User.id)
+        .filter(User.id == admin_user_id, User.is_admin == True)
+        .first()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized !!"
+        )
+
+    rows = utils.parse_bulk_users(users_file, request.headers.get("content-type", ""))
+    results = utils.create_users(db, rows)
+    mark_user_write(admin_user_id, response)
+    created = sum(1 for result in results if result["status"] == "success")
+    return {
+        "status": "success",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+    }
+
+
 @user_route.get("/users/login")
 def user_login(
     payload: payload_schemas.UserLoginPayload,
@@ -93,12 +155,18 @@ def user_login(
             detail="Bad credentials !!",
         )
 
-    password = user_db_object.password
-    if password != payload.password:
+    is_valid, new_hash = authenticator.check_password(
+        payload.password, user_db_object.password
+    )
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Bad credentials !!",
         )
+    if new_hash:
+        # plain text password or hash with an outdated cost factor
+        user_db_object.password = new_hash
+        db.commit()
 
     return {
         "status": "success",
@@ -114,7 +182,7 @@ def get_user_credentials(
     """
     Get the current user's credentials.
 
-    This endpoint can be used as a forgot password feature. The user will receive an access token that can be used to recover their email and password.
+    Passwords are stored hashed and are not returned.
 
     Authentication:
     - JWT Bearer token
@@ -123,7 +191,7 @@ def get_user_credentials(
     - Valid user
 
     Returns:
-    A dictionary containing the email and password for the current user.
+    A dictionary containing the email of the current user.
 
     Raises:
     HTTPException: If the access token is invalid or the user is not authorized.
@@ -137,15 +205,17 @@ def get_user_credentials(
         raise HTTPException(status_code=400, detail="User Not found !!")
     return {
         "status": "success",
-        "credentials": {
-            "email": user_db_object.email_id,
-            "password": user_db_object.password,
-        },
+        "credentials": {"email": user_db_object.email_id},
     }
 
 
 @user_route.get("/users/all")
 def get_all_users(
+    limit: int = Query(LISTING_PAGE_SIZE, ge=1, le=LISTING_MAX_PAGE_SIZE),
+    cursor: str = None,
+    coverage_id: str = None,
+    email_prefix: str = None,
+    stream: bool = False,
     token: HTTPAuthorizationCredentials = Depends(authenticator.auth_scheme),
     db: Session = Depends(get_public_schema_db),
 ):
@@ -153,6 +223,9 @@ def get_all_users(
     List all users in the database.
 
     This API endpoint allows users with admin access to list all the users in the database.
+    Users are ordered by email and returned one page at a time, pass `next_cursor` as
+    `cursor` to get the next page. With `stream` every remaining user is streamed as
+    newline delimited JSON instead.
 
     Authentication:
     - JWT Bearer token
@@ -160,17 +233,24 @@ def get_all_users(
     Permissions:
     - Only admin user
 
+    Parameters:
+    - limit (int): Number of users per page.
+    - cursor (str): `next_cursor` of the previous page.
+    - coverage_id (str): Only list the users of this coverage.
+    - email_prefix (str): Only list the users whose email starts with this prefix.
+    - stream (bool): Stream all users as newline delimited JSON.
+
     Returns:
-    A list of dictionaries containing the email and user ID for each user in the database.
+    A dictionary containing a list of dictionaries with the email and user ID of each user and the cursor of the next page.
 
     Raises:
-    HTTPException: If the user is not authorized to perform this action.
+    HTTPException: If the user is not authorized to perform this action or the cursor is not valid.
     """
 
     token = token.credentials
     admin_user_id = authenticator.decode_token(token=token)
     if (
-        not db.query(User)
+        not db.query(User.id)
         .filter(User.id == admin_user_id, User.is_admin == True)
         .first()
     ):
@@ -178,12 +258,19 @@ def get_all_users(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized !!"
         )
 
-    all_user = [
-        {"email_id": x.email_id, "id": x.id}
-        for x in db.query(User).filter(User.is_admin == False).all()
-    ]
+    statement = select(User.email_id, User.id).where(User.is_admin == False)
+    if coverage_id:
+        statement = statement.where(User.coverage_id == coverage_id)
+    if email_prefix:
+        statement = statement.where(
+            User.email_id.startswith(email_prefix, autoescape=True)
+        )
+    statement = after_cursor(statement, User.email_id, cursor)
+    if stream:
+        return stream_rows(db, statement)
 
-    return {"status": "success", "data": all_user}
+    all_user, next_cursor = fetch_page(db, statement, "email_id", limit)
+    return {"status": "success", "data": all_user, "next_cursor": next_cursor}
 
 
 @user_route.put("/users/{user_id}")
@@ -0,0 +1,170 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import io
+import csv
+import orjson
+from pydantic import ValidationError
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- SQL ALCHEMY  IMPORTS --------------------------------#
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from routes.user import schemas as payload_schemas
+from models.common_models import User, Coverage, COVERAGE_ACTIVE
+from models.utils import get_random_uuid_string
+from security import authenticator, settings
+
+# rows per INSERT and per IN (...) lookup of a bulk request
+BULK_BATCH_SIZE = 1000
+
+
+def parse_bulk_users(body: bytes, content_type: str) -> list:
+    """
+    Parse a CSV (with an `email_id,password,coverage_id` header) or NDJSON upload.
+
+    Args:
+        body (bytes): request body
+        content_type (str): `text/csv` or `application/x-ndjson`
+
+    Returns:
+        list[dict]: one dictionary per row, in upload order
+
+    Raises:
+        HTTPException: if the format is not supported, the body can not be parsed or
+        has more than `settings.BULK_USERS_MAX_ROWS` rows
+    """
+    try:
+        text = body.decode("utf-8-sig")
+        if content_type.startswith("text/csv"):
+            rows = list(csv.DictReader(io.StringIO(text)))
+        elif content_type.startswith(("application/x-ndjson", "application/jsonl")):
+            rows = [orjson.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Upload users as text/csv or application/x-ndjson !!",
+            )
+    except (UnicodeDecodeError, csv.Error, orjson.JSONDecodeError) as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not a valid upload, {error} !!",
+        )
+    if len(rows) > settings.BULK_USERS_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_USERS_MAX_ROWS} users per upload !!",
+        )
+    return rows
+
+
+def existing_values(db: Session, column, values: set, *filters) -> set:
+    """
+    Return which of `values` exist in `column`, with one IN query per batch.
+    """
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), BULK_BATCH_SIZE):
+        batch = values[start : start + BULK_BATCH_SIZE]
+        found.update(
+            db.execute(select(column).where(column.in_(batch), *filters)).scalars()
+        )
+    return found
+
+
+def create_users(db: Session, rows: list) -> list:
+    """
+    Validate and insert users in batches, in one transaction.
+
+    Emails and coverage ids are checked with set based queries instead of two
+    queries per user and passwords are hashed in parallel by the password workers.
+    An email registered concurrently is reported as used by `ON CONFLICT DO NOTHING`.
+
+    Args:
+        db (Session): public schema session
+        rows (list[dict]): parsed upload rows
+
+    Returns:
+        list[dict]: per row result with `row`, `email_id`, `status` and the user `id`
+        or the failure `detail`
+    """
+    results = [None] * len(rows)
+    users = []
+    for index, row in enumerate(rows):
+        try:
+            users.append((index, payload_schemas.UserCreationPayload.parse_obj(row)))
+        except ValidationError as error:
+            detail = "; ".join(
+                f"{'.'.join(map(str, item['loc']))}: {item['msg']}"
+                for item in error.errors()
+            )
+            email_id = row.get("email_id") if isinstance(row, dict) else None
+            results[index] = {"row": index, "email_id": email_id, "detail": detail}
+
+    used_emails = existing_values(
+        db, User.email_id, {user.email_id for _, user in users}
+    )
+    valid_coverages = existing_values(
+        db,
+        Coverage.id,
+        {user.coverage_id for _, user in users},
+        Coverage.status == COVERAGE_ACTIVE,
+    )
+    accepted, seen_emails = [], set()
+    for index, user in users:
+        if user.email_id in used_emails or user.email_id in seen_emails:
+            detail = f"{user.email_id} is already used !"
+        elif user.coverage_id not in valid_coverages:
+            detail = f"Coverage with id {user.coverage_id} does not exist !!"
+        else:
+            seen_emails.add(user.email_id)
+            accepted.append((index, user))
+            continue
+        results[index] = {"row": index, "email_id": user.email_id, "detail": detail}
+
+    hashes = (
+        authenticator.hash_passwords([user.password for _, user in accepted])
+        if accepted
+        else []
+    )
+    values = [
+        {
+            "id": get_random_uuid_string(),
+            "email_id": user.email_id,
+            "password": password_hash,
+            "is_admin": False,
+            "coverage_id": user.coverage_id,
+        }
+        for (_, user), password_hash in zip(accepted, hashes)
+    ]
+    inserted = set()
+    for start in range(0, len(values), BULK_BATCH_SIZE):
+        statement = (
+            insert(User)
+            .values(values[start : start + BULK_BATCH_SIZE])
+            .on_conflict_do_nothing(index_elements=["email_id"])
+            .returning(User.email_id)
+        )
+        inserted.update(db.execute(statement).scalars())
+    db.commit()
+
+    for (index, user), value in zip(accepted, values):
+        if user.email_id in inserted:
+            results[index] = {
+                "row": index,
+                "email_id": user.email_id,
+                "status": "success",
+                "id": value["id"],
+            }
+        else:
+            results[index] = {
+                "row": index,
+                "email_id": user.email_id,
+                "detail": f"{user.email_id} is already used !",
+            }
+    for result in results:
+        result.setdefault("status", "failed")
+    return results
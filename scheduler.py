@@ -0,0 +1,357 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import time
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from collections import defaultdict
+
+# -------------------------------- FASTAPI IMPORTS --------------------------------#
+from fastapi import HTTPException, status
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from metrics import metrics
+from security import settings
+
+metrics.describe("tenant_db_requests_total", "Tenant requests admitted to the database")
+metrics.describe("tenant_db_throttled_total", "Tenant requests rejected by a quota")
+metrics.describe("tenant_db_queue_depth", "Tenant requests waiting for a database slot")
+metrics.describe("tenant_db_in_flight", "Tenant requests holding a database slot")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled with `rate` tokens per second up to `burst` tokens.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """
+        Take a token.
+
+        Returns:
+            float: 0 when a token was taken, otherwise seconds until the next token
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class Ticket:
+    """
+    Place of a request in the queue of the `FairScheduler`.
+
+    Attributes:
+        granted (bool): a slot was granted to the request
+        wake (callable): called once, from any thread, when the slot is granted
+    """
+
+    def __init__(
+        self, start: float, sequence: int, tenant: str, max_concurrency: int, wake
+    ):
+        self.start = start
+        self.sequence = sequence
+        self.tenant = tenant
+        self.max_concurrency = max_concurrency
+        self.wake = wake
+        self.granted = False
+
+    def __lt__(self, other) -> bool:
+        return (self.start, self.sequence) < (other.start, other.sequence)
+
+
+class FairScheduler:
+    """
+    Database work slots shared by all tenants with start-time fair queuing.
+
+    Each request gets a virtual start tag `max(virtual time, previous finish tag of
+    its tenant)` and a finish tag `start + 1 / weight`. Free slots go to the waiting
+    request with the smallest start tag whose tenant is below its concurrency limit,
+    so a tenant flooding the queue only delays its own requests and tenants share
+    the slots in proportion to their weight.
+
+    Slots are granted to the tickets by whoever frees or queues one, waiters only
+    wait to be woken: requests await on the event loop (`acquire_async`) so a
+    flood of waiting requests does not hold the threadpool the requests holding
+    the slots run on, worker threads block (`acquire`).
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.in_flight = defaultdict(int)
+        self.finish_tags = {}
+        self.virtual_time = 0.0
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    def _next(self):
+        eligible = [
+            ticket
+            for ticket in self.waiting
+            if self.in_flight[ticket.tenant] < ticket.max_concurrency
+        ]
+        return min(eligible) if eligible else None
+
+    def _update_gauges(self, tenant: str):
+        depth = sum(1 for ticket in self.waiting if ticket.tenant == tenant)
+        metrics.set("tenant_db_queue_depth", depth, coverage=tenant)
+        metrics.set("tenant_db_in_flight", self.in_flight[tenant], coverage=tenant)
+
+    def _dispatch(self):
+        # called with the lock held
+        while sum(self.in_flight.values()) < self.slots:
+            ticket = self._next()
+            if ticket is None:
+                return
+            self.waiting.remove(ticket)
+            self.in_flight[ticket.tenant] += 1
+            self.virtual_time = ticket.start
+            ticket.granted = True
+            self._update_gauges(ticket.tenant)
+            ticket.wake()
+
+    def enqueue(self, tenant: str, weight: float, max_concurrency: int, wake) -> Ticket:
+        """
+        Queue a request for a database slot, it may be granted right away.
+
+        Args:
+            tenant (str): tenant name
+            weight (float): share of the slots of the tenant
+            max_concurrency (int): maximum slots held by the tenant at the same time
+            wake (callable): called when the slot is granted
+
+        Returns:
+            Ticket: ticket of the request, to be settled with `settle`
+        """
+        with self.lock:
+            start = max(self.virtual_time, self.finish_tags.get(tenant, 0.0))
+            self.finish_tags[tenant] = start + 1 / weight
+            ticket = Ticket(start, next(self.sequence), tenant, max_concurrency, wake)
+            self.waiting.append(ticket)
+            self._update_gauges(tenant)
+            self._dispatch()
+            return ticket
+
+    def settle(self, ticket: Ticket) -> bool:
+        """
+        Stop waiting for a slot.
+
+        Returns:
+            bool: True when the slot was granted, the caller then holds it
+        """
+        with self.lock:
+            if ticket.granted:
+                return True
+            self.waiting.remove(ticket)
+            self._update_gauges(ticket.tenant)
+            return False
+
+    def acquire(self, tenant: str, weight: float, max_concurrency: int, timeout: float):
+        """
+        Wait for a database slot, blocking the calling thread.
+
+        Args:
+            tenant (str): tenant name
+            weight (float): share of the slots of the tenant
+            max_concurrency (int): maximum slots held by the tenant at the same time
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            bool: False when no slot was available before the timeout
+        """
+        granted = threading.Event()
+        ticket = self.enqueue(tenant, weight, max_concurrency, granted.set)
+        granted.wait(timeout)
+        return self.settle(ticket)
+
+    async def acquire_async(
+        self, tenant: str, weight: float, max_concurrency: int, timeout: float
+    ):
+        """
+        Wait for a database slot on the event loop, see `acquire`.
+        """
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+        ticket = self.enqueue(
+            tenant,
+            weight,
+            max_concurrency,
+            lambda: loop.call_soon_threadsafe(granted.set),
+        )
+        try:
+            await asyncio.wait_for(granted.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # cancelled, e.g. the client disconnected
+            if self.settle(ticket):
+                self.release(tenant)
+            raise
+        return self.settle(ticket)
+
+    def release(self, tenant: str):
+        with self.lock:
+            self.in_flight[tenant] -= 1
+            self._update_gauges(tenant)
+            self._dispatch()
+
+
+# coverage id -> token bucket
+rate_limits = {}
+scheduler = FairScheduler(slots=settings.DB_WORK_SLOTS)
+# server processes sharing the quotas, see `share_quotas`
+processes = 1
+
+
+def share_quotas(process_count: int):
+    """
+    Split the quotas between the server processes.
+
+    Token buckets and slots live in each process, so with N gunicorn workers every
+    tenant would get N times its quotas. Called in `post_fork`, each process then
+    enforces 1/N of the database slots, of the rate limit and burst and of the
+    concurrency limit of every coverage, with at least one request at a time. The
+    sum is the configured quota when requests are spread evenly over the workers,
+    a tenant whose requests land on fewer workers gets less.
+
+    Args:
+        process_count (int): number of server processes
+    """
+    global processes
+    processes = max(1, process_count)
+    scheduler.slots = max(1, settings.DB_WORK_SLOTS // processes)
+    rate_limits.clear()
+
+
+def check_rate_limit(coverage):
+    """
+    Take a token of the coverage rate limit.
+
+    Args:
+        coverage (Coverage): coverage database object
+
+    Raises:
+        HTTPException: 429 when the coverage is over its rate limit
+    """
+    if not coverage.rate_limit:
+        return
+    rate = coverage.rate_limit / processes
+    burst = max(
+        1, (coverage.rate_burst or max(1, int(coverage.rate_limit))) // processes
+    )
+    bucket = rate_limits.get(coverage.id)
+    if bucket is None or bucket.rate != rate or bucket.burst != burst:
+        bucket = rate_limits[coverage.id] = TokenBucket(rate, burst)
+    retry_after = bucket.take()
+    if retry_after:
+        metrics.inc("tenant_db_throttled_total", coverage=coverage.name, reason="rate")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit of coverage {coverage.name} exceeded !!",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
+class TenantSlot:
+    """
+    Database slot held by an admitted request, see `tenant_db_slot`.
+
+    The slot may be released before the request ends, e.g. while it waits for the
+    result of an identical request, and is only given back to the scheduler once.
+    """
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+        scheduler.release(self.tenant)
+
+
+def tenant_quota(coverage) -> tuple:
+    """
+    Check the coverage rate limit and return its concurrency limit and weight.
+
+    Raises:
+        HTTPException: 429 when the coverage is over its rate limit
+    """
+    check_rate_limit(coverage)
+    max_concurrency = coverage.max_concurrency or settings.TENANT_MAX_CONCURRENCY
+    return max(1, max_concurrency // processes), coverage.weight or 1.0
+
+
+def queue_timeout(coverage):
+    metrics.inc("tenant_db_throttled_total", coverage=coverage.name, reason="queue")
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many concurrent requests for coverage {coverage.name} !!",
+        headers={"Retry-After": "1"},
+    )
+
+
+@asynccontextmanager
+async def tenant_db_slot(coverage):
+    """
+    Admit a request of a coverage to the database.
+
+    The coverage rate limit is checked first, then the request waits on the event
+    loop for a fair share database slot limited by the coverage concurrency limit.
+
+    Args:
+        coverage (Coverage): coverage database object
+
+    Yields:
+        TenantSlot: the slot of the request, released at the latest on exit
+
+    Raises:
+        HTTPException: 429 when the coverage is over its rate limit or no slot was
+        available within `settings.TENANT_QUEUE_TIMEOUT_SECONDS`
+    """
+    max_concurrency, weight = tenant_quota(coverage)
+    if not await scheduler.acquire_async(
+        coverage.name, weight, max_concurrency, settings.TENANT_QUEUE_TIMEOUT_SECONDS
+    ):
+        queue_timeout(coverage)
+    metrics.inc("tenant_db_requests_total", coverage=coverage.name)
+    slot = TenantSlot(coverage.name)
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+
+@contextmanager
+def tenant_db_slot_blocking(coverage):
+    """
+    `tenant_db_slot` for worker threads, which block while waiting for the slot.
+    """
+    max_concurrency, weight = tenant_quota(coverage)
+    if not scheduler.acquire(
+        coverage.name, weight, max_concurrency, settings.TENANT_QUEUE_TIMEOUT_SECONDS
+    ):
+        queue_timeout(coverage)
+    metrics.inc("tenant_db_requests_total", coverage=coverage.name)
+    slot = TenantSlot(coverage.name)
+    try:
+        yield slot
+    finally:
+        slot.release()
@@ -1,6 +1,14 @@
 # -------------------------------- PYTHON IMPORTS --------------------------------#
-from typing import Union, Dict
+import os
+import hmac
+import time
+import hashlib
+import threading
+import multiprocessing
+from typing import Union, Dict, Tuple
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 # -------------------------------- FASTAPI IMPORTS --------------------------------#
 from fastapi.exceptions import HTTPException
@@ -10,15 +18,40 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import jwt, JWTError, ExpiredSignatureError
 
+try:
+    # optional faster decoder, selected with JWT_BACKEND=pyjwt
+    import jwt as pyjwt
+except ImportError:
+    pyjwt = None
+
 # -------------------------------- LOCAL IMPORTS --------------------------------#
 from security import settings
+from security.settings import ROOT
 
 
-# password hash manager
-PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# password hash manager, hashes with another cost factor are updated at login
+PWD_CONTEXT = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+# bcrypt runs in worker processes, created on first use
+PASSWORD_WORKERS = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+password_pool = None
+password_pool_lock = threading.Lock()
 # authentication scheme
 auth_scheme = HTTPBearer()
 
+
+def read_key(path: str):
+    return (ROOT / path).read_text() if path else None
+
+
+# with RS*/ES* algorithms tokens are signed with the private key and any service
+# holding the public key can verify them, otherwise both are JWT_SECRET
+SIGNING_KEY = read_key(settings.JWT_PRIVATE_KEY_FILE) or settings.JWT_SECRET
+VERIFYING_KEY = read_key(settings.JWT_PUBLIC_KEY_FILE) or SIGNING_KEY
+if settings.JWT_BACKEND == "pyjwt" and pyjwt is None:
+    raise RuntimeError("JWT_BACKEND=pyjwt needs the PyJWT package")
+
 # ======================= password authentication ========================== #
 def generate_password_hash(password: str) -> str:
     """
@@ -46,6 +79,105 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return PWD_CONTEXT.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Union[str, None]]:
+    """
+    HELPER FUNCTION TO VALIDATE A HASHED PASSWORD AND REHASH IT IF IT IS OUTDATED
+
+    Args:
+        plain_password (str): USER INPUT PASSWORD
+        hashed_password (str): STORED HASHED PASSWORD
+
+    Returns:
+        tuple: IS INPUT PASSWORD VALID, NEW HASH TO STORE OR NONE
+    """
+    return PWD_CONTEXT.verify_and_update(plain_password, hashed_password)
+
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global password_pool
+    with password_pool_lock:
+        if password_pool is None:
+            # spawned workers do not inherit the parent's threads and connections
+            password_pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return password_pool
+
+
+def shutdown_password_pool():
+    global password_pool
+    with password_pool_lock:
+        if password_pool is not None:
+            password_pool.shutdown()
+            password_pool = None
+
+
+def reset_password_pool():
+    """
+    Forget the password workers of a parent process after fork, without shutting
+    them down, the worker creates its own pool on first use.
+    """
+    global password_pool, password_pool_lock
+    password_pool = None
+    password_pool_lock = threading.Lock()
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password in the password worker processes.
+
+    bcrypt is CPU bound and holds the GIL, running it in the request thread would
+    stall every other request of the worker.
+
+    Args:
+        password (str): plain password
+
+    Returns:
+        str: bcrypt hash
+    """
+    return get_password_pool().submit(generate_password_hash, password).result()
+
+
+def hash_passwords(passwords: list) -> list:
+    """
+    Hash many passwords in parallel in the password worker processes.
+    """
+    pool = get_password_pool()
+    # a few chunks per worker instead of one inter-process round trip per password
+    chunksize = max(1, len(passwords) // (PASSWORD_WORKERS * 4))
+    return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def check_password(
+    password: str, stored_password: str
+) -> Tuple[bool, Union[str, None]]:
+    """
+    Check a password against the stored one in the password worker processes.
+
+    Passwords stored before hashing was enabled are plain text, they are compared
+    in constant time and a hash is returned to replace them.
+
+    Args:
+        password (str): user input password
+        stored_password (str): stored bcrypt hash or legacy plain text password
+
+    Returns:
+        tuple: is the password valid, new hash to store or None
+    """
+    if PWD_CONTEXT.identify(stored_password) is None:
+        if not hmac.compare_digest(password.encode(), stored_password.encode()):
+            return False, None
+        return True, hash_password(password)
+    return (
+        get_password_pool()
+        .submit(verify_and_update_password, password, stored_password)
+        .result()
+    )
+
+
 # ======================= token authentication ========================== #
 def generate_access_token(user_id: str) -> str:
     """
@@ -65,13 +197,89 @@ def generate_access_token(user_id: str) -> str:
         "iat": datetime.utcnow(),
         "user_id": user_id,
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.ALGORITHM)
+    return jwt.encode(payload, SIGNING_KEY, algorithm=settings.ALGORITHM)
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens keyed by the SHA-256 digest of the token.
+
+    Entries hold the user id and expire at the `exp` claim of their token, so a
+    cached token is never accepted for longer than its signature would be.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes):
+        """
+        Returns:
+            tuple: user id and `exp` of the token, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+            return entry
+
+    def put(self, digest: bytes, user_id: str, expires_at: float):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = (user_id, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, digest: bytes):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def verify_token(token: str) -> dict:
+    """
+    HELPER FUNCTION TO VERIFY THE SIGNATURE AND EXPIRY OF AN ACCESS TOKEN
+
+    Args:
+        token (str): BEARER ACCESS TOKEN
+
+    Returns:
+        dict: TOKEN PAYLOAD
+
+    Raises:
+        HTTPException: IF THE TOKEN IS EXPIRED OR NOT VALID
+    """
+    if settings.JWT_BACKEND == "pyjwt":
+        try:
+            return pyjwt.decode(token, VERIFYING_KEY, algorithms=[settings.ALGORITHM])
+        except pyjwt.ExpiredSignatureError:
+            raise HTTPException(401, detail="Token is expired")
+        except pyjwt.InvalidTokenError:
+            raise HTTPException(401, detail="Invalid Token")
+    try:
+        return jwt.decode(token, VERIFYING_KEY, algorithms=settings.ALGORITHM)
+    except ExpiredSignatureError:
+        raise HTTPException(401, detail="Token is expired")
+    except JWTError:
+        raise HTTPException(401, detail="Invalid Token")
 
 
 def decode_token(token: str):
     """
     HELPER FUNCTION TO  DECODE ACCESS TOKEN
 
+    Verified tokens are cached until they expire, a dashboard sending many requests
+    with the same token only pays for one signature verification.
+
     Args:
         token (str): BEARER ACCESS TOKEN
     Returns:
@@ -79,16 +287,22 @@ def decode_token(token: str):
     """
     if not token:
         return None, None
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=settings.ALGORITHM)
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(401, detail="Invalid Token")
-        return user_id
-    except ExpiredSignatureError:
+    digest = hashlib.sha256(token.encode()).digest()
+    entry = token_cache.get(digest)
+    if entry is not None:
+        user_id, expires_at = entry
+        if time.time() < expires_at:
+            return user_id
+        token_cache.pop(digest)
         raise HTTPException(401, detail="Token is expired")
-    except JWTError:
+
+    payload = verify_token(token)
+    user_id = payload.get("user_id")
+    if user_id is None:
         raise HTTPException(401, detail="Invalid Token")
+    if "exp" in payload:
+        token_cache.put(digest, user_id, float(payload["exp"]))
+    return user_id
 
 
 # ======================= user authentication ========================== #
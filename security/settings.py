@@ -1,12 +1,11 @@
 # -------------------------------- PYTHON IMPORTS --------------------------------#
-import os
 import pathlib
+from typing import Dict, List
 from pydantic import BaseSettings
 
 
-# Project Directories
+# Project Directories, paths are resolved from here instead of the working directory
 ROOT = pathlib.Path(__file__).resolve().parent.parent
-os.chdir(ROOT)
 
 
 class Settings(BaseSettings):
@@ -14,14 +13,75 @@ class Settings(BaseSettings):
     JWT_SECRET                   : str   
     ALGORITHM                    : str   
     ACCESS_TOKEN_EXPIRE_MINUTES  : int
+    JWT_BACKEND                   : str   = "jose"   # "jose" or "pyjwt"
+    JWT_PRIVATE_KEY_FILE          : str   = None     # PEM signing key for RS*/ES* algorithms
+    JWT_PUBLIC_KEY_FILE           : str   = None     # PEM verifying key for RS*/ES* algorithms
+    TOKEN_CACHE_SIZE              : int   = 10000    # verified tokens kept in memory, 0 disables
+
+    # Passwords
+    BCRYPT_ROUNDS                 : int   = 12   # stored hashes with another cost are rehashed at login
+    PASSWORD_HASH_WORKERS         : int   = 0    # bcrypt worker processes, 0 uses the cpu count
+    BULK_USERS_MAX_ROWS           : int   = 10000   # users per bulk upload
     
     # Database
     DATABASE_URL                  : str
-    DB_ECHO                       : str
+    DB_ECHO                       : bool
     PUBLIC_TENANT_SCHEMA          : str
+    SHARD_DATABASE_URLS           : Dict[str, str] = {}   # shard name -> DSN, JSON
+    REPLICA_DATABASE_URLS         : Dict[str, List[str]] = {}   # shard name -> replica DSNs, JSON
+    REPLICA_MAX_LAG_SECONDS       : float = 5
+    REPLICA_LAG_CHECK_SECONDS     : float = 1
+    READ_YOUR_WRITES_SECONDS      : float = 10
+
+    # Tenant quotas
+    DB_WORK_SLOTS                 : int   = 16
+    TENANT_MAX_CONCURRENCY        : int   = 4
+    TENANT_QUEUE_TIMEOUT_SECONDS  : float = 10
+
+    # Responses
+    RESPONSE_COMPRESSION_MIN_SIZE : int   = 0   # bytes, 0 disables compression
+
+    # Cross coverage queries
+    FANOUT_CONCURRENCY            : int   = 8
+    FANOUT_TENANT_TIMEOUT_SECONDS : float = 10
+
+    # Spatial filters
+    POLYGON_CACHE_SIZE            : int   = 256
+    POLYGON_SUBDIVIDE_VERTICES    : int   = 0   # split larger polygons along a grid, 0 disables
+    SENSOR_INDEX_MAX_SENSORS      : int   = 5000   # coverages with more sensors filter in SQL, 0 disables
+    SENSOR_INDEX_CHECK_SECONDS    : float = 5   # interval between sensor data version checks
+    EXTENT_REFRESH_SECONDS        : float = 3600   # interval between coverage extent refreshes
+
+    # Grid aggregation
+    GRID_CELL_DEGREES             : float = 0.001   # cell size at level 0, doubled at every level
+    GRID_MAX_LEVEL                : int   = 12
+    GRID_CACHE_SIZE               : int   = 128   # cached grids, 0 disables
+    GRID_CACHE_SECONDS            : float = 60
+
+    # Downsampling
+    DOWNSAMPLE_MAX_POINTS         : int   = 10000   # points per downsampled series
+    DOWNSAMPLE_MAX_TOTAL_POINTS   : int   = 200000   # points of all the series of a response
+
+    # Delta sync
+    TOMBSTONE_RETENTION_SECONDS   : float = 7 * 24 * 3600   # deleted rows older than this are compacted
+    TOMBSTONE_COMPACT_SECONDS     : float = 3600   # interval between compactions
+
+    # Request coalescing
+    COALESCE_TENANT_READS         : bool  = True   # identical concurrent reads share one query
+
+    # Batch queries
+    BATCH_MAX_QUERIES             : int   = 20
+
+    # Background jobs
+    JOB_WORKERS                   : int   = 1
+    JOB_POLL_SECONDS              : float = 2
+    JOB_STALE_SECONDS             : float = 600   # running jobs without progress are claimed again
+    DROP_LOCK_TIMEOUT_SECONDS     : float = 5
+
+    # Server
+    WEB_WORKERS                   : int   = 0   # gunicorn worker processes, 0 uses the cpu count
     class Config:
         case_sensitive  =  True
-        env_file        =  ".env"
+        env_file        =  ROOT / ".env"
         
-settings = Settings()
-settings.DB_ECHO = eval(settings.DB_ECHO)
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
@@ -0,0 +1,87 @@
+# -------------------------------- PYTHON IMPORTS --------------------------------#
+import threading
+
+# -------------------------------- LOCAL IMPORTS --------------------------------#
+from metrics import metrics
+
+metrics.describe(
+    "singleflight_calls_total",
+    "Coalesced calls, run by a leader or shared with a follower",
+)
+metrics.describe("singleflight_in_flight", "Coalesced calls being run")
+
+
+class Call:
+    """
+    Call run by a leader, its followers wait for `done`.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller of a key runs the function, callers arriving while it runs wait
+    for it and get the same result or exception. Nothing is cached: the next call
+    after the leader finished runs the function again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, on_wait=None, **labels):
+        """
+        Run `function`, or wait for the running call with the same key.
+
+        Args:
+            key: hashable key of the call
+            function (callable): function without arguments
+            on_wait (callable, optional): called before a follower waits, e.g. to
+                release resources only the leader needs
+            **labels: metric labels of the call
+
+        Returns:
+            result of `function`, shared by the leader and its followers
+
+        Raises:
+            Exception: the exception raised by `function`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+                metrics.set("singleflight_in_flight", len(self._calls), group=self.name)
+        metrics.inc(
+            "singleflight_calls_total",
+            group=self.name,
+            role="leader" if leader else "follower",
+            **labels,
+        )
+
+        if not leader:
+            if on_wait is not None:
+                on_wait()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                metrics.set("singleflight_in_flight", len(self._calls), group=self.name)
+            call.done.set()
+        return call.result
@@ -5,8 +5,29 @@ import requests
 from main import app
 
 from main import app
+import os
 import json
+import time
+import runpy
+from types import SimpleNamespace
+import hashlib
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from jose import jwt as jose_jwt
 import uuid
+import database
+from database import SessionLocal, get_schema_db, get_tenant_engine, get_shard_engine
+from models.common_models import Coverage, User, Job
+from models.coverage_models import Sensor, SensorReading, Sink
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert, update, delete, select
+from routes.coverage.utils import create_coverage, drop_coverage
+from management import move_coverage
+from routes.coverage import sensor_index
+from data_seeder import data_seeder
+from security import authenticator, settings
+from passlib.hash import bcrypt
 
 
 url = "http://127.0.0.1:8000"
@@ -32,8 +53,25 @@ def test_list_all_coverage():
     headers = {"Authorization": f"Bearer {admin_token}"}
     response = client.get("/coverage", headers=headers)
     global coverage_id
-    coverage_id = response.json()[0]["id"]
+    coverage_id = response.json()["data"][0]["id"]
     assert response.status_code == 200
+    assert set(response.json()["data"][0]) == {"id", "name", "db_schema"}
+
+
+def test_list_coverage_pagination_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/coverage", params={"limit": 1}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert len(first_page["data"]) == 1
+    assert first_page["next_cursor"]
+    response = client.get(
+        "/coverage",
+        params={"limit": 1, "cursor": first_page["next_cursor"]},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"][0]["name"] != first_page["data"][0]["name"]
 
 
 def test_create_user():
@@ -50,6 +88,168 @@ def test_create_user():
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_read_your_writes_cookie():
+    headers = {"Content-Type": "application/json"}
+    random_uid = str(uuid.uuid4())
+    data = {
+        "email_id": f"{random_uid}@test.com",
+        "password": random_uid,
+        "coverage_id": coverage_id,
+    }
+    response = client.post("/users", json=data, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    last_write = response.cookies.get(database.WRITE_COOKIE)
+    assert last_write
+
+    # another worker only has the cookie
+    database.user_writes.clear()
+    assert database.wrote_recently(None, last_write)
+    assert not database.wrote_recently(None, "not a time")
+    stale = str(time.time() - settings.READ_YOUR_WRITES_SECONDS - 1)
+    assert not database.wrote_recently(None, stale)
+
+    # expired writes are evicted by the next write
+    database.user_writes["expired"] = (
+        time.monotonic() - settings.READ_YOUR_WRITES_SECONDS - 1
+    )
+    database.mark_user_write("recent")
+    assert list(database.user_writes) == ["recent"]
+    assert database.wrote_recently("recent")
+    database.user_writes.clear()
+
+
+def test_password_hashing_workers():
+    password = str(uuid.uuid4())
+    hashed = authenticator.hash_password(password)
+    # bcrypt ran in the worker processes, not in the request thread
+    assert authenticator.password_pool is not None
+    assert authenticator.verify_password(password, hashed)
+    assert authenticator.check_password(password, hashed) == (True, None)
+    assert authenticator.check_password("wrong", hashed) == (False, None)
+    # salted, every hash of the batch differs
+    assert len(set(authenticator.hash_passwords([password] * 3))) == 3
+
+    # legacy plain text passwords are replaced by a hash
+    is_valid, new_hash = authenticator.check_password(password, password)
+    assert is_valid
+    assert authenticator.verify_password(password, new_hash)
+
+
+def test_login_rehashes_outdated_password_endpoint():
+    headers = {"Content-Type": "application/json"}
+    random_uid = str(uuid.uuid4())
+    data = {
+        "email_id": f"{random_uid}@test.com",
+        "password": random_uid,
+        "coverage_id": coverage_id,
+    }
+    response = client.post("/users", json=data, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    # stored with another cost factor than BCRYPT_ROUNDS
+    old_rounds = 4 if settings.BCRYPT_ROUNDS != 4 else 5
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email_id == data["email_id"]).one()
+        user.password = bcrypt.using(rounds=old_rounds).hash(random_uid)
+        db.commit()
+
+        login = {"email_id": data["email_id"], "password": random_uid}
+        response = client.request(
+            "GET", "/users/login", headers=headers, data=json.dumps(login)
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        db.expire_all()
+        user = db.query(User).filter(User.email_id == data["email_id"]).one()
+        assert bcrypt.from_string(user.password).rounds == settings.BCRYPT_ROUNDS
+        assert authenticator.verify_password(random_uid, user.password)
+    finally:
+        db.close()
+
+
+def test_token_cache():
+    token = authenticator.generate_access_token(user_id="cached-user")
+    digest = hashlib.sha256(token.encode()).digest()
+    authenticator.token_cache.clear()
+    assert authenticator.decode_token(token) == "cached-user"
+    assert authenticator.token_cache.get(digest)[0] == "cached-user"
+
+    # a hit does not verify the signature again
+    verify_token = authenticator.verify_token
+    authenticator.verify_token = None
+    try:
+        assert authenticator.decode_token(token) == "cached-user"
+    finally:
+        authenticator.verify_token = verify_token
+
+    # a cached token is refused once its exp has passed
+    authenticator.token_cache.put(digest, "cached-user", time.time() - 1)
+    with pytest.raises(HTTPException) as error:
+        authenticator.decode_token(token)
+    assert error.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert authenticator.token_cache.get(digest) is None
+
+
+@pytest.mark.skipif(authenticator.pyjwt is None, reason="PyJWT is not installed")
+def test_jwt_backends_agree():
+    now = datetime.utcnow()
+    valid = authenticator.generate_access_token(user_id="backend-user")
+    expired = jose_jwt.encode(
+        {"exp": now - timedelta(minutes=1), "user_id": "backend-user"},
+        authenticator.SIGNING_KEY,
+        algorithm=settings.ALGORITHM,
+    )
+    tampered = valid[:-4] + ("AAAA" if not valid.endswith("AAAA") else "BBBB")
+
+    def outcome(token):
+        try:
+            return authenticator.verify_token(token)["user_id"]
+        except HTTPException as error:
+            return error.status_code, error.detail
+
+    backend = settings.JWT_BACKEND
+    outcomes = {}
+    try:
+        for name in ("jose", "pyjwt"):
+            settings.JWT_BACKEND = name
+            outcomes[name] = [
+                outcome(token) for token in (valid, expired, tampered, "not a token")
+            ]
+    finally:
+        settings.JWT_BACKEND = backend
+    assert outcomes["jose"] == outcomes["pyjwt"]
+    assert outcomes["jose"][:2] == ["backend-user", (401, "Token is expired")]
+    assert outcomes["jose"][2] == (401, "Invalid Token")
+
+
+def test_create_users_in_bulk_endpoint():
+    headers = {
+        "Authorization": f"Bearer {admin_token}",
+        "Content-Type": "application/x-ndjson",
+    }
+    random_uid = str(uuid.uuid4())
+    users = [
+        {
+            "email_id": f"{random_uid}@test.com",
+            "password": random_uid,
+            "coverage_id": coverage_id,
+        },
+        {"email_id": f"{random_uid}@test.com", "password": random_uid},
+    ]
+    response = client.post(
+        "/users/bulk",
+        data="\n".join(json.dumps(user) for user in users),
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 1
+    assert [result["status"] for result in response.json()["results"]] == [
+        "success",
+        "failed",
+    ]
+
+
 def test_get_credential_endpoint():
     payload = {}
     headers = {"Authorization": f"Bearer {admin_token}"}
@@ -66,6 +266,22 @@ def test_get_list_users_endpoint():
     assert isinstance(response.json()["data"], list)
 
 
+def test_list_users_pagination_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/users/all", params={"limit": 1}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert len(first_page["data"]) <= 1
+    if first_page["next_cursor"]:
+        response = client.get(
+            "/users/all",
+            params={"limit": 1, "cursor": first_page["next_cursor"]},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["data"][0]["id"] != first_page["data"][0]["id"]
+
+
 def test_change_user_permission_endpoint():
     headers = {"Authorization": f"Bearer {admin_token}"}
     payload = {"is_admin": True}
@@ -96,6 +312,16 @@ def test_get_sensor_data_endpoint():
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_get_sensor_data_fast_json_endpoint():
+    payload = {"page_no": 0, "fast_json": True}
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Dijon/sensor", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert isinstance(response.json(), list)
+
+
 def test_filter_sensor_data_endpoint():
     payload = {
         "start_time": "20220323054307",
@@ -110,6 +336,79 @@ def test_filter_sensor_data_endpoint():
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_filter_sensor_data_fields_endpoint():
+    payload = {
+        "start_time": "20220323054307",
+        "end_time": "20220423054307",
+        "fields": ["date_time", "co2_concentration_value"],
+    }
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Dijon/sensor/filter", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    for row in response.json():
+        assert set(row) == {"date_time", "co2_concentration_value"}
+
+
+def test_filter_sensor_data_downsample_endpoint():
+    payload = {
+        "start_time": "20220323054307",
+        "end_time": "20220423054307",
+        "downsample": "lttb",
+        "points": 50,
+    }
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Dijon/sensor/filter", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    for series in response.json()["series"]:
+        assert len(series["co2_concentration_value"]) <= 50
+        assert len(series["date_time"]) == len(series["co2_concentration_value"])
+
+
+def test_sensor_data_downsample_total_points_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {"downsample": "minmax", "points": 4}
+    limit = settings.DOWNSAMPLE_MAX_TOTAL_POINTS
+    # room for a single series
+    settings.DOWNSAMPLE_MAX_TOTAL_POINTS = 4
+    try:
+        response = client.request(
+            "GET", "/coverage/Dijon/sensor", headers=headers, json=payload
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        device_id = client.request(
+            "GET", "/coverage/Dijon/sensor", headers=headers, json={"fast_json": True}
+        ).json()[0]["device_id"]
+        response = client.request(
+            "GET",
+            "/coverage/Dijon/sensor",
+            headers=headers,
+            json={**payload, "device_id": device_id},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        series = response.json()["series"]
+        assert len(series) <= 1
+        for row in series:
+            assert row["device_id"] == device_id
+            assert len(row["co2_concentration_value"]) <= 4
+    finally:
+        settings.DOWNSAMPLE_MAX_TOTAL_POINTS = limit
+
+
+def test_filter_sensor_data_invalid_polygon_endpoint():
+    # self-intersecting bow tie
+    payload = {"polygon": "POLYGON((0 0, 1 1, 1 0, 0 1, 0 0))"}
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Dijon/sensor/filter", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 def test_get_sink_data_endpoint():
     payload = {}
     headers = {"Authorization": f"Bearer {admin_token}"}
@@ -119,6 +418,17 @@ def test_get_sink_data_endpoint():
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_get_sink_data_ignores_downsample_endpoint():
+    payload = {"fast_json": True, "downsample": "lttb"}
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Ishinomaki/sinks", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    # sink rows, not sensor reading series
+    assert isinstance(response.json(), list)
+
+
 def test_filter_sink_data_endpoint():
     headers = {"Authorization": f"Bearer {admin_token}"}
     payload = {"start_time": "19351001000000", "end_time": "19661101000100"}
@@ -128,10 +438,421 @@ def test_filter_sink_data_endpoint():
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_filter_sink_data_coalesced_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {"start_time": "19351001000000", "end_time": "19661101000100"}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(
+            executor.map(
+                lambda _: client.request(
+                    "GET",
+                    "/coverage/Ishinomaki/sinks/filter",
+                    headers=headers,
+                    json=payload,
+                ),
+                range(8),
+            )
+        )
+    assert all(response.status_code == status.HTTP_200_OK for response in responses)
+    # leaders and followers get the same body
+    assert len({response.content for response in responses}) == 1
+    assert "singleflight_calls_total" in client.get("/metrics", headers=headers).text
+
+
+def test_filter_sink_data_outside_extent_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    # Dijon polygon sent to Ishinomaki
+    payload = {
+        "polygon": "POLYGON ((5.1135 47.304, 5.115 47.304, 5.115 47.307, 5.1135 47.307, 5.1135 47.304))",
+        "fast_json": True,
+    }
+    response = client.request(
+        "GET", "/coverage/Ishinomaki/sinks/filter", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+
+def test_filter_sink_data_stale_extent_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    polygon = "POLYGON ((5.1135 47.304, 5.115 47.304, 5.115 47.307, 5.1135 47.307, 5.1135 47.304))"
+    db = SessionLocal()
+    coverage = db.query(Coverage).filter(Coverage.name == "Ishinomaki").first()
+    db.close()
+    schema_db = get_schema_db(coverage.db_schema, coverage.shard)
+    # written after the extent was computed and outside of it
+    sink = Sink(parcel_id="stale-extent", geometry=f"SRID=4326;{polygon}")
+    schema_db.add(sink)
+    schema_db.commit()
+    try:
+        response = client.request(
+            "GET",
+            "/coverage/Ishinomaki/sinks/filter",
+            headers=headers,
+            json={"polygon": polygon, "fast_json": True},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [row["parcel_id"] for row in response.json()] == ["stale-extent"]
+    finally:
+        schema_db.delete(sink)
+        schema_db.commit()
+        schema_db.close()
+
+
+def test_sink_sensors_endpoint():
+    payload = {"buffer_meters": 100, "aggregate": True}
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request(
+        "GET", "/coverage/Ishinomaki/sinks/sensors", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    for line in response.text.splitlines():
+        assert "avg_co2_concentration_value" in json.loads(line)
+
+
+def test_sink_sensors_aggregate_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    db = SessionLocal()
+    coverage = db.query(Coverage).filter(Coverage.name == "Dijon").first()
+    db.close()
+    schema_db = get_schema_db(coverage.db_schema, coverage.shard)
+    # a sink around one sensor with two readings, away from the seeded data
+    sensor = Sensor(id=990001, geometry="SRID=4326;POINT Z (10 10 0)")
+    readings = [
+        SensorReading(device_id=990001, co2_concentration_value=value)
+        for value in (400, 401)
+    ]
+    sink = Sink(
+        parcel_id="aggregate",
+        geometry="SRID=4326;POLYGON ((9.9 9.9, 10.1 9.9, 10.1 10.1, 9.9 10.1, 9.9 9.9))",
+    )
+    schema_db.add(sensor)
+    schema_db.flush()
+    schema_db.add_all([*readings, sink])
+    schema_db.commit()
+    try:
+        response = client.request(
+            "GET",
+            "/coverage/Dijon/sinks/sensors",
+            headers=headers,
+            json={"aggregate": True},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        row = next(row for row in rows if row["parcel_id"] == "aggregate")
+        assert row["sensors"] == 1
+        assert row["readings"] == 2
+        assert row["avg_co2_concentration_value"] == 400.5
+    finally:
+        for reading in readings:
+            schema_db.delete(reading)
+        schema_db.delete(sink)
+        schema_db.flush()
+        schema_db.delete(sensor)
+        schema_db.commit()
+        schema_db.close()
+
+
+def test_sensor_index_invalidation():
+    db = SessionLocal()
+    coverage_id, schema, shard = create_coverage(f"index-{uuid.uuid4()}", db)
+    db.close()
+    engine = get_tenant_engine(schema, shard)
+    polygon = "POLYGON((0 0, 2 0, 2 2, 0 2, 0 0))"
+    check_seconds = settings.SENSOR_INDEX_CHECK_SECONDS
+    schema_db = get_schema_db(schema, shard)
+    try:
+        with engine.begin() as connection:
+            connection.execute(
+                insert(Sensor), [{"id": 1, "geometry": "SRID=4326;POINT Z (1 1 0)"}]
+            )
+        ids = sensor_index.sensor_ids_in_polygon(coverage_id, schema_db, polygon)
+        assert ids == [1]
+
+        # a new sensor is only seen once the version is checked again
+        with engine.begin() as connection:
+            connection.execute(
+                insert(Sensor), [{"id": 2, "geometry": "SRID=4326;POINT Z (1.5 1 0)"}]
+            )
+        settings.SENSOR_INDEX_CHECK_SECONDS = 3600
+        ids = sensor_index.sensor_ids_in_polygon(coverage_id, schema_db, polygon)
+        assert ids == [1]
+        settings.SENSOR_INDEX_CHECK_SECONDS = 0
+        ids = sensor_index.sensor_ids_in_polygon(coverage_id, schema_db, polygon)
+        assert sorted(ids) == [1, 2]
+
+        # moved out of the polygon, then deleted
+        with engine.begin() as connection:
+            connection.execute(
+                update(Sensor)
+                .where(Sensor.id == 2)
+                .values(geometry="SRID=4326;POINT Z (5 5 0)")
+            )
+        ids = sensor_index.sensor_ids_in_polygon(coverage_id, schema_db, polygon)
+        assert ids == [1]
+        with engine.begin() as connection:
+            connection.execute(delete(Sensor).where(Sensor.id == 1))
+        ids = sensor_index.sensor_ids_in_polygon(coverage_id, schema_db, polygon)
+        assert ids == []
+    finally:
+        settings.SENSOR_INDEX_CHECK_SECONDS = check_seconds
+        schema_db.close()
+        drop_coverage({"coverage_id": coverage_id}, lambda message: None)
+        assert coverage_id not in sensor_index.sensor_indexes
+
+
+def test_sensor_grid_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {"start_time": "20220323054307", "end_time": "20220423054307"}
+    fine = client.request(
+        "GET", "/coverage/Dijon/sensor/grid", headers=headers, json=payload
+    )
+    assert fine.status_code == status.HTTP_200_OK
+    coarse = client.request(
+        "GET",
+        "/coverage/Dijon/sensor/grid",
+        headers=headers,
+        json={**payload, "level": 3},
+    )
+    assert coarse.status_code == status.HTTP_200_OK
+    # coarser cells roll up the same readings
+    assert sum(cell["readings"] for cell in coarse.json()["cells"]) == sum(
+        cell["readings"] for cell in fine.json()["cells"]
+    )
+
+
+def test_changes_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    full = client.get("/coverage/Dijon/changes", headers=headers)
+    assert full.status_code == status.HTTP_200_OK
+    assert all(json.loads(line)["op"] == "upsert" for line in full.text.splitlines())
+    cursor = full.headers["X-Next-Cursor"]
+    delta = client.get(f"/coverage/Dijon/changes?since={cursor}", headers=headers)
+    assert delta.status_code == status.HTTP_200_OK
+    epoch, xid = map(int, cursor.split("."))
+    assert int(delta.headers["X-Next-Cursor"].split(".")[1]) >= xid
+    # below the initial change horizon
+    compacted = client.get(f"/coverage/Dijon/changes?since={epoch}.-1", headers=headers)
+    assert compacted.status_code == status.HTTP_410_GONE
+    # from before a move to another shard
+    moved = client.get(
+        f"/coverage/Dijon/changes?since={epoch - 1}.{xid}", headers=headers
+    )
+    assert moved.status_code == status.HTTP_410_GONE
+    malformed = client.get("/coverage/Dijon/changes?since=-1", headers=headers)
+    assert malformed.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_data_seeding_lock_and_record():
+    calls = []
+    outcomes = iter([False, True])
+
+    def fake_seed():
+        calls.append("seed")
+        return next(outcomes)
+
+    db = SessionLocal()
+    seeding_jobs = db.query(Job.id).filter(Job.kind == data_seeder.SEEDING_JOB_KIND)
+    existing = {job_id for job_id, in seeding_jobs}
+    seed, seeding_done = data_seeder.seed, data_seeder.seeding_done
+    data_seeder.seed = fake_seed
+    data_seeder.seeding_done = lambda db: False
+    try:
+        # another process is seeding, starting waits for it
+        with get_shard_engine().connect() as holder:
+            holder.exec_driver_sql(
+                "SELECT pg_advisory_lock(%s)", (data_seeder.SEEDING_LOCK_KEY,)
+            )
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                waiting = executor.submit(data_seeder.start_data_seeding)
+                time.sleep(0.5)
+                assert not waiting.done()
+                holder.exec_driver_sql(
+                    "SELECT pg_advisory_unlock(%s)", (data_seeder.SEEDING_LOCK_KEY,)
+                )
+                waiting.result(timeout=30)
+        # a failed seeding is not recorded
+        assert calls == ["seed"]
+        db.expire_all()
+        assert {job_id for job_id, in seeding_jobs} == existing
+
+        data_seeder.start_data_seeding()
+        db.expire_all()
+        added = {job_id for job_id, in seeding_jobs} - existing
+        assert len(added) == 1
+
+        # recorded, later starts skip seeding
+        data_seeder.seeding_done = seeding_done
+        data_seeder.start_data_seeding()
+        assert calls == ["seed", "seed"]
+    finally:
+        data_seeder.seed, data_seeder.seeding_done = seed, seeding_done
+        db.query(Job).filter(
+            Job.kind == data_seeder.SEEDING_JOB_KIND, Job.id.notin_(list(existing))
+        ).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+def test_post_fork_disposes_engines():
+    gunicorn_config = runpy.run_path(
+        os.path.join(os.path.dirname(__file__), "gunicorn.conf.py")
+    )
+    server = SimpleNamespace(cfg=SimpleNamespace(workers=2))
+    engine = get_shard_engine()
+    get_tenant_engine("public")
+    database.mark_user_write("forked-user")
+    with engine.connect() as parent:
+        parent_pid = parent.exec_driver_sql("SELECT pg_backend_pid()").scalar()
+        read_end, write_end = os.pipe()
+        child = os.fork()
+        if child == 0:
+            # never run the parent's cleanup, it would close its connections
+            status_code = 1
+            try:
+                pool = engine.pool
+                gunicorn_config["post_fork"](server, None)
+                with engine.connect() as connection:
+                    pid = connection.exec_driver_sql("SELECT pg_backend_pid()")
+                    result = {
+                        "pid": pid.scalar(),
+                        "new_pool": engine.pool is not pool,
+                        "tenant_engines": len(database.tenant_engines),
+                        "user_writes": len(database.user_writes),
+                        "password_pool": authenticator.password_pool is None,
+                    }
+                os.write(write_end, json.dumps(result).encode())
+                status_code = 0
+            finally:
+                os._exit(status_code)
+        os.close(write_end)
+        with os.fdopen(read_end) as pipe:
+            output = pipe.read()
+        _, exit_status = os.waitpid(child, 0)
+        assert exit_status == 0
+        result = json.loads(output)
+        # the worker opened its own connection, the parent's one still works
+        assert result["pid"] != parent_pid
+        assert result["new_pool"]
+        assert result["tenant_engines"] == 0
+        assert result["user_writes"] == 0
+        assert result["password_pool"]
+        assert parent.exec_driver_sql("SELECT pg_backend_pid()").scalar() == parent_pid
+    database.user_writes.clear()
+
+
+def test_move_coverage_catch_up():
+    # two schemas of the primary shard stand in for the source and the target
+    db = SessionLocal()
+    source_id, source_schema, shard = create_coverage(f"move-{uuid.uuid4()}", db)
+    target_id, target_schema, _ = create_coverage(f"move-{uuid.uuid4()}", db)
+    db.close()
+    source_engine = get_tenant_engine(source_schema, shard)
+    target_engine = get_tenant_engine(target_schema, shard)
+    try:
+        with source_engine.begin() as source:
+            source.execute(insert(Sensor), [{"id": 1}, {"id": 2}])
+            source.execute(
+                insert(SensorReading),
+                [{"id": "r1", "device_id": 1}, {"id": "r2", "device_id": 2}],
+            )
+        with source_engine.connect() as source, target_engine.begin() as target:
+            for table in move_coverage.TENANT_TABLES:
+                move_coverage.copy_rows(source, target, table)
+            copy_xid = move_coverage.snapshot_xmin(source)
+        # written after the copy, sensor 2 can only go after its reading
+        with source_engine.begin() as source:
+            source.execute(delete(SensorReading).where(SensorReading.id == "r2"))
+            source.execute(delete(Sensor).where(Sensor.id == 2))
+            source.execute(update(Sensor).where(Sensor.id == 1).values(fid=7))
+            source.execute(insert(Sink), [{"id": "s1", "parcel_id": "late"}])
+        with source_engine.begin() as source, target_engine.begin() as target:
+            move_coverage.catch_up(source, target, copy_xid)
+        with target_engine.connect() as target:
+            assert target.execute(select(Sensor.id, Sensor.fid)).all() == [(1, 7)]
+            assert target.execute(select(SensorReading.id)).scalars().all() == ["r1"]
+            assert target.execute(select(Sink.id)).scalars().all() == ["s1"]
+
+        db = SessionLocal()
+        move_coverage.switch_shard(db, source_id, shard, "elsewhere")
+        db.commit()
+        coverage = db.query(Coverage).filter(Coverage.id == source_id).first()
+        assert (coverage.shard, coverage.change_epoch) == ("elsewhere", 1)
+        assert coverage.extent_xid is None
+        # moved meanwhile
+        try:
+            move_coverage.switch_shard(db, source_id, shard, "elsewhere")
+            assert False, "switch_shard did not abort"
+        except SystemExit:
+            db.rollback()
+        coverage.shard = shard
+        db.commit()
+        db.close()
+    finally:
+        for coverage_id in (source_id, target_id):
+            drop_coverage({"coverage_id": coverage_id}, lambda message: None)
+
+
+def test_batch_query_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {
+        "queries": [
+            {"query": "sensor", "payload": {"page_no": 0}},
+            {
+                "query": "sensor/filter",
+                "payload": {
+                    "start_time": "20220323054307",
+                    "end_time": "20220423054307",
+                    "fields": ["date_time", "co2_concentration_value"],
+                },
+            },
+            {"query": "sinks/filter", "payload": {}},
+        ]
+    }
+    response = client.request(
+        "POST", "/coverage/Dijon/batch", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert [x["status"] for x in results] == ["success", "success", "failed"]
+
+
+def test_admin_sensor_count_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request("GET", "/admin/sensor/count", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert isinstance(response.json()["data"], list)
+
+
+def test_admin_latest_readings_endpoint():
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {"limit": 10, "fields": ["date_time", "co2_concentration_value"]}
+    response = client.request(
+        "GET", "/admin/sensor/latest", headers=headers, json=payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    dates = [x["date_time"] for x in response.json()["data"] if x["date_time"]]
+    assert dates == sorted(dates, reverse=True)
+    too_many = client.request(
+        "GET", "/admin/sensor/latest", headers=headers, json={"limit": 100000}
+    )
+    assert too_many.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_metrics_endpoint():
+    # tenant series carry coverage names
+    anonymous = client.request("GET", "/metrics")
+    assert anonymous.status_code == status.HTTP_403_FORBIDDEN
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.request("GET", "/metrics", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "tenant_db_requests_total" in response.text
+
+
 def test_delete_coverage_endpoint():
     headers = {"Authorization": f"Bearer {admin_token}"}
     response = client.get("/coverage", headers=headers)
-    for x in response.json():
+    for x in response.json()["data"]:
         if x["name"] not in ["Dijon", "Ishinomaki"]:
             coverage_name = x["name"]
             break
@@ -139,4 +860,8 @@ def test_delete_coverage_endpoint():
     response = client.request(
         "DELETE", f"/coverage/{coverage_name}", headers=headers, json={}
     )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    response = client.get(f"/admin/jobs/{response.json()['job_id']}", headers=headers)
     assert response.status_code == status.HTTP_200_OK
+    assert response.json()["kind"] == "drop_coverage"